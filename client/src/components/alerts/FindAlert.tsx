@@ -79,14 +79,12 @@ export default function FindAlert() {
       });
 
       if (!response.ok) {
-        if (response.status === 404) {
-          return;
-        }
         throw new Error("Failed to search alerts");
       }
 
+      // { items, truncated }, nearest first
       const data = await response.json();
-      setResults(data);
+      setResults(data.items);
     } catch (err) {
       setError(err instanceof Error ? err.message : "Failed to search alerts");
     } finally {
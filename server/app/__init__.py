@@ -1,17 +1,43 @@
 from flask import Flask
 from .config import Config
-from .extensions import db, bcrypt, jwt, socketio
+from .extensions import db, bcrypt, jwt, socketio, migrate
+from geoalchemy2 import alembic_helpers
+from .services.dispatch_queue import dispatcher
+from .services.farmer_index import farmer_index
+from .services.alert_archiver import start_archiver
+from .services.alert_changes import change_log
+from .services.alert_cache import alert_cache
+from .services.identity_cache import identity_cache
+from .services.coalescer import coalescer
+from .services.outbox import outbox
+from .services.presence import presence
+from .services.socket_bus import socketio_options
+from .services.metrics import metrics
+from .services.password_hasher import password_hasher
+from .services.auth_tokens import revocations
 import os
 from dotenv import load_dotenv
 from .routes.auth import auth_bp
 from .routes.user import user_bp
 from .routes.admin import admin_bp
 from .routes.alert import alert_bp
+from .routes.metrics import metrics_bp
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 
 load_dotenv()
 
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+def schema_is_current():
+    """True when the database is at the latest migration"""
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+    heads = set(ScriptDirectory.from_config(migrate.get_config()).get_heads())
+    with db.engine.connect() as connection:
+        return set(MigrationContext.configure(connection).get_current_heads()) == heads
+
 
 def create_app():
     print("Creating Flask app with configuration from Config class...")
@@ -23,11 +49,25 @@ def create_app():
     app.register_blueprint(user_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(alert_bp)
+    app.register_blueprint(metrics_bp)
     db.init_app(app)
+    metrics.init_app(app)
+    # Schema changes go through Alembic: flask db migrate / flask db upgrade
+    migrate.init_app(app, db, directory=MIGRATIONS_DIR, compare_type=True,
+                     include_object=alembic_helpers.include_object, render_item=alembic_helpers.render_item)
     bcrypt.init_app(app)
     jwt.init_app(app)
+    revocations.init_app(app)
 
-    socketio.init_app(app, cors_allowed_origins="http://localhost:5173")
+    socketio.init_app(app, cors_allowed_origins="http://localhost:5173", **socketio_options(app.config))
+    presence.init_app(app)
+    password_hasher.init_app(app)
+    dispatcher.init_app(app)
+    coalescer.init_app(app)
+    outbox.init_app(app)
+    change_log.init_app(app)
+    alert_cache.init_app(app)
+    identity_cache.init_app(app)
     print(f"Cors origins set to {os.getenv('FRONTEND_URL', '*')}")
     from app.models.user import User 
     from app.websocket_events import register_websocket_events  
@@ -35,7 +75,12 @@ def create_app():
     
     register_websocket_events(socketio)
     with app.app_context():
-        db.create_all()
+        if app.config['DB_CREATE_ALL']:
+            db.create_all()
+        elif not schema_is_current():
+            # `flask db upgrade` runs through this factory too, so nothing here may touch the tables yet
+            print("Database schema is not at the latest migration, run `flask db upgrade`.")
+            return app
 
         admin = User.query.filter_by(role='admin').first()
         if not admin:
@@ -52,6 +97,20 @@ def create_app():
             print("Admin user created successfully.")
         else:
             print("Admin user already exists.")
+
+        if app.config['FARMER_INDEX_ENABLED']:
+            farmer_index.load()
+        revocations.load()
+    if app.config['FARMER_INDEX_ENABLED'] and app.config['FARMER_INDEX_REFRESH_INTERVAL']:
+        farmer_index.start_refresh(app, app.config['FARMER_INDEX_REFRESH_INTERVAL'])
+    if app.config['TOKEN_REVOCATION_REFRESH_INTERVAL']:
+        revocations.start_refresh(app, app.config['TOKEN_REVOCATION_REFRESH_INTERVAL'])
+    if app.config['ALERT_ARCHIVE_INTERVAL']:
+        start_archiver(app, app.config['ALERT_ARCHIVE_INTERVAL'])
+    if app.config['ALERT_CHANGE_COMPACT_INTERVAL']:
+        change_log.start_compactor(app, app.config['ALERT_CHANGE_COMPACT_INTERVAL'])
+    if app.config['NOTIFICATION_OUTBOX_ENABLED'] and app.config['NOTIFICATION_OUTBOX_PRUNE_INTERVAL']:
+        outbox.start_pruner(app, app.config['NOTIFICATION_OUTBOX_PRUNE_INTERVAL'])
     # print("JWT config:")
     # print("JWT_COOKIE_CSRF_PROTECT:", app.config["JWT_COOKIE_CSRF_PROTECT"])
     # print("JWT_TOKEN_LOCATION:", app.config["JWT_TOKEN_LOCATION"])
@@ -2,8 +2,10 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
 from flask_socketio import SocketIO
+from flask_migrate import Migrate
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
 jwt = JWTManager()
-socketio = SocketIO()
\ No newline at end of file
+socketio = SocketIO()
+migrate = Migrate()
@@ -1,4 +1,8 @@
 from .user import User
 from .alert import Alert
+from .alert_archive import AlertArchive
+from .alert_change import AlertChange, AlertChangeCompaction
+from .notification_outbox import OutboxMessage, NotificationAck
+from .token_revocation import TokenRevocation
 
-__all__ = ['User', 'Alert']
\ No newline at end of file
+__all__ = ['User', 'Alert', 'AlertArchive', 'AlertChange', 'AlertChangeCompaction', 'OutboxMessage', 'NotificationAck', 'TokenRevocation']
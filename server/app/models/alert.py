@@ -1,9 +1,20 @@
 from app.extensions import db, bcrypt
 from datetime import datetime
 from geoalchemy2 import Geography
+from sqlalchemy import func, or_
+from app.config import Config
 
 class Alert(db.Model):
     __tablename__ = 'alerts'
+    __table_args__ = (
+        # Listing endpoints filter on expires_at, crop_alerts/search also on crop_type
+        db.Index('ix_alerts_expires_at', 'expires_at'),
+        db.Index('ix_alerts_crop_type_expires_at', 'crop_type', 'expires_at'),
+        db.Index('ix_alerts_creator_id', 'creator_id'),
+        db.Index('ix_alerts_location', 'location', postgresql_using='gist'),
+        # Planar index for bbox and polygon queries, which compare lon/lat and not great circles
+        db.Index('ix_alerts_location_geometry', db.text('geometry(location)'), postgresql_using='gist'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
@@ -12,11 +23,37 @@ class Alert(db.Model):
     alert_type = db.Column(db.String(50), nullable=False)  # 'pest', 'disease', 'weather', etc.
     crop_type = db.Column(db.String(50), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     expires_at = db.Column(db.DateTime)
-    location = db.Column(Geography(geometry_type='POINT', srid=4326), nullable=False) 
+    location = db.Column(Geography(geometry_type='POINT', srid=4326, spatial_index=False), nullable=False)  # GiST index declared above
 
     creator_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    creator = db.relationship(
+        'User', back_populates='created_alerts', lazy='raise_on_sql' if Config.RAISE_ON_LAZY_LOAD else 'select'
+    )
    
+    @classmethod
+    def active(cls):
+        """Query of alerts that have not expired, filtered in SQL"""
+        # expires_at is stored as naive UTC, so compare against utcnow rather than the DB clock
+        return cls.query.filter(or_(cls.expires_at.is_(None), cls.expires_at > datetime.utcnow()))
+
+    @classmethod
+    def in_bbox(cls, min_lon, min_lat, max_lon, max_lat):
+        """Filter on a lon/lat box through ix_alerts_location_geometry; min_lon > max_lon wraps the antimeridian"""
+        geometry = func.geometry(cls.location)
+        if min_lon > max_lon:
+            return or_(
+                geometry.op('&&')(func.ST_MakeEnvelope(min_lon, min_lat, 180, max_lat, 4326)),
+                geometry.op('&&')(func.ST_MakeEnvelope(-180, min_lat, max_lon, max_lat, 4326)),
+            )
+        return geometry.op('&&')(func.ST_MakeEnvelope(min_lon, min_lat, max_lon, max_lat, 4326))
+
+    @classmethod
+    def in_polygon(cls, polygon):
+        """Filter on a lon/lat polygon element, ST_Intersects takes the same index"""
+        return func.ST_Intersects(func.geometry(cls.location), polygon)
+
     def is_expired(self):
         if self.expires_at:
             return datetime.utcnow() > self.expires_at
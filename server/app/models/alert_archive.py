@@ -0,0 +1,22 @@
+from app.extensions import db
+from datetime import datetime
+from geoalchemy2 import Geography
+
+class AlertArchive(db.Model):
+    """Cold storage for expired alerts, filled by the archival job"""
+    __tablename__ = 'alerts_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # same id the alert had in `alerts`
+    title = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    severity = db.Column(db.String(20), nullable=False)
+    alert_type = db.Column(db.String(50), nullable=False)
+    crop_type = db.Column(db.String(50), nullable=False)
+    created_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+    location = db.Column(Geography(geometry_type='POINT', srid=4326), nullable=False)
+    creator_id = db.Column(db.Integer, nullable=False)  # no FK so deleting a user keeps its history
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AlertArchive {self.title} - {self.severity}>'
@@ -0,0 +1,34 @@
+from app.extensions import db
+from datetime import datetime
+
+alert_change_version = db.Sequence('alert_change_version_seq')
+
+
+class AlertChange(db.Model):
+    """
+    Latest change of each alert, for delta sync. Every write takes a new version from
+    alert_change_version_seq, so a client asking for versions above the last one it saw
+    gets each changed alert once, however often it changed in between.
+    """
+    __tablename__ = 'alert_changes'
+
+    alert_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # no FK, deleted and archived alerts keep their row
+    version = db.Column(db.BigInteger, alert_change_version, nullable=False, unique=True)
+    change = db.Column(db.String(10), nullable=False)  # 'created', 'updated', 'deleted' or 'expired'
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AlertChange {self.alert_id} {self.change} v{self.version}>'
+
+
+class AlertChangeCompaction(db.Model):
+    """
+    One row per compaction run. Deletions and expiries up to `horizon` were dropped
+    from alert_changes, so clients that synced before it have to refetch everything.
+    """
+    __tablename__ = 'alert_change_compactions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    horizon = db.Column(db.BigInteger, nullable=False)
+    removed = db.Column(db.Integer, nullable=False)
+    compacted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
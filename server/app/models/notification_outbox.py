@@ -0,0 +1,26 @@
+from app.extensions import db
+from datetime import datetime
+
+class OutboxMessage(db.Model):
+    """Every notification sent to a socket room, kept so disconnected clients can catch up"""
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        db.Index('ix_notification_outbox_room_id', 'room', 'id'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)  # the notification sequence number, see outbox
+    room = db.Column(db.String(64), nullable=False)
+    event = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<OutboxMessage {self.id} {self.event} -> {self.room}>'
+
+
+class NotificationAck(db.Model):
+    """Highest notification sequence number a user's client has acknowledged"""
+    __tablename__ = 'notification_acks'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    seq = db.Column(db.BigInteger, nullable=False, default=0)
@@ -0,0 +1,15 @@
+from app.extensions import db
+from datetime import datetime
+
+class TokenRevocation(db.Model):
+    """
+    Tokens of this user issued up to revoked_at are refused (declined or deleted users).
+    No foreign key: the row has to outlive a deleted user until their tokens expire.
+    """
+    __tablename__ = 'token_revocations'
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<TokenRevocation {self.user_id} at {self.revoked_at}>'
@@ -1,8 +1,25 @@
 
-from app.extensions import db, bcrypt
+from app.extensions import db
+from app.services.password_hasher import password_hasher
 from geoalchemy2 import Geography
+from sqlalchemy import DDL, event
+from sqlalchemy.orm import deferred
+from sqlalchemy.dialects.postgresql import ARRAY
+from datetime import datetime
+from app.config import Config
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Recipient lookups: role/is_approved filter, distance on location, @> on subscribed_crops
+        db.Index('ix_users_role_is_approved', 'role', 'is_approved'),
+        db.Index('ix_users_location', 'location', postgresql_using='gist'),
+        db.Index('ix_users_subscribed_crops', 'subscribed_crops', postgresql_using='gin'),
+        # User search: trigram index for ILIKE '%term%' on names and email, prefix indexes for autocomplete
+        db.Index('ix_users_search_text_trgm', 'search_text', postgresql_using='gin',
+                 postgresql_ops={'search_text': 'gin_trgm_ops'}),
+        db.Index('ix_users_first_name_prefix', db.text('lower(first_name) text_pattern_ops')),
+        db.Index('ix_users_last_name_prefix', db.text('lower(last_name) text_pattern_ops')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -11,18 +28,31 @@ class User(db.Model):
     last_name = db.Column(db.String(50), nullable=False)
     role = db.Column(db.String(20), nullable=False) # 'agronomist' or 'farmer' or 'admin'
     is_approved = db.Column(db.Boolean, default=False) # For admin users, this can be used to approve or disapprove users
-    subscribed_crops = db.Column(db.ARRAY(db.String)) # For farmers: ['wheat', 'corn']
-    location = db.Column(Geography(geometry_type='POINT', srid=4326), nullable=True)
-    created_alerts = db.relationship('Alert', backref='creator', lazy=True)
+    subscribed_crops = db.Column(ARRAY(db.String)) # For farmers: ['wheat', 'corn']. Postgres ARRAY so @> (contains) is available
+    location = db.Column(Geography(geometry_type='POINT', srid=4326, spatial_index=False), nullable=True)  # GiST index declared above
+    # Maintained by Postgres, searched by app.services.user_search and never loaded with the row
+    search_text = deferred(db.Column(db.Text, db.Computed("first_name || ' ' || last_name || ' ' || email", persisted=True)))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Read paths eager load explicitly: selectinload(User.created_alerts) / joinedload(Alert.creator)
+    created_alerts = db.relationship(
+        'Alert', back_populates='creator', lazy='raise_on_sql' if Config.RAISE_ON_LAZY_LOAD else 'select'
+    )
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
     
     def can_make_alert(self):
         return self.role == 'agronomist' and self.is_approved
     
     def __repr__(self):
-        return f'<User {self.username}>'
\ No newline at end of file
+        return f'<User {self.username}>'
+
+
+# gin_trgm_ops comes from pg_trgm, make sure it exists before db.create_all builds the index
+event.listen(User.__table__, 'before_create', DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
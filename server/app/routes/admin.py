@@ -3,28 +3,51 @@ from app.models.user import User
 from app import db
 from app.decorators.role import role_required
 from flask_jwt_extended import jwt_required
+from sqlalchemy.orm import selectinload
+from app.services.dispatch_queue import dispatcher
+from app.services.farmer_index import farmer_index
+from app.services.alert_cache import alert_cache
+from app.services.identity_cache import identity_cache
+from app.services.coalescer import coalescer
+from app.services.presence import presence
+from app.services import user_search
+from app.services.auth_tokens import revocations
+from app.utils.pagination import keyset_page, stream_ndjson, wants_page, wants_stream
 
 
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
+
+def serialize_users(users):
+    return [{
+        'id': user.id,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'role': user.role,
+        'is_approved': user.is_approved
+    } for user in users]
+
+
+def serialize_ranked_users(rows):
+    return serialize_users([user for user, _ in rows])
+
 @admin_bp.route('/users', methods=['GET'])
 @role_required('admin')
 @jwt_required()
 def get_users():
-    users = User.query.all()
-    user_list = []
-    for user in users:
-        if user.role == 'admin':
-            continue
-        user_list.append({
-            'id': user.id,
-            'email': user.email,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'role': user.role,
-            'is_approved': user.is_approved
-        })
+    query = User.query.filter(User.role != 'admin')
+    keyset = (User.id,)
+    try:
+        if wants_stream():
+            return stream_ndjson(query, keyset, serialize_users)
+        if wants_page():
+            return jsonify(keyset_page(query, keyset, serialize_users)), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    user_list = serialize_users(query.all())
     return jsonify(user_list), 200
 
 
@@ -33,13 +56,17 @@ def get_users():
 @role_required('admin')
 @jwt_required()
 def delete_user(user_id):
-    user = User.query.get(user_id)
+    # The flush goes through the user's alerts, load them up front
+    user = db.session.get(User, user_id, options=[selectinload(User.created_alerts)])
     if not user:
         return jsonify({'error': 'User not found'}), 404
     if user.role == 'admin':
         return jsonify({'error': 'Cannot delete admin user'}), 403
     db.session.delete(user)
     db.session.commit()
+    farmer_index.remove(user_id)
+    identity_cache.invalidate(user_id)
+    revocations.revoke(user_id)
     return jsonify({'message': 'User deleted successfully'}), 200
 
 @admin_bp.route('/users/approve/<int:user_id>', methods=['POST'])
@@ -55,6 +82,8 @@ def approve_user(user_id):
         return jsonify({'error': 'User is already approved'}), 400
     user.is_approved = True
     db.session.commit()
+    identity_cache.invalidate(user_id)
+    revocations.clear(user_id)
     return jsonify({'message': 'User approved successfully'}), 200
 
 @admin_bp.route('/users/decline/<int:user_id>', methods=['POST'])
@@ -70,6 +99,9 @@ def decline_user(user_id):
         return jsonify({'error': 'User is already declined'}), 400
     user.is_approved = False
     db.session.commit()
+    identity_cache.invalidate(user_id)
+    # Their tokens still claim approval: refuse them and drop open sockets
+    revocations.revoke(user_id)
     return jsonify({'message': 'User declined successfully'}), 200
 
 
@@ -77,25 +109,48 @@ def decline_user(user_id):
 @role_required('admin')
 @jwt_required()
 def search_agronomists():
-    query = request.args.get('query', '')
-    if not query:
-        return jsonify({'error': 'No search query provided'}), 400
-
-    agronomists = User.query.filter(
-        (User.first_name.ilike(f'%{query}%')) | 
-        (User.last_name.ilike(f'%{query}%')),
-        User.role == 'agronomist'
-    ).all()
-
-    agronomist_list = []
-    for agronomist in agronomists:
-        agronomist_list.append({
-            'id': agronomist.id,
-            'email': agronomist.email,
-            'first_name': agronomist.first_name,
-            'last_name': agronomist.last_name,
-            'role': agronomist.role,
-            'is_approved': agronomist.is_approved
-        })
-
-    return jsonify(agronomist_list), 200
\ No newline at end of file
+    try:
+        term = user_search.normalize(request.args.get('query'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    agronomists, keyset = user_search.search(term, role='agronomist')
+    try:
+        if wants_stream():
+            return stream_ndjson(agronomists, keyset, serialize_ranked_users)
+        if wants_page():
+            return jsonify(keyset_page(agronomists, keyset, serialize_ranked_users)), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    agronomist_list = serialize_ranked_users(user_search.best_matches(agronomists, keyset))
+
+    return jsonify(agronomist_list), 200
+
+
+@admin_bp.route('/notifications/stats', methods=['GET'])
+@role_required('admin')
+@jwt_required()
+def notification_stats():
+    stats = dispatcher.get_stats()
+    stats['coalescing'] = coalescer.get_stats()
+    stats['presence'] = presence.count()
+    return jsonify(stats), 200
+
+
+@admin_bp.route('/farmer-index/check', methods=['GET'])
+@role_required('admin')
+@jwt_required()
+def check_farmer_index():
+    report = farmer_index.check_consistency()
+    if not report['consistent'] and request.args.get('repair') == 'true':
+        farmer_index.load()
+        report['repaired'] = True
+    return jsonify(report), 200
+
+
+@admin_bp.route('/cache/stats', methods=['GET'])
+@role_required('admin')
+@jwt_required()
+def cache_stats():
+    return jsonify(alert_cache.get_stats()), 200
\ No newline at end of file
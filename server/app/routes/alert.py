@@ -1,31 +1,92 @@
 from datetime import datetime
-from flask import Blueprint, request, jsonify, abort
+from flask import Blueprint, request, jsonify, abort, current_app
 from app.models.user import User
 from app.models.alert import Alert
+from app.models.alert_archive import AlertArchive
 from app import db
 from app.decorators.role import role_required
 from flask_jwt_extended import jwt_required
 from geoalchemy2.shape import to_shape
-from app.routes.user import get_current_user_or_404
+from app.routes.user import get_current_identity_or_404
 from geoalchemy2.elements import WKTElement
+from shapely.geometry import Polygon
 from marshmallow import ValidationError
-from app.schemas.alert import AlertSchema, CreateAlertSchema, UpdateAlertSchema
-from sqlalchemy import and_
-from app.services.notification_service import NotificationService
+from app.schemas.alert import AlertSchema, AlertSearchSchema, CreateAlertSchema, UpdateAlertSchema, alert_coordinates, dump_alert, dump_alert_rows
+from sqlalchemy import and_, insert
+from app.services.notification_service import NotificationService, ALERT_RADIUS
+from app.services.alert_cache import alert_cache, area_tags
+from app.services.alert_changes import ResyncRequired, change_log
+from app.services import alert_tiles, spatial_cells
+from app.utils.pagination import keyset_page, stream_ndjson, wants_page, wants_stream
+from app.utils.http_cache import conditional_response, make_etag
 
 alert_bp = Blueprint('alert', __name__, url_prefix='/api/alert')
 
+CHANGES_PAGE_SIZE = 500
+SEARCH_PAGE_SIZE = 200
+MAX_CHANGES_PAGE_SIZE = 5000
+
 alert_schema = AlertSchema()
-alerts_schema = AlertSchema(many=True)
 create_alert_schema = CreateAlertSchema()
+create_alerts_schema = CreateAlertSchema(many=True)
 update_alert_schema = UpdateAlertSchema()
+alert_search_schema = AlertSearchSchema()
+
+
+def invalidate_cached_alert(alert):
+    point = to_shape(alert.location)
+    alert_cache.invalidate_alert(alert.crop_type, point.x, point.y, alert.creator_id)
+
+
+def area_alerts(crops, longitude, latitude, radius):
+    """
+    Active alerts for `crops` within `radius` meters of a point, read through the alert cache.
+    The cached entry covers the point's whole geohash cell so every user in the cell
+    shares it; the exact distance is then checked per request.
+    """
+    return area_candidates(crops, longitude, latitude, radius)[0]()
+
+
+def area_candidates(crops, longitude, latitude, radius):
+    """
+    (select, etag) for area_alerts: select() filters the cell's cached alerts by distance,
+    etag is the cached entry's, so a poll can be answered 304 before any filtering
+    """
+    crops = sorted(set(crops))
+    cell = spatial_cells.encode(longitude, latitude)
+    min_lon, min_lat, max_lon, max_lat = spatial_cells.bounds(cell)
+    center_lon, center_lat = (min_lon + max_lon) / 2, (min_lat + max_lat) / 2
+    reach = radius + max(
+        spatial_cells.distance(center_lon, center_lat, x, y)
+        for x, y in [(min_lon, min_lat), (min_lon, max_lat), (max_lon, min_lat), (max_lon, max_lat)]
+    )
+
+    def compute():
+        center_wkt = WKTElement(f'POINT({center_lon} {center_lat})', srid=4326)
+        rows = Alert.active().filter(
+            and_(
+                Alert.location.ST_DWithin(center_wkt, reach),
+                Alert.crop_type.in_(crops)
+            )
+        ).add_columns(*alert_coordinates()).all()
+        return dump_alert_rows(rows)
+
+    key = f"area:{','.join(crops)}:{cell}:{radius}"
+    candidates, etag = alert_cache.get_with_etag(key, area_tags(crops, center_lon, center_lat, reach), compute)
+
+    def select():
+        return [
+            alert for alert in candidates
+            if spatial_cells.distance(longitude, latitude, alert['location'][0], alert['location'][1]) <= radius
+        ]
+    return select, etag
 
 
 @alert_bp.route('/create', methods=['POST'])
 @jwt_required()
 @role_required('agronomist')
 def create_alert():
-    user = get_current_user_or_404()
+    user = get_current_identity_or_404()
     if not user.can_make_alert():
         return jsonify({'error': 'Unauthorized to create alerts'}), 403
 
@@ -56,34 +117,125 @@ def create_alert():
 
     try:
         db.session.add(alert)
+        db.session.flush()
+        change_log.record([alert.id], 'created')
         db.session.commit()
-        notification_count = NotificationService.notify_farmers_about_alert(alert)
+        invalidate_cached_alert(alert)
+        NotificationService.dispatch_new_alert(alert)
         
         result = alert_schema.dump(alert)
         return jsonify({
             'message': 'Alert created successfully', 
             'alert': result,
-            'notifications_sent': notification_count
+            'notifications_queued': True
         }), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to create alert', 'details': str(e)}), 500
 
 
+@alert_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+@role_required('agronomist')
+def create_alerts_bulk():
+    user = get_current_identity_or_404()
+    if not user.can_make_alert():
+        return jsonify({'error': 'Unauthorized to create alerts'}), 403
+
+    json_data = request.get_json()
+    items = json_data.get('alerts') if isinstance(json_data, dict) else json_data
+    if not items or not isinstance(items, list):
+        return jsonify({'error': 'Expected a non-empty list of alerts'}), 400
+    max_items = current_app.config['BULK_ALERT_MAX_ITEMS']
+    if len(items) > max_items:
+        return jsonify({'error': f'At most {max_items} alerts per request'}), 400
+
+    errors = {}
+    try:
+        loaded = create_alerts_schema.load(items)
+    except ValidationError:
+        # Schema level checks are skipped for the whole list once any field fails,
+        # so validate item by item to report every item's own errors
+        loaded = []
+        for index, item in enumerate(items):
+            try:
+                loaded.append(create_alert_schema.load(item))
+            except ValidationError as err:
+                errors[index] = err.messages
+                loaded.append(None)
+
+    rows = [
+        {
+            'title': data['title'],
+            'description': data.get('description', ''),
+            'severity': data['severity'],
+            'alert_type': data['alert_type'],
+            'crop_type': data['crop_type'],
+            'expires_at': data['expires_at'],
+            'location': WKTElement(data['location'], srid=4326),
+            'creator_id': user.id,
+        }
+        for data in loaded if data is not None
+    ]
+
+    created = []
+    if rows:
+        try:
+            # One multi-row INSERT ... RETURNING in a single transaction
+            alerts = db.session.scalars(
+                insert(Alert).returning(Alert, sort_by_parameter_order=True), rows
+            ).all()
+            # Serialize before commit expires the returned objects
+            created = [alert_schema.dump(alert) for alert in alerts]
+            change_log.record([alert['id'] for alert in created], 'created')
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': 'Failed to create alerts', 'details': str(e)}), 500
+
+        for alert in created:
+            alert_cache.invalidate_alert(
+                alert['crop_type'], alert['location']['lng'], alert['location']['lat'], user.id
+            )
+        NotificationService.dispatch_new_alerts([alert['id'] for alert in created])
+
+    created_iter = iter(created)
+    results = []
+    for index, data in enumerate(loaded):
+        if data is None:
+            results.append({'index': index, 'status': 'invalid', 'errors': errors[index]})
+        else:
+            results.append({'index': index, 'status': 'created', 'alert': next(created_iter)})
+
+    if not created:
+        status = 400
+    elif errors:
+        status = 207
+    else:
+        status = 201
+    return jsonify({'created': len(created), 'failed': len(errors), 'results': results}), status
+
+
 @alert_bp.route('/<int:alert_id>', methods=['GET'])
 @jwt_required()
 def get_alert(alert_id):
     alert = Alert.query.get(alert_id)
     if not alert:
+        if AlertArchive.query.get(alert_id):
+            return jsonify({'error': 'Alert has expired'}), 410
         return jsonify({'error': 'Alert not found'}), 404
     if alert.is_expired():
         return jsonify({'error': 'Alert has expired'}), 410
 
-    result = alert_schema.dump(alert)
-    
-    result['location'] = [to_shape(alert.location).x, to_shape(alert.location).y]
+    last_modified = alert.updated_at or alert.created_at
+    etag = make_etag('alert', alert.id, last_modified)
 
-    return jsonify(result), 200
+    def build():
+        point = to_shape(alert.location)
+        result = dump_alert(alert, point.x, point.y)
+        return jsonify(result), 200
+
+    return conditional_response(etag, last_modified, build)
 
 
 @alert_bp.route('/<int:alert_id>', methods=['DELETE'])
@@ -94,21 +246,28 @@ def delete_alert(alert_id):
     if not alert:
         return jsonify({'error': 'Alert not found'}), 404
 
-    user = get_current_user_or_404()
+    user = get_current_identity_or_404()
     if user.id != alert.creator_id and user.role != 'admin':
         return jsonify({'error': 'Unauthorized to delete this alert'}), 403
+    creator_id = alert.creator_id
 
+    snapshot = NotificationService.alert_snapshot(alert)
     try:
-        
-        NotificationService.send_alert_update_notification(alert, 'deleted')
+        invalidate_cached_alert(alert)
         
         db.session.delete(alert)
+        change_log.record([alert_id], 'deleted')
         db.session.commit()
-        return jsonify({'message': 'Alert deleted successfully'}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to delete alert', 'details': str(e)}), 500
 
+    # Again once committed: a read between the first invalidation and the commit may have cached the alert
+    longitude, latitude = snapshot['location']
+    alert_cache.invalidate_alert(snapshot['crop_type'], longitude, latitude, creator_id)
+    NotificationService.dispatch_alert_update(snapshot, 'deleted')
+    return jsonify({'message': 'Alert deleted successfully'}), 200
+
 
 
 @alert_bp.route('/<int:alert_id>/update', methods=['PUT'])
@@ -119,7 +278,7 @@ def update_alert(alert_id):
     if not alert:
         return jsonify({'error': 'Alert not found'}), 404
 
-    user = get_current_user_or_404()
+    user = get_current_identity_or_404()
     if user.id != alert.creator_id and user.role != 'admin':
         return jsonify({'error': 'Unauthorized to update this alert'}), 403
 
@@ -141,14 +300,17 @@ def update_alert(alert_id):
         data['location'] = alert.location  
 
   
+    # Entries holding the alert at its old crop/location must go as well
+    invalidate_cached_alert(alert)
     for key, value in data.items():
         setattr(alert, key, value)
 
     try:
+        change_log.record([alert.id], 'updated')
         db.session.commit()
-        result = alert_schema.dump(alert)
-       
-        result['location'] = [to_shape(alert.location).x, to_shape(alert.location).y]
+        invalidate_cached_alert(alert)
+        point = to_shape(alert.location)
+        result = dump_alert(alert, point.x, point.y)
         return jsonify({'message': 'Alert updated successfully', 'alert': result}), 200
     except Exception as e:
         db.session.rollback()
@@ -158,28 +320,96 @@ def update_alert(alert_id):
 @alert_bp.route('/all', methods=['GET'])
 @jwt_required()
 def get_all_alerts():
-    alerts = Alert.query.all()
-    valid_alerts = [alert for alert in alerts if not alert.is_expired()]
-    result = alerts_schema.dump(valid_alerts)
+    query = Alert.active().add_columns(*alert_coordinates())
+    keyset = (Alert.created_at, Alert.id)
+    try:
+        if wants_stream():
+            return stream_ndjson(query, keyset, dump_alert_rows)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # The ETag comes with the cached result, so a revalidating poll runs no query
+    if wants_page():
+        key = f"all:{request.args.get('limit', '')}:{request.args.get('cursor', '')}"
+        try:
+            result, etag = alert_cache.get_with_etag(key, ['all'], lambda: keyset_page(query, keyset, dump_alert_rows))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        result, etag = alert_cache.get_with_etag('all', ['all'], lambda: dump_alert_rows(query.all()))
 
-    for idx, alert in enumerate(valid_alerts):
-        result[idx]['location'] = [to_shape(alert.location).x, to_shape(alert.location).y]
+    return conditional_response(etag, None, lambda: (jsonify(result), 200))
 
-    return jsonify(result), 200
 
+@alert_bp.route('/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+@jwt_required()
+def get_alert_tile(z, x, y):
+    """Clustered active alerts on map tile z/x/y, so map load cost follows the viewport"""
+    if not alert_tiles.valid_tile(z, x, y):
+        return jsonify({'error': f'No tile {z}/{x}/{y}, zoom goes up to {alert_tiles.MAX_ZOOM}'}), 404
 
-@alert_bp.route('/my_alerts', methods=['GET'])
+    tile = alert_cache.get_or_compute(
+        f'tile:{z}:{x}:{y}', [alert_tiles.tile_tag(z, x, y)], lambda: alert_tiles.cluster_tile(z, x, y)
+    )
+    etag = make_etag('tile', z, x, y, tile['count'], tile['updated_at'])
+    return conditional_response(etag, None, lambda: (jsonify(tile), 200))
+
+
+@alert_bp.route('/changes', methods=['GET'])
 @jwt_required()
-def get_my_alerts():
-    user = get_current_user_or_404()
-    alerts = Alert.query.filter_by(creator_id=user.id).all()
-    valid_alerts = [alert for alert in alerts if not alert.is_expired()]
-    result = alerts_schema.dump(valid_alerts)
+def get_alert_changes():
+    """
+    Alerts created, updated, deleted or expired after version `since`, oldest change first.
+    Without `since` only the current version is returned: take it before fetching /all,
+    then poll with it. 410 means the client has to refetch /all.
+    """
+    if 'since' not in request.args:
+        return jsonify({'version': change_log.current_version(), 'changes': [], 'has_more': False}), 200
+    try:
+        since = int(request.args['since'])
+        limit = int(request.args.get('limit', CHANGES_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'since and limit must be integers'}), 400
+    if since < 0 or limit <= 0:
+        return jsonify({'error': 'since and limit must not be negative'}), 400
+    limit = min(limit, MAX_CHANGES_PAGE_SIZE)
 
-    for idx, alert in enumerate(valid_alerts):
-        result[idx]['location'] = [to_shape(alert.location).x, to_shape(alert.location).y]
+    try:
+        rows = change_log.since(since, limit + 1)
+    except ResyncRequired:
+        return jsonify({'error': 'Changes since this version are no longer kept, refetch all alerts',
+                        'version': change_log.current_version()}), 410
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    live_ids = [alert_id for alert_id, change, _ in rows if change not in ('deleted', 'expired')]
+    alerts = {}
+    if live_ids:
+        alert_rows = Alert.query.filter(Alert.id.in_(live_ids)).add_columns(*alert_coordinates()).all()
+        alerts = {alert['id']: alert for alert in dump_alert_rows(alert_rows)}
+
+    changes = []
+    for alert_id, change, version in rows:
+        alert = alerts.get(alert_id)
+        if change in ('created', 'updated') and alert is None:
+            # Deleted or archived after this change; its own change follows with a higher version
+            change = 'deleted'
+        changes.append({'id': alert_id, 'change': change, 'version': version, 'alert': alert})
+
+    version = rows[-1][2] if rows else since
+    return jsonify({'version': version, 'changes': changes, 'has_more': has_more}), 200
 
-    return jsonify(result), 200
+
+@alert_bp.route('/my_alerts', methods=['GET'])
+@jwt_required()
+def get_my_alerts():
+    user = get_current_identity_or_404()
+    query = Alert.active().filter_by(creator_id=user.id)
+    result, etag = alert_cache.get_with_etag(
+        f'my_alerts:{user.id}', [f'creator:{user.id}'],
+        lambda: dump_alert_rows(query.add_columns(*alert_coordinates()).all())
+    )
+    return conditional_response(etag, None, lambda: (jsonify(result), 200))
 
 
 @alert_bp.route('/search', methods=['POST'])
@@ -188,74 +418,81 @@ def search_alerts():
     json_data = request.get_json()
     if not json_data:
         return jsonify({'error': 'No input data provided'}), 400
+    try:
+        data = alert_search_schema.load(json_data)
+    except ValidationError as err:
+        return jsonify({'errors': err.messages}), 400
 
-    location = json_data.get('location')
-    crop_type = json_data.get('crop_type')
-    radius = json_data.get('radius', 10000)
-
-    if not location:
-        return jsonify({'error': 'Location is required for search'}), 400
-    if not crop_type:
-        return jsonify({'error': 'Crop type is required for search'}), 400
-    longitude, latitude = location
-    if not (-180 <= longitude <= 180 and -90 <= latitude <= 90):
-        return jsonify({'error': 'Invalid coordinates for location'}), 400
-    if not isinstance(radius, (int, float)) or radius <= 0:
-        return jsonify({'error': 'Radius must be a positive number'}), 400
-
-    location_wkt = WKTElement(f'POINT({longitude} {latitude})', srid=4326)
-
-    alerts = Alert.query.filter(
-        Alert.location.ST_DWithin(location_wkt, radius) &
-        (Alert.crop_type == crop_type)
-    ).all()
+    limit = min(data.get('limit', SEARCH_PAGE_SIZE), current_app.config['ALERT_SEARCH_MAX_RESULTS'])
+    crops = data.get('crop_types') or ([data['crop_type']] if data.get('crop_type') else [])
 
-    valid_alerts = [alert for alert in alerts if not alert.is_expired()]
-    result = alerts_schema.dump(valid_alerts)
-    for idx, alert in enumerate(valid_alerts):
-        result[idx]['location'] = [to_shape(alert.location).x, to_shape(alert.location).y]
+    if 'location' in data:
+        longitude, latitude = data['location']
+        radius = data['radius']
+        if radius > current_app.config['ALERT_SEARCH_MAX_RADIUS']:
+            return jsonify({'error': f"Radius must not exceed {current_app.config['ALERT_SEARCH_MAX_RADIUS']} meters"}), 400
+
+        result = [
+            alert for alert in area_alerts(crops, longitude, latitude, radius)
+            if ('severity' not in data or alert['severity'] in data['severity'])
+            and ('alert_type' not in data or alert['alert_type'] in data['alert_type'])
+        ]
+        result.sort(key=lambda alert: spatial_cells.distance(longitude, latitude, *alert['location']))
+        return jsonify({'items': result[:limit], 'truncated': len(result) > limit}), 200
 
-    if not result:
-        return jsonify({'message': 'No alerts found for the specified criteria'}), 404
-    return jsonify(result), 200
+    if 'bbox' in data:
+        bounds = data['bbox']
+        region = Alert.in_bbox(*bounds)
+    else:
+        polygon = Polygon(data['polygon'])
+        if not polygon.is_valid:
+            return jsonify({'errors': {'polygon': ['Polygon must not intersect itself']}}), 400
+        bounds = polygon.bounds
+        region = Alert.in_polygon(WKTElement(polygon.wkt, srid=4326))
+    area = spatial_cells.bbox_area(*bounds) / 1e6
+    if area > current_app.config['ALERT_SEARCH_MAX_AREA']:
+        return jsonify({
+            'error': f"Search area of {area:.0f} km2 exceeds {current_app.config['ALERT_SEARCH_MAX_AREA']} km2, "
+                     f"use /api/alert/tiles for large regions"
+        }), 400
+
+    query = Alert.active().filter(region)
+    if crops:
+        query = query.filter(Alert.crop_type.in_(crops))
+    if 'severity' in data:
+        query = query.filter(Alert.severity.in_(data['severity']))
+    if 'alert_type' in data:
+        query = query.filter(Alert.alert_type.in_(data['alert_type']))
+    rows = query.add_columns(*alert_coordinates()).order_by(
+        Alert.created_at.desc(), Alert.id.desc()
+    ).limit(limit + 1).all()
+    return jsonify({'items': dump_alert_rows(rows[:limit]), 'truncated': len(rows) > limit}), 200
 
 
 @alert_bp.route('/crop_alerts', methods=['GET'])
 @jwt_required()
 @role_required('farmer')
 def get_crop_alerts():
-    user = get_current_user_or_404()
+    user = get_current_identity_or_404()
     crop_type = user.subscribed_crops
-    location = user.location
+    longitude, latitude = user.longitude, user.latitude
 
-    if not crop_type or not location:
+    if not crop_type or longitude is None:
         return jsonify({'error': 'User does not have a crop type or location set'}), 400
 
-    longitude, latitude = [to_shape(location).x, to_shape(location).y]
     if not (-180 <= longitude <= 180 and -90 <= latitude <= 90):
         return jsonify({'error': 'Invalid coordinates for location'}), 400
 
-    location_wkt = WKTElement(f'POINT({longitude} {latitude})', srid=4326)
-    radius = 10000  # meters
-
-    alerts = Alert.query.filter(
-    and_(
-        Alert.location.ST_DWithin(location_wkt, radius),
-        Alert.crop_type.in_(crop_type)  
-    )
-    ).all()
-
-    valid_alerts = [alert for alert in alerts if not alert.is_expired()]
-    result = alerts_schema.dump(valid_alerts)
+    select, cell_etag = area_candidates(crop_type, longitude, latitude, ALERT_RADIUS)
+    # The user's own row is part of the key since the result depends on their location and crops
+    etag = make_etag('crop_alerts', user.id, user.updated_at, cell_etag)
 
-    for idx, alert in enumerate(valid_alerts):
-        result[idx]['location'] = [
-            to_shape(alert.location).x,
-            to_shape(alert.location).y
-        ]
+    def build():
+        result = select()
 
-    if not result:
-        return jsonify({'message': 'No alerts found for the specified crop type and location'}), 404
+        if not result:
+            return jsonify({'message': 'No alerts found for the specified crop type and location'}), 404
 
-    return jsonify(result), 200
+        return jsonify(result), 200
 
+    return conditional_response(etag, None, build)
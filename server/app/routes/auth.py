@@ -1,10 +1,11 @@
 from flask import Blueprint, request, jsonify,make_response
 from app.models.user import User
 from app import db
-from flask_jwt_extended import create_access_token
+from app.services.auth_tokens import issue_token
 from datetime import timedelta
 from marshmallow import ValidationError
 from app.schemas.auth import RegisterSchema, LoginSchema
+from app.services.farmer_index import farmer_index
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -35,8 +36,9 @@ def register():
     user.set_password(data['password'])
     db.session.add(user)
     db.session.commit()
+    farmer_index.update_from_user(user)
     
-    access_token = create_access_token(identity={'id': str(user.id), 'role': user.role})
+    access_token = issue_token(user)
     response = make_response({"message": "Login successful"})
     response.set_cookie(
         "access_token",
@@ -61,8 +63,12 @@ def login():
     user = User.query.filter_by(email=data['email']).first()
     if not user or not user.check_password(data['password']):
         return jsonify({'error': 'Invalid email or password'}), 401
+    if user.password_needs_rehash():
+        # BCRYPT_LOG_ROUNDS changed since this hash was made, upgrade it while we have the password
+        user.set_password(data['password'])
+        db.session.commit()
     
-    access_token = create_access_token(identity={'id': str(user.id), 'role': user.role})
+    access_token = issue_token(user)
     response = make_response({"message": "Login successful"})
     response.set_cookie(
         "access_token",
@@ -0,0 +1,17 @@
+import hmac
+
+from flask import Blueprint, Response, abort, current_app, request
+from app.services.metrics import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint, 404 unless metrics are enabled and METRICS_TOKEN is set"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if not current_app.config.get('METRICS_ENABLED') or not token:
+        abort(404)
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(credentials.encode(), token.encode()):
+        abort(404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
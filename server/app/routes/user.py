@@ -3,18 +3,39 @@ from app.models.user import User
 from app import db
 from app.decorators.role import role_required
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.schemas.user import UserSchema, UserUpdateSchema, UserPasswordUpdateSchema
+from app.schemas.user import UserUpdateSchema, UserPasswordUpdateSchema, dump_user, dump_users
 from marshmallow import ValidationError
+from app.websocket_events import sync_location_rooms
+from app.services.farmer_index import farmer_index
+from app.utils.pagination import keyset_page, stream_ndjson, wants_page, wants_stream
+from app.utils.http_cache import conditional_response, make_etag
+from app.models.alert import Alert
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+from app.services.identity_cache import identity_cache
+from app.services import user_search
+from app.services.auth_tokens import issue_token
 
 user_bp = Blueprint('user', __name__, url_prefix='/api/user')
 
-def get_current_user_or_404():
+def get_current_user_or_404(*options):
     identity = get_jwt_identity()
-    user = User.query.get(identity['id'])
+    user = db.session.get(User, identity['id'], options=options)
     if not user:
         abort(404, description="User not found")
     return user
 
+def get_current_identity_or_404():
+    """
+    Like get_current_user_or_404 but returns a cached UserIdentity snapshot instead of
+    a User row, so read-mostly endpoints skip the lookup. It may lag admin changes made
+    in other processes by at most USER_IDENTITY_TTL seconds.
+    """
+    identity = identity_cache.get(get_jwt_identity()['id'])
+    if not identity:
+        abort(404, description="User not found")
+    return identity
+
 @user_bp.route('/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
@@ -22,9 +43,20 @@ def get_profile():
     if not user.is_approved:
         return jsonify({'error': 'User is not approved'}), 403
 
-    user_schema = UserSchema()
-    user_data = user_schema.dump(user)  
-    return jsonify(user_data), 200
+    # The profile nests the user's alerts, so their changes are part of the validator
+    alert_count, alerts_modified = Alert.query.filter_by(creator_id=user.id).with_entities(
+        func.count(Alert.id), func.max(func.coalesce(Alert.updated_at, Alert.created_at))
+    ).one()
+    last_modified = max(filter(None, [user.updated_at, alerts_modified]), default=None)
+    etag = make_etag('profile', user.id, user.updated_at, alert_count, alerts_modified)
+
+    def build():
+        # The alerts are only loaded when the validator did not match
+        profile = db.session.get(User, user.id, options=[selectinload(User.created_alerts)], populate_existing=True)
+        user_data = dump_user(profile)
+        return jsonify(user_data), 200
+
+    return conditional_response(etag, last_modified, build)
 
 
 @user_bp.route('/profile/update', methods=['PUT'])
@@ -56,7 +88,15 @@ def update_profile():
         db.session.rollback()
         return jsonify({'error': 'Failed to update profile', 'details': str(e)}), 500
 
-    return jsonify({'message': 'Profile updated successfully'}), 200
+    identity_cache.invalidate(user.id)
+    if user.role == 'farmer':
+        farmer_index.update_from_user(user)
+        sync_location_rooms(user)
+
+    response = make_response(jsonify({'message': 'Profile updated successfully'}), 200)
+    # Location and crops are token claims, the next websocket connect has to see the new ones
+    response.set_cookie("access_token", issue_token(user), samesite='lax')
+    return response
 
     
 @user_bp.route('/profile/update_password', methods=['PUT'])
@@ -89,20 +129,45 @@ def update_password():
 
     return jsonify({'message': 'Password updated successfully'}), 200
 
+def dump_ranked_users(rows):
+    return dump_users([user for user, _ in rows])
+
+
 @user_bp.route('/search', methods=['GET'])
 @role_required('admin')
 @jwt_required()
 def search_users():
-    query = request.args.get('query', '')
-    if not query:
-        return jsonify({'error': 'No search query provided'}), 400
+    try:
+        term = user_search.normalize(request.args.get('query'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    users = User.query.filter(
-        (User.first_name.ilike(f'%{query}%')) | 
-        (User.last_name.ilike(f'%{query}%'))
-    ).all()
+    # Best matches first. UserSchema nests created_alerts: one extra query for the whole page instead of one per user
+    users_query, keyset = user_search.search(term)
+    users_query = users_query.options(selectinload(User.created_alerts))
 
-    user_schema = UserSchema(many=True)
-    user_data = user_schema.dump(users)
+    try:
+        if wants_stream():
+            return stream_ndjson(users_query, keyset, dump_ranked_users)
+        if wants_page():
+            return jsonify(keyset_page(users_query, keyset, dump_ranked_users)), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    user_data = dump_ranked_users(user_search.best_matches(users_query, keyset))
 
     return jsonify(user_data), 200
+
+
+@user_bp.route('/autocomplete', methods=['GET'])
+@role_required('admin')
+@jwt_required()
+def autocomplete_users():
+    try:
+        prefix = user_search.normalize(request.args.get('prefix'))
+        limit = int(request.args.get('limit', user_search.AUTOCOMPLETE_LIMIT))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = max(1, min(limit, user_search.MAX_AUTOCOMPLETE_LIMIT))
+
+    return jsonify(user_search.autocomplete(prefix, request.args.get('role'), limit)), 200
@@ -1,5 +1,10 @@
 from marshmallow import Schema, fields, validate, ValidationError, validates_schema
 from datetime import datetime
+from geoalchemy2 import Geometry
+from sqlalchemy import cast, func
+from app.models.alert import Alert
+from app.schemas.compiled import compile_serializer
+from app.services.metrics import metrics
 
 # Optional: if you're using custom PointField
 from app.schemas.fields import PointField  
@@ -20,6 +25,25 @@ class AlertSchema(Schema):
     creator_id = fields.Int(dump_only=True)
 
 
+def alert_coordinates():
+    """ST_X / ST_Y columns so the location comes back as two floats instead of WKB"""
+    geometry = cast(Alert.location, Geometry)
+    return func.ST_X(geometry).label('longitude'), func.ST_Y(geometry).label('latitude')
+
+
+# AlertSchema output with the location overridden to [longitude, latitude],
+# taken from alert_coordinates() so no geometry is decoded
+dump_alert = compile_serializer(
+    AlertSchema(), overrides={'location': '[longitude, latitude]'}, args=('longitude', 'latitude')
+)
+
+
+def dump_alert_rows(rows):
+    """Serialize (Alert, longitude, latitude) rows from a query using alert_coordinates()"""
+    with metrics.section('serialize'):
+        return [dump_alert(alert, longitude, latitude) for alert, longitude, latitude in rows]
+
+
 class CreateAlertSchema(Schema):
     title = fields.Str(required=True)
     description = fields.Str(allow_none=True)
@@ -50,3 +74,37 @@ class UpdateAlertSchema(Schema):
         expires_at = data.get('expires_at')
         if expires_at and expires_at < datetime.utcnow():
             raise ValidationError("Expiration date must be in the future", field_name="expires_at")
+
+
+class AlertSearchSchema(Schema):
+    """
+    Body of POST /api/alert/search, one region mode per request:
+    location + radius (meters), bbox [min_lon, min_lat, max_lon, max_lat], or polygon [[lon, lat], ...].
+    """
+    location = fields.List(fields.Float(), validate=validate.Length(equal=2))
+    radius = fields.Float(load_default=10000, validate=validate.Range(min=0, min_inclusive=False))
+    bbox = fields.List(fields.Float(), validate=validate.Length(equal=4))
+    polygon = fields.List(
+        fields.List(fields.Float(), validate=validate.Length(equal=2)), validate=validate.Length(min=3, max=500)
+    )
+    crop_type = fields.Str()
+    crop_types = fields.List(fields.Str(), validate=validate.Length(min=1))
+    severity = fields.List(fields.Str(validate=validate.OneOf(SEVERITY_LEVELS)), validate=validate.Length(min=1))
+    alert_type = fields.List(fields.Str(validate=validate.OneOf(ALERT_TYPES)), validate=validate.Length(min=1))
+    limit = fields.Int(validate=validate.Range(min=1))
+
+    @validates_schema
+    def validate_region(self, data, **kwargs):
+        modes = [mode for mode in ('location', 'bbox', 'polygon') if mode in data]
+        if len(modes) != 1:
+            raise ValidationError("Pass exactly one of location, bbox or polygon")
+        points = [data['location']] if 'location' in data else data.get('polygon', [])
+        if 'bbox' in data:
+            min_lon, min_lat, max_lon, max_lat = data['bbox']
+            points = [(min_lon, min_lat), (max_lon, max_lat)]
+            if min_lat > max_lat:
+                raise ValidationError("bbox min_lat must not exceed max_lat", field_name='bbox')
+        if not all(-180 <= longitude <= 180 and -90 <= latitude <= 90 for longitude, latitude in points):
+            raise ValidationError("Invalid coordinates", field_name=modes[0])
+        if 'location' in data and not (data.get('crop_type') or data.get('crop_types')):
+            raise ValidationError("Crop type is required for search", field_name='crop_type')
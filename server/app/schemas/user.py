@@ -3,6 +3,9 @@ from marshmallow_sqlalchemy import SQLAlchemySchema, auto_field
 from marshmallow import fields, validate, validates, ValidationError, Schema
 from app.models.user import User
 from app.schemas.fields import PointField
+from app.schemas.compiled import compile_serializer
+from app.services.metrics import metrics
+from app.schemas.alert import AlertSchema  # registers the schema nested in created_alerts
 
 class UserSchema(SQLAlchemySchema):
     class Meta:
@@ -18,6 +21,14 @@ class UserSchema(SQLAlchemySchema):
     location = PointField()
     created_alerts = fields.Nested('AlertSchema', many=True, dump_only=True)  
 
+dump_user = compile_serializer(UserSchema())
+
+
+def dump_users(users):
+    with metrics.section('serialize'):
+        return [dump_user(user) for user in users]
+
+
 class UserRegisterSchema(UserSchema):
     password = fields.String(required=True, load_only=True, validate=validate.Length(min=8))
     
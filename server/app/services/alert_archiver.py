@@ -0,0 +1,61 @@
+from app.models.alert import Alert
+from app.models.alert_archive import AlertArchive
+from app.services.alert_changes import change_log
+from app.extensions import db, socketio
+from datetime import datetime
+from sqlalchemy import delete, insert, select
+import logging
+
+ARCHIVED_COLUMNS = [
+    'id', 'title', 'description', 'severity', 'alert_type',
+    'crop_type', 'created_at', 'expires_at', 'location', 'creator_id',
+]
+
+
+def archive_expired_alerts(batch_size=1000):
+    """
+    Move expired alerts from `alerts` into `alerts_archive` in batches,
+    keeping the hot table small. Returns the number of archived alerts.
+    Every worker runs the archiver: each batch locks its rows and skips rows another
+    worker has locked, so two runs never archive the same alert.
+    """
+    archived = 0
+    now = datetime.utcnow()
+    while True:
+        ids = db.session.scalars(
+            select(Alert.id).where(Alert.expires_at <= now).order_by(Alert.expires_at).limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not ids:
+            break
+        try:
+            db.session.execute(
+                insert(AlertArchive).from_select(
+                    ARCHIVED_COLUMNS,
+                    select(*[getattr(Alert, column) for column in ARCHIVED_COLUMNS]).where(Alert.id.in_(ids))
+                )
+            )
+            db.session.execute(delete(Alert).where(Alert.id.in_(ids)))
+            change_log.record(ids, 'expired')
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        archived += len(ids)
+
+    if archived:
+        logging.info(f"Archived {archived} expired alerts")
+    return archived
+
+
+def start_archiver(app, interval):
+    """Run archive_expired_alerts every `interval` seconds in a background task"""
+    def run():
+        while True:
+            socketio.sleep(interval)
+            try:
+                with app.app_context():
+                    archive_expired_alerts(app.config['ALERT_ARCHIVE_BATCH_SIZE'])
+            except Exception as e:
+                logging.error(f"Alert archival failed: {str(e)}")
+    socketio.start_background_task(run)
@@ -0,0 +1,233 @@
+from app.services import alert_tiles, spatial_cells
+from collections import OrderedDict
+from datetime import datetime
+import threading
+import hashlib
+import logging
+import json
+import time
+
+
+class MemoryBackend:
+    """In-process LRU with a TTL per entry and tag based invalidation"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> set(keys)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl, tags):
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_tags(self, tags):
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._tags.pop(tag, set())
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisBackend:
+    """
+    Backend for anything speaking the Redis protocol (Redis, KeyDB, fakeredis in tests).
+    Shared by every worker process, so invalidations reach all of them.
+    Eviction is left to the server's maxmemory-policy (allkeys-lru).
+    """
+
+    def __init__(self, client, tag_ttl, prefix='alert_cache:'):
+        self.client = client
+        # Tag sets outlive every entry they point to, entries never live longer than tag_ttl
+        self.tag_ttl = max(1, int(tag_ttl))
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl, tags):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+        for tag in tags:
+            pipe.sadd(self.prefix + 'tag:' + tag, key)
+            pipe.expire(self.prefix + 'tag:' + tag, self.tag_ttl)
+        pipe.execute()
+
+    def invalidate_tags(self, tags):
+        tag_keys = [self.prefix + 'tag:' + tag for tag in tags]
+        keys = set()
+        for tag_key in tag_keys:
+            keys |= {k.decode() if isinstance(k, bytes) else k for k in self.client.smembers(tag_key)}
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+        self.client.delete(*tag_keys)
+        return len(keys)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class AlertCache:
+    """
+    Read-through cache for alert query results.
+    Entries are tagged with what they depend on (all alerts, a creator, crop + geohash cell,
+    a map tile), and the alert create/update/delete handlers drop exactly the entries an alert can affect.
+    Entries never outlive the earliest expires_at among the alerts they hold.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidated': 0, 'errors': 0}
+
+    def init_app(self, app):
+        backend = app.config.get('ALERT_CACHE_BACKEND', 'memory')
+        self.ttl = app.config.get('ALERT_CACHE_TTL', 60)
+        if backend == 'memory':
+            self.backend = MemoryBackend(app.config.get('ALERT_CACHE_MAX_ENTRIES', 10000))
+            if app.config.get('SOCKETIO_MESSAGE_QUEUE'):
+                # Invalidations only reach this process, other workers serve stale alerts until the TTL
+                logging.warning("ALERT_CACHE_BACKEND=memory with several workers, set ALERT_CACHE_BACKEND=redis")
+        elif backend == 'redis':
+            import redis  # optional dependency, only needed for the redis backend
+            self.backend = RedisBackend(redis.Redis.from_url(app.config['REDIS_URL']), self.ttl)
+        else:
+            self.backend = None
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def get_or_compute(self, key, tags, compute):
+        """
+        Return the cached value for key, or compute, store and return it.
+        compute returns a list of serialized alerts, a page dict with them under 'items',
+        or a dict with the earliest 'expires_at' of what it holds, like a map tile
+        """
+        if self.backend is None:
+            return compute()
+        return self.get_with_etag(key, tags, compute)[0]
+
+    def get_with_etag(self, key, tags, compute):
+        """
+        get_or_compute returning (value, etag). The ETag is a hash of the value taken once
+        when it is computed and stored with it, so revalidating a cached result costs one
+        cache read and no query; it changes whenever an invalidation or expiry replaces the value
+        """
+        if self.backend is None:
+            value = compute()
+            return value, value_etag(value)
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            logging.error(f"Alert cache read failed: {str(e)}")
+            self._count('errors')
+            value = compute()
+            return value, value_etag(value)
+        # Entries written before ETags were stored with them count as misses
+        if isinstance(entry, dict) and 'etag' in entry and 'value' in entry:
+            self._count('hits')
+            return entry['value'], entry['etag']
+
+        self._count('misses')
+        value = compute()
+        etag = value_etag(value)
+        ttl = self._ttl_for(value)
+        if ttl > 0:
+            try:
+                self.backend.set(key, {'value': value, 'etag': etag}, ttl, tags)
+            except Exception as e:
+                logging.error(f"Alert cache write failed: {str(e)}")
+                self._count('errors')
+        return value, etag
+
+    def _ttl_for(self, value):
+        ttl = self.ttl
+        now = datetime.utcnow()
+        alerts = value.get('items', [value]) if isinstance(value, dict) else value
+        for alert in alerts:
+            if alert.get('expires_at'):
+                ttl = min(ttl, (datetime.fromisoformat(alert['expires_at']) - now).total_seconds())
+        return ttl
+
+    def invalidate_alert(self, crop_type, longitude, latitude, creator_id):
+        """Drop every entry a change to this alert can affect"""
+        if self.backend is None:
+            return
+        cell = spatial_cells.encode(longitude, latitude)
+        tags = ['all', f'creator:{creator_id}', f'crop:{crop_type}:cell:{cell}']
+        tags += alert_tiles.point_tags(longitude, latitude)
+        try:
+            self._count('invalidated', self.backend.invalidate_tags(tags))
+        except Exception as e:
+            logging.error(f"Alert cache invalidation failed: {str(e)}")
+            self._count('errors')
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def get_stats(self):
+        stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        stats['backend'] = type(self.backend).__name__ if self.backend is not None else None
+        return stats
+
+
+def value_etag(value):
+    """Hash of a cached value, as it would be serialized"""
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+# Past this radius tagging every touched cell costs more than it saves
+MAX_TAGGED_RADIUS = 50000  # meters
+
+
+def area_tags(crops, longitude, latitude, radius):
+    """Tags for a cached area query: every crop + cell the query circle touches"""
+    if radius > MAX_TAGGED_RADIUS:
+        return ['all']
+    full_cells, edge_cells = spatial_cells.covering_cells(longitude, latitude, radius)
+    return [f'crop:{crop}:cell:{cell}' for crop in crops for cell in full_cells | edge_cells]
+
+
+alert_cache = AlertCache()
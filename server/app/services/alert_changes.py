@@ -0,0 +1,105 @@
+from app.models.alert_change import AlertChange, AlertChangeCompaction, alert_change_version
+from app.extensions import db, socketio
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import logging
+
+TOMBSTONES = ('deleted', 'expired')
+# Transaction level advisory lock serializing change log writers, see record()
+WRITE_LOCK = 0x616c6368
+
+
+class ResyncRequired(Exception):
+    """Raised when the changes after a version were compacted away"""
+
+
+class AlertChangeLog:
+    """
+    Change log behind /api/alert/changes: the latest change version of every alert,
+    written in the same transaction as the alert itself. Compaction drops deletions
+    and expiries older than ALERT_CHANGE_RETENTION_DAYS, clients that last synced
+    before them get a ResyncRequired.
+    """
+
+    def __init__(self):
+        self.retention = timedelta(days=30)
+
+    def init_app(self, app):
+        self.retention = timedelta(days=app.config.get('ALERT_CHANGE_RETENTION_DAYS', 30))
+
+    def record(self, alert_ids, change):
+        """
+        Bump the version of alert_ids in the caller's transaction, flushed but not committed.
+        Versions come from a sequence, so a transaction that took a lower one could commit
+        after one with a higher one and a client would skip it. Writers take an advisory
+        lock held until commit, making versions visible in order; commit right after.
+        """
+        alert_ids = sorted(set(alert_ids))
+        if not alert_ids:
+            return
+        db.session.execute(select(func.pg_advisory_xact_lock(WRITE_LOCK)))
+        now = datetime.utcnow()
+        statement = pg_insert(AlertChange).values([
+            {'alert_id': alert_id, 'version': alert_change_version.next_value(), 'change': change, 'changed_at': now}
+            for alert_id in alert_ids
+        ])
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[AlertChange.alert_id],
+            set_={'version': alert_change_version.next_value(), 'change': change, 'changed_at': now},
+        ))
+
+    def current_version(self):
+        """
+        Version to poll from. Compaction can delete the newest rows (old deletions on a quiet
+        deployment), so never below the compaction horizon, which since() would reject
+        """
+        return max(db.session.scalar(select(func.max(AlertChange.version))) or 0, self.horizon())
+
+    def horizon(self):
+        return db.session.scalar(select(func.max(AlertChangeCompaction.horizon))) or 0
+
+    def since(self, version, limit):
+        """
+        Up to limit changes after version, oldest first, as (alert_id, change, version) rows.
+        Raises ResyncRequired if deletions after version were compacted away.
+        """
+        if version < self.horizon():
+            raise ResyncRequired()
+        return db.session.execute(
+            select(AlertChange.alert_id, AlertChange.change, AlertChange.version)
+            .where(AlertChange.version > version)
+            .order_by(AlertChange.version)
+            .limit(limit)
+        ).all()
+
+    def compact(self):
+        """Drop deletions and expiries older than the retention. Returns the number removed"""
+        cutoff = datetime.utcnow() - self.retention
+        horizon = db.session.scalar(
+            select(func.max(AlertChange.version)).where(AlertChange.change.in_(TOMBSTONES), AlertChange.changed_at < cutoff)
+        )
+        if horizon is None:
+            return 0
+        result = db.session.execute(
+            delete(AlertChange).where(AlertChange.change.in_(TOMBSTONES), AlertChange.version <= horizon)
+        )
+        db.session.add(AlertChangeCompaction(horizon=horizon, removed=result.rowcount))
+        db.session.commit()
+        logging.info(f"Compacted {result.rowcount} alert changes up to version {horizon}")
+        return result.rowcount
+
+    def start_compactor(self, app, interval):
+        def run():
+            while True:
+                socketio.sleep(interval)
+                try:
+                    with app.app_context():
+                        self.compact()
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Alert change compaction failed: {str(e)}")
+        socketio.start_background_task(run)
+
+
+change_log = AlertChangeLog()
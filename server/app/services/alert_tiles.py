@@ -0,0 +1,118 @@
+from app.models.alert import Alert
+from geoalchemy2 import Geometry
+from sqlalchemy import cast, func
+import math
+
+# Web mercator stops short of the poles, alerts further north or south are on no tile
+MAX_LATITUDE = 85.05112878
+MAX_ZOOM = 20
+# Each tile is split into GRID x GRID cluster cells, 32px on a 256px tile
+GRID = 8
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+
+def _tile_latitude(y, z):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / (1 << z)))))
+
+
+def tile_bounds(z, x, y):
+    """Return (min_lon, min_lat, max_lon, max_lat) of a slippy map tile"""
+    n = 1 << z
+    return x / n * 360.0 - 180.0, _tile_latitude(y + 1, z), (x + 1) / n * 360.0 - 180.0, _tile_latitude(y, z)
+
+
+def tile_of(longitude, latitude, z):
+    """(x, y) of the tile holding a point at zoom z, None beyond the mercator latitude limit"""
+    if abs(latitude) > MAX_LATITUDE:
+        return None
+    n = 1 << z
+    lat = math.radians(latitude)
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+    return min(x, n - 1), min(y, n - 1)
+
+
+def point_tags(longitude, latitude):
+    """Cache tags of the tiles holding a point, one per zoom level"""
+    tags = []
+    for z in range(MAX_ZOOM + 1):
+        tile = tile_of(longitude, latitude, z)
+        if tile is None:
+            break
+        tags.append(tile_tag(z, *tile))
+    return tags
+
+
+def tile_tag(z, x, y):
+    return f'tile:{z}:{x}:{y}'
+
+
+def cluster_tile(z, x, y):
+    """
+    Active alerts on a tile, clustered on a GRID x GRID grid in SQL. The database returns
+    one row per grid cell, severity and type, so the payload and the work done here depend
+    on the tile and not on how many alerts it holds. Each cluster has its alert-weighted
+    center, its count and counts by severity and type; single alerts also carry their id.
+    """
+    min_lon, min_lat, max_lon, max_lat = tile_bounds(z, x, y)
+    geometry = cast(Alert.location, Geometry)
+    lon, lat = func.ST_X(geometry), func.ST_Y(geometry)
+    # Position on the tile in grid cells, x from the west edge and y from the north edge
+    n = 1 << z
+    world_x = (lon + 180.0) / 360.0 * n - x
+    world_y = (1.0 - func.asinh(func.tan(func.radians(lat))) / math.pi) / 2.0 * n - y
+    grid_x = func.least(func.floor(world_x * GRID), GRID - 1).label('grid_x')
+    grid_y = func.least(func.floor(world_y * GRID), GRID - 1).label('grid_y')
+
+    # The box finds candidates through the geometry index, the ranges keep points on a shared edge on one tile
+    query = Alert.active().filter(
+        Alert.in_bbox(min_lon, max(min_lat, -MAX_LATITUDE), max_lon, min(max_lat, MAX_LATITUDE)),
+        lat.between(max(min_lat, -MAX_LATITUDE), min(max_lat, MAX_LATITUDE)),
+        lon >= min_lon,
+        lon < max_lon if max_lon < 180.0 else lon <= max_lon,
+    )
+
+    rows = query.with_entities(
+        grid_x, grid_y, Alert.severity, Alert.alert_type,
+        func.count(Alert.id), func.sum(lon), func.sum(lat), func.min(Alert.id),
+        func.min(Alert.expires_at), func.max(func.coalesce(Alert.updated_at, Alert.created_at)),
+    ).group_by(grid_x, grid_y, Alert.severity, Alert.alert_type).all()
+
+    cells = {}
+    expires_at = None
+    updated_at = None
+    for gx, gy, severity, alert_type, count, lon_sum, lat_sum, first_id, first_expiry, last_update in rows:
+        cluster = cells.setdefault((gx, gy), {
+            'count': 0, 'lng': 0.0, 'lat': 0.0, 'id': first_id, 'severity': {}, 'type': {},
+        })
+        cluster['count'] += count
+        cluster['lng'] += lon_sum
+        cluster['lat'] += lat_sum
+        cluster['id'] = min(cluster['id'], first_id)
+        cluster['severity'][severity] = cluster['severity'].get(severity, 0) + count
+        cluster['type'][alert_type] = cluster['type'].get(alert_type, 0) + count
+        if first_expiry is not None and (expires_at is None or first_expiry < expires_at):
+            expires_at = first_expiry
+        if last_update is not None and (updated_at is None or last_update > updated_at):
+            updated_at = last_update
+
+    clusters = []
+    for cluster in cells.values():
+        cluster['lng'] /= cluster['count']
+        cluster['lat'] /= cluster['count']
+        if cluster['count'] > 1:
+            del cluster['id']
+        clusters.append(cluster)
+    clusters.sort(key=lambda cluster: -cluster['count'])
+
+    return {
+        'z': z, 'x': x, 'y': y,
+        'count': sum(cluster['count'] for cluster in clusters),
+        'clusters': clusters,
+        # Read by AlertCache for the entry's TTL, and by the route for the ETag
+        'expires_at': expires_at.isoformat() if expires_at else None,
+        'updated_at': updated_at.isoformat() if updated_at else None,
+    }
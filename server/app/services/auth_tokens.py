@@ -0,0 +1,109 @@
+from app.extensions import db, jwt, socketio
+from app.models.token_revocation import TokenRevocation
+from app.services import spatial_cells
+from app.services.presence import presence
+from flask_jwt_extended import create_access_token
+from geoalchemy2.shape import to_shape
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, timedelta, timezone
+import threading
+import logging
+
+
+def token_claims(user):
+    """
+    Signed claims a websocket connect trusts instead of loading the user: approval,
+    first name for the welcome message, and the farmer's location cell and crops
+    their cell rooms are derived from.
+    """
+    cell = None
+    if user.role == 'farmer' and user.location is not None:
+        point = to_shape(user.location)
+        cell = spatial_cells.encode(point.x, point.y)
+    return {
+        'approved': bool(user.is_approved),
+        'first_name': user.first_name,
+        'cell': cell,
+        'crops': list(user.subscribed_crops or []) if cell else [],
+    }
+
+
+def issue_token(user):
+    """Access token for user; issue a new one whenever approval, location or crops change"""
+    return create_access_token(identity={'id': str(user.id), 'role': user.role}, additional_claims=token_claims(user))
+
+
+def _timestamp(value):
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class TokenRevocations:
+    """
+    Users whose tokens issued before a point in time are refused: declined and deleted users.
+    Checked on every websocket connect and JWT protected request, so the list is held in
+    memory, loaded from token_revocations and reloaded every TOKEN_REVOCATION_REFRESH_INTERVAL
+    seconds to pick up revocations made by other workers. Rows older than the token
+    lifetime are dropped, since every token they could refuse has expired.
+    """
+
+    def __init__(self):
+        self.lifetime = timedelta(hours=1)
+        self._revoked = {}  # user id -> revoked_at as a unix timestamp
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.lifetime = app.config.get('JWT_ACCESS_TOKEN_EXPIRES', self.lifetime)
+        jwt.token_in_blocklist_loader(self._token_in_blocklist)
+
+    def load(self):
+        db.session.execute(delete(TokenRevocation).where(TokenRevocation.revoked_at < datetime.utcnow() - self.lifetime))
+        rows = db.session.execute(select(TokenRevocation.user_id, TokenRevocation.revoked_at)).all()
+        db.session.commit()
+        with self._lock:
+            self._revoked = {user_id: _timestamp(revoked_at) for user_id, revoked_at in rows}
+
+    def is_revoked(self, user_id, issued_at):
+        if user_id is None:
+            return False
+        with self._lock:
+            revoked_at = self._revoked.get(int(user_id))
+        return revoked_at is not None and issued_at <= revoked_at
+
+    def revoke(self, user_id):
+        """Refuse every token the user holds now and disconnect their sockets, on every worker"""
+        now = datetime.utcnow()
+        statement = pg_insert(TokenRevocation).values(user_id=user_id, revoked_at=now)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[TokenRevocation.user_id], set_={'revoked_at': now}
+        ))
+        db.session.commit()
+        with self._lock:
+            self._revoked[int(user_id)] = _timestamp(now)
+        for sid in presence.sids_for(user_id):
+            socketio.server.disconnect(sid, namespace='/')
+
+    def clear(self, user_id):
+        """Accept the user's tokens again, e.g. after re-approval"""
+        db.session.execute(delete(TokenRevocation).where(TokenRevocation.user_id == user_id))
+        db.session.commit()
+        with self._lock:
+            self._revoked.pop(int(user_id), None)
+
+    def _token_in_blocklist(self, jwt_header, jwt_payload):
+        identity = jwt_payload.get('sub') or {}
+        return self.is_revoked(identity.get('id'), jwt_payload.get('iat', 0))
+
+    def start_refresh(self, app, interval):
+        def refresh():
+            while True:
+                socketio.sleep(interval)
+                try:
+                    with app.app_context():
+                        self.load()
+                except Exception as e:
+                    logging.error(f"Token revocation refresh failed: {str(e)}")
+        socketio.start_background_task(refresh)
+
+
+revocations = TokenRevocations()
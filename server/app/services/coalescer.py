@@ -0,0 +1,108 @@
+from app.extensions import socketio
+from app.services.outbox import outbox
+from app.services.metrics import metrics
+import threading
+import logging
+
+
+class NotificationCoalescer:
+    """
+    Last step before socketio.emit for every notification. Both modes are off by default,
+    and then every event goes out as is under its own name.
+    With a coalescing window, events for the same room arriving within the window
+    are merged into one 'notification_batch' message. With digest mode, events for
+    low severity alerts are held and sent as one 'alert_digest' per room on a schedule.
+    Only turn them on for clients that handle these two events, see the README.
+
+    Buffers are per room, not per farmer: a room is what one emit reaches, and merging
+    across rooms would mean emitting to every member's own room again. A farmer is in
+    their own room and one cell room per subscribed crop, so a window delivers them at
+    most one message per room they are in, however many alerts it held.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.window = 0
+        self.digest_interval = 0
+        self.digest_severities = set()
+        self._pending = {}  # room -> [(event, data)]
+        self._digest = {}  # room -> [(event, data)]
+        self._lock = threading.Lock()
+        self._started = False
+        self._stats = {'events': 0, 'messages': 0, 'batched': 0, 'digested': 0}
+
+    def init_app(self, app):
+        self.app = app
+        self.window = app.config.get('NOTIFICATION_COALESCE_WINDOW_MS', 0) / 1000
+        self.digest_interval = app.config.get('NOTIFICATION_DIGEST_INTERVAL', 0)
+        self.digest_severities = set(app.config.get('NOTIFICATION_DIGEST_SEVERITIES', []))
+
+    def emit(self, event, data, room, severity=None):
+        with self._lock:
+            self._stats['events'] += 1
+            if self.digest_interval and severity in self.digest_severities:
+                self._digest.setdefault(room, []).append((event, data))
+                self._start_flushers()
+                return
+            if self.window:
+                self._pending.setdefault(room, []).append((event, data))
+                self._start_flushers()
+                return
+        self._send(event, data, room)
+
+    def _send(self, event, data, room):
+        with self._lock:
+            self._stats['messages'] += 1
+        # The sequence number lets clients acknowledge what they saw and catch up after a reconnect
+        seq = outbox.record(room, event, data)
+        if seq is not None:
+            data = dict(data, seq=seq)
+        with metrics.section('emit'):
+            socketio.emit(event, data, room=room)
+
+    def _start_flushers(self):
+        # Called with the lock held
+        if self._started:
+            return
+        if self.window:
+            socketio.start_background_task(self._run, self.window, '_pending', self._flush_batch)
+        if self.digest_interval:
+            socketio.start_background_task(self._run, self.digest_interval, '_digest', self._flush_digest)
+        self._started = True
+
+    def _run(self, interval, buffer_name, flush):
+        while True:
+            socketio.sleep(interval)
+            with self._lock:
+                buffered = getattr(self, buffer_name)
+                setattr(self, buffer_name, {})
+            with self.app.app_context():
+                for room, events in buffered.items():
+                    try:
+                        flush(room, events)
+                    except Exception as e:
+                        logging.error(f"Failed to flush notifications for {room}: {str(e)}")
+
+    def _flush_batch(self, room, events):
+        if len(events) == 1:
+            self._send(events[0][0], events[0][1], room)
+            return
+        with self._lock:
+            self._stats['batched'] += len(events)
+        self._send('notification_batch', {'events': [{'event': e, 'data': d} for e, d in events]}, room)
+
+    def _flush_digest(self, room, events):
+        with self._lock:
+            self._stats['digested'] += len(events)
+        self._send('alert_digest', {'events': [{'event': e, 'data': d} for e, d in events]}, room)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = sum(len(events) for events in self._pending.values())
+            stats['pending_digest'] = sum(len(events) for events in self._digest.values())
+        stats['messages_saved'] = stats['events'] - stats['messages'] - stats['pending'] - stats['pending_digest']
+        return stats
+
+
+coalescer = NotificationCoalescer()
@@ -0,0 +1,118 @@
+from app.extensions import socketio
+from collections import deque
+import threading
+import logging
+import time
+
+
+class NotificationJob:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+
+class NotificationDispatcher:
+    """
+    Background pipeline for notification fan-out.
+    Routes enqueue a job and return right away; a pool of workers
+    runs the recipient query and the socket emits.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.queue = None
+        self.tasks = {}
+        self.workers = 0
+        self.max_retries = 0
+        self.retry_delay = 0
+        self.inline = False
+        self._started = False
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self._counters = {'enqueued': 0, 'completed': 0, 'failed': 0, 'retries': 0}
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('NOTIFICATION_WORKERS', 4)
+        self.max_retries = app.config.get('NOTIFICATION_MAX_RETRIES', 3)
+        self.retry_delay = app.config.get('NOTIFICATION_RETRY_DELAY', 1.0)
+        # Inline mode runs jobs in the calling thread, used as an in-process stand-in for tests
+        self.inline = app.config.get('NOTIFICATION_DISPATCH_INLINE', False)
+        # Use the queue class matching the socketio async mode (threading / eventlet / gevent)
+        self.queue = socketio.server.eio.create_queue(maxsize=app.config.get('NOTIFICATION_QUEUE_SIZE', 10000))
+
+    def task(self, name):
+        """Register a job handler under a name so jobs only carry plain arguments"""
+        def decorator(fn):
+            self.tasks[name] = fn
+            return fn
+        return decorator
+
+    def enqueue(self, name, *args):
+        job = NotificationJob(name, args)
+        self._count('enqueued')
+        if self.inline:
+            self._run(job)
+            return
+        self._start_workers()
+        try:
+            self.queue.put_nowait(job)
+        except Exception:
+            # Queue is full: deliver in the request instead of dropping the notification
+            logging.warning(f"Notification queue full, running job {name} inline")
+            self._run(job)
+
+    def _start_workers(self):
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.workers):
+                socketio.start_background_task(self._worker)
+            self._started = True
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            self._run(job)
+
+    def _run(self, job):
+        job.attempts += 1
+        try:
+            with self.app.app_context():
+                self.tasks[job.name](*job.args)
+        except Exception as e:
+            if job.attempts <= self.max_retries and not self.inline:
+                self._count('retries')
+                logging.warning(f"Notification job {job.name} failed (attempt {job.attempts}), retrying: {str(e)}")
+                socketio.start_background_task(self._retry_later, job)
+            else:
+                self._count('failed')
+                logging.error(f"Notification job {job.name} failed after {job.attempts} attempts: {str(e)}")
+            return
+        self._count('completed')
+        self._latencies.append(time.monotonic() - job.enqueued_at)
+
+    def _retry_later(self, job):
+        socketio.sleep(self.retry_delay * job.attempts)
+        self.queue.put(job)
+
+    def _count(self, key):
+        with self._lock:
+            self._counters[key] += 1
+
+    def get_stats(self):
+        latencies = sorted(self._latencies)
+        stats = dict(self._counters)
+        stats['queue_depth'] = self.queue.qsize() if self.queue is not None else 0
+        stats['workers'] = self.workers if not self.inline else 0
+        stats['latency_ms'] = {
+            'avg': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+            'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2) if latencies else None,
+            'max': round(latencies[-1] * 1000, 2) if latencies else None,
+        }
+        return stats
+
+
+dispatcher = NotificationDispatcher()
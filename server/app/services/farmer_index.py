@@ -0,0 +1,147 @@
+from app.models.user import User
+from app.extensions import db, socketio
+from app.services import spatial_cells
+from geoalchemy2 import Geometry
+from geoalchemy2.shape import to_shape
+from sqlalchemy import and_, cast, func
+import numpy as np
+import threading
+import logging
+
+
+class FarmerIndex:
+    """
+    In-process index of approved farmers that have a location.
+    Farmers are bucketed by crop and geohash cell (the same cells used for the
+    socket rooms), so recipient resolution never touches the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._farmers = {}  # id -> (longitude, latitude, cell, crops)
+        self._buckets = {}  # crop -> {cell -> set(ids)}
+        self.loaded = False
+
+    @staticmethod
+    def _farmer_rows():
+        geometry = cast(User.location, Geometry)
+        return db.session.query(
+            User.id, func.ST_X(geometry), func.ST_Y(geometry), User.subscribed_crops
+        ).filter(
+            and_(
+                User.role == 'farmer',
+                User.is_approved == True,
+                User.location.is_not(None)
+            )
+        ).execution_options(yield_per=10000)
+
+    def load(self):
+        """(Re)build the index from the database"""
+        farmers, buckets = {}, {}
+        for user_id, longitude, latitude, crops in self._farmer_rows():
+            self._add(farmers, buckets, user_id, longitude, latitude, crops)
+        with self._lock:
+            self._farmers, self._buckets = farmers, buckets
+            self.loaded = True
+        logging.info(f"Farmer index loaded with {len(farmers)} farmers")
+
+    @staticmethod
+    def _add(farmers, buckets, user_id, longitude, latitude, crops):
+        cell = spatial_cells.encode(longitude, latitude)
+        crops = tuple(crops or ())
+        farmers[user_id] = (longitude, latitude, cell, crops)
+        for crop in crops:
+            buckets.setdefault(crop, {}).setdefault(cell, set()).add(user_id)
+
+    def upsert(self, user_id, longitude, latitude, crops):
+        with self._lock:
+            self.remove(user_id)
+            self._add(self._farmers, self._buckets, user_id, longitude, latitude, crops)
+
+    def remove(self, user_id):
+        with self._lock:
+            entry = self._farmers.pop(user_id, None)
+            if not entry:
+                return
+            _, _, cell, crops = entry
+            for crop in crops:
+                cells = self._buckets.get(crop, {})
+                members = cells.get(cell)
+                if members is not None:
+                    members.discard(user_id)
+                    if not members:
+                        del cells[cell]
+
+    def update_from_user(self, user):
+        """Keep the index in line with a user row after registration or a profile change"""
+        if user.role == 'farmer' and user.is_approved and user.location is not None:
+            point = to_shape(user.location)
+            self.upsert(user.id, point.x, point.y, user.subscribed_crops)
+        else:
+            self.remove(user.id)
+
+    def find_recipients(self, longitude, latitude, crop_type, radius):
+        """Return [(farmer_id, cell)] for farmers subscribed to crop_type within radius meters"""
+        full_cells, edge_cells = spatial_cells.covering_cells(longitude, latitude, radius)
+        recipients = []
+        candidates = []
+        with self._lock:
+            cells = self._buckets.get(crop_type, {})
+            for cell in full_cells:
+                recipients.extend((farmer_id, cell) for farmer_id in cells.get(cell, ()))
+            for cell in edge_cells:
+                candidates.extend(cells.get(cell, ()))
+            points = [self._farmers[farmer_id] for farmer_id in candidates]
+
+        if candidates:
+            # Exact great-circle check, vectorized over every farmer in the edge cells
+            coords = np.radians(np.array([(p[0], p[1]) for p in points], dtype=np.float64))
+            lon0, lat0 = np.radians(longitude), np.radians(latitude)
+            a = (np.sin((coords[:, 1] - lat0) / 2) ** 2
+                 + np.cos(lat0) * np.cos(coords[:, 1]) * np.sin((coords[:, 0] - lon0) / 2) ** 2)
+            distances = 2 * spatial_cells.EARTH_RADIUS * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+            for farmer_id, point, within in zip(candidates, points, distances <= radius):
+                if within:
+                    recipients.append((farmer_id, point[2]))
+        return recipients
+
+    def check_consistency(self, sample=50):
+        """Compare the index with the database and report differences"""
+        expected = {}
+        for user_id, longitude, latitude, crops in self._farmer_rows():
+            expected[user_id] = (spatial_cells.encode(longitude, latitude), tuple(crops or ()))
+        with self._lock:
+            indexed = {user_id: (entry[2], entry[3]) for user_id, entry in self._farmers.items()}
+
+        missing = [user_id for user_id in expected if user_id not in indexed]
+        extra = [user_id for user_id in indexed if user_id not in expected]
+        mismatched = [
+            user_id for user_id, entry in expected.items()
+            if user_id in indexed and (indexed[user_id][0] != entry[0] or set(indexed[user_id][1]) != set(entry[1]))
+        ]
+        return {
+            'consistent': not (missing or extra or mismatched),
+            'indexed': len(indexed),
+            'database': len(expected),
+            'missing': missing[:sample],
+            'extra': extra[:sample],
+            'mismatched': mismatched[:sample],
+        }
+
+    def start_refresh(self, app, interval):
+        """Periodically rebuild the index to pick up changes made by other processes"""
+        def refresh():
+            while True:
+                socketio.sleep(interval)
+                try:
+                    with app.app_context():
+                        self.load()
+                except Exception as e:
+                    logging.error(f"Farmer index refresh failed: {str(e)}")
+        socketio.start_background_task(refresh)
+
+    def __len__(self):
+        return len(self._farmers)
+
+
+farmer_index = FarmerIndex()
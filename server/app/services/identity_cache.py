@@ -0,0 +1,78 @@
+from app.models.user import User
+from flask import g, has_app_context
+from geoalchemy2.shape import to_shape
+import threading
+import time
+
+
+class UserIdentity:
+    """Detached snapshot of the user fields hot endpoints need"""
+    __slots__ = (
+        'id', 'role', 'is_approved', 'first_name', 'last_name',
+        'longitude', 'latitude', 'subscribed_crops', 'updated_at',
+    )
+
+    def __init__(self, user):
+        self.id = user.id
+        self.role = user.role
+        self.is_approved = user.is_approved
+        self.first_name = user.first_name
+        self.last_name = user.last_name
+        point = to_shape(user.location) if user.location is not None else None
+        self.longitude = point.x if point else None
+        self.latitude = point.y if point else None
+        self.subscribed_crops = list(user.subscribed_crops or [])
+        self.updated_at = user.updated_at
+
+    def can_make_alert(self):
+        return self.role == 'agronomist' and self.is_approved
+
+
+class IdentityCache:
+    """
+    Process-wide cache of UserIdentity with a short TTL, plus a per-request copy on flask.g.
+    Admin approve/decline/delete and profile updates invalidate entries in this process;
+    other processes see the change once the TTL runs out.
+    """
+
+    def __init__(self):
+        self.ttl = 0
+        self._entries = {}  # user id -> (expires_at, UserIdentity)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_IDENTITY_TTL', 30)
+
+    def get(self, user_id):
+        """Return the UserIdentity for user_id, or None if the user does not exist"""
+        user_id = int(user_id)
+        request_cache = g.setdefault('_identities', {})
+        if user_id in request_cache:
+            return request_cache[user_id]
+
+        identity = None
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > time.monotonic():
+                identity = entry[1]
+        if identity is None:
+            user = User.query.get(user_id)
+            if not user:
+                return None
+            identity = UserIdentity(user)
+            if self.ttl:
+                with self._lock:
+                    self._entries[user_id] = (time.monotonic() + self.ttl, identity)
+
+        request_cache[user_id] = identity
+        return identity
+
+    def invalidate(self, user_id):
+        user_id = int(user_id)
+        with self._lock:
+            self._entries.pop(user_id, None)
+        if has_app_context():
+            g.get('_identities', {}).pop(user_id, None)
+
+
+identity_cache = IdentityCache()
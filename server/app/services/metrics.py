@@ -0,0 +1,285 @@
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+import threading
+import logging
+import time
+
+# Request duration histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class NPlusOneError(Exception):
+    """Raised when METRICS_RAISE_ON_N_PLUS_ONE is set and a unit of work repeats a statement"""
+
+
+class UnitOfWork:
+    """What one request (or one background job) did: SQL statements and timed sections"""
+
+    def __init__(self, name, keep_statements):
+        self.name = name
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.sections = Counter()  # section -> seconds
+        self.statement_counts = Counter()
+        self.keep_statements = keep_statements
+        self.statements = []  # (seconds, sql) when keep_statements
+
+    def record_query(self, statement, seconds):
+        self.queries += 1
+        self.db_time += seconds
+        self.statement_counts[statement] += 1
+        if self.keep_statements:
+            self.statements.append((seconds, statement))
+
+    def repeated_statements(self, threshold):
+        """
+        SELECTs run at least threshold times, the usual sign of a lazy load in a loop.
+        Writes are left out: one INSERT per outbox room is expected
+        """
+        return [
+            (statement, count) for statement, count in self.statement_counts.items()
+            if count >= threshold and statement.lstrip()[:6].upper() == 'SELECT'
+        ]
+
+
+class Metrics:
+    """
+    Per-endpoint query counts and timings, exposed in the Prometheus text format on /metrics.
+    SQL is counted through engine events, sections (serialize, emit) through metrics.section,
+    and NotificationService functions through metrics.track. Numbers are per process.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_request_ms = 0
+        self.n_plus_one_threshold = 0
+        self.raise_on_n_plus_one = False
+        self._lock = threading.Lock()
+        self._listening = False
+        self.reset()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.slow_request_ms = app.config.get('METRICS_SLOW_REQUEST_MS', 0)
+        self.n_plus_one_threshold = app.config.get('METRICS_N_PLUS_ONE_THRESHOLD', 5)
+        self.raise_on_n_plus_one = app.config.get('METRICS_RAISE_ON_N_PLUS_ONE', False)
+        if not self.enabled:
+            return
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._listening = True
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def reset(self):
+        with self._lock:
+            self._requests = Counter()  # (endpoint, method, status) -> count
+            self._durations = {}  # endpoint -> [bucket counts..., sum, count]
+            self._queries = Counter()  # endpoint -> statements
+            self._db_seconds = Counter()  # endpoint -> seconds
+            self._sections = Counter()  # (endpoint, section) -> seconds
+            self._n_plus_one = Counter()  # endpoint -> units with repeated statements
+            self._slow = Counter()  # endpoint -> slow requests
+            self._functions = {}  # function -> [calls, seconds, queries]
+
+    # Units of work
+
+    def _current(self):
+        return g.get('_metrics_unit') if has_app_context() else None
+
+    def _start(self, name):
+        unit = UnitOfWork(name, keep_statements=self.slow_request_ms > 0)
+        g._metrics_unit = unit
+        return unit
+
+    def _finish(self, unit, labels=None):
+        g.pop('_metrics_unit', None)
+        elapsed = time.perf_counter() - unit.started
+        endpoint = unit.name
+        with self._lock:
+            if labels is not None:
+                self._requests[labels] += 1
+            buckets = self._durations.setdefault(endpoint, [0] * (len(BUCKETS) + 2))
+            for i, bound in enumerate(BUCKETS):
+                if elapsed <= bound:
+                    buckets[i] += 1
+            buckets[-2] += elapsed
+            buckets[-1] += 1
+            self._queries[endpoint] += unit.queries
+            self._db_seconds[endpoint] += unit.db_time
+            for section, seconds in unit.sections.items():
+                self._sections[(endpoint, section)] += seconds
+
+        if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+            with self._lock:
+                self._slow[endpoint] += 1
+            slowest = sorted(unit.statements, reverse=True)[:5]
+            logging.warning(
+                f"Slow {endpoint}: {elapsed * 1000:.0f} ms, {unit.queries} queries, {unit.db_time * 1000:.0f} ms in SQL"
+                + ''.join(f"\n  {seconds * 1000:.1f} ms  {' '.join(sql.split())[:500]}" for seconds, sql in slowest)
+            )
+
+        repeated = unit.repeated_statements(self.n_plus_one_threshold) if self.n_plus_one_threshold else []
+        if repeated:
+            with self._lock:
+                self._n_plus_one[endpoint] += 1
+            message = f"Possible N+1 in {endpoint}: " + '; '.join(
+                f"{count}x {' '.join(sql.split())[:200]}" for sql, count in repeated
+            )
+            logging.warning(message)
+            if self.raise_on_n_plus_one:
+                raise NPlusOneError(message)
+
+    @contextmanager
+    def capture(self, name='capture'):
+        """
+        Record everything inside the block as its own unit of work and yield it, e.g. in a test:
+            with metrics.capture() as unit:
+                NotificationService.notify_farmers_about_alerts(ids)
+            assert not unit.repeated_statements(3)
+        """
+        previous = g.pop('_metrics_unit', None)
+        unit = self._start(name)
+        try:
+            yield unit
+        finally:
+            g.pop('_metrics_unit', None)
+            if previous is not None:
+                g._metrics_unit = previous
+
+    # Flask hooks
+
+    def _before_request(self):
+        self._start(request.endpoint or 'unknown')
+
+    def _after_request(self, response):
+        unit = g.get('_metrics_unit')
+        if unit is not None:
+            self._finish(unit, (unit.name, request.method, response.status_code))
+        return response
+
+    # SQLAlchemy hooks
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        unit = self._current()
+        if unit is not None:
+            unit.record_query(statement, seconds)
+
+    # Instrumentation helpers
+
+    @contextmanager
+    def section(self, name):
+        """Time a block as a named section (serialize, emit) of the current request or job"""
+        unit = self._current()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if unit is not None:
+                unit.sections[name] += time.perf_counter() - start
+
+    def track(self, name):
+        """
+        Decorator recording calls, time and queries of a function. Outside a request
+        (dispatcher jobs) the call is also recorded as its own unit of work.
+        """
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or not has_app_context():
+                    return fn(*args, **kwargs)
+                unit = self._current()
+                own_unit = unit is None
+                if own_unit:
+                    unit = self._start(f'task:{name}')
+                queries_before = unit.queries
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - start
+                    with self._lock:
+                        stats = self._functions.setdefault(name, [0, 0.0, 0])
+                        stats[0] += 1
+                        stats[1] += elapsed
+                        stats[2] += unit.queries - queries_before
+                    if own_unit:
+                        self._finish(unit)
+            return wrapper
+        return decorator
+
+    # Exposition
+
+    def render(self):
+        """Prometheus text exposition format"""
+        def labels(**values):
+            return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in values.items()) + '}'
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(f'{name}{label} {value}' for label, value in samples)
+
+        with self._lock:
+            metric('cropalert_requests_total', 'counter', 'HTTP requests by endpoint, method and status', [
+                (labels(endpoint=e, method=m, status=s), count) for (e, m, s), count in sorted(self._requests.items())
+            ])
+            histogram = []
+            for endpoint, buckets in sorted(self._durations.items()):
+                # Bucket counts are already cumulative, see _finish
+                for bound, count in zip(BUCKETS, buckets):
+                    histogram.append((f'_bucket{labels(endpoint=endpoint, le=bound)}', count))
+                histogram.append((f'_bucket{labels(endpoint=endpoint, le="+Inf")}', buckets[-1]))
+                histogram.append((f'_sum{labels(endpoint=endpoint)}', round(buckets[-2], 6)))
+                histogram.append((f'_count{labels(endpoint=endpoint)}', buckets[-1]))
+            lines.append('# HELP cropalert_request_duration_seconds Request and job duration')
+            lines.append('# TYPE cropalert_request_duration_seconds histogram')
+            lines.extend(f'cropalert_request_duration_seconds{suffix} {value}' for suffix, value in histogram)
+            metric('cropalert_db_queries_total', 'counter', 'SQL statements executed', [
+                (labels(endpoint=e), v) for e, v in sorted(self._queries.items())
+            ])
+            metric('cropalert_db_seconds_total', 'counter', 'Time spent executing SQL', [
+                (labels(endpoint=e), round(v, 6)) for e, v in sorted(self._db_seconds.items())
+            ])
+            metric('cropalert_section_seconds_total', 'counter', 'Time spent serializing and emitting', [
+                (labels(endpoint=e, section=s), round(v, 6)) for (e, s), v in sorted(self._sections.items())
+            ])
+            metric('cropalert_n_plus_one_total', 'counter', 'Requests and jobs that repeated a statement', [
+                (labels(endpoint=e), v) for e, v in sorted(self._n_plus_one.items())
+            ])
+            metric('cropalert_slow_requests_total', 'counter', 'Requests and jobs over METRICS_SLOW_REQUEST_MS', [
+                (labels(endpoint=e), v) for e, v in sorted(self._slow.items())
+            ])
+            functions = sorted(self._functions.items())
+            metric('cropalert_function_calls_total', 'counter', 'Calls of instrumented functions', [
+                (labels(function=f), v[0]) for f, v in functions
+            ])
+            metric('cropalert_function_seconds_total', 'counter', 'Time in instrumented functions', [
+                (labels(function=f), round(v[1], 6)) for f, v in functions
+            ])
+            metric('cropalert_function_db_queries_total', 'counter', 'SQL statements issued by instrumented functions', [
+                (labels(function=f), v[2]) for f, v in functions
+            ])
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
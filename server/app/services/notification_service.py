@@ -1,15 +1,192 @@
 from app.models.user import User
 from app.models.alert import Alert
-from app.extensions import socketio
+from app.extensions import db
+from app.services.dispatch_queue import dispatcher
+from app.services import spatial_cells
+from app.services.farmer_index import farmer_index
+from app.services.coalescer import coalescer
+from app.services.metrics import metrics
+from app.schemas.alert import alert_coordinates
+from geoalchemy2 import Geometry
 from geoalchemy2.shape import to_shape
 from geoalchemy2.elements import WKTElement
-from sqlalchemy import and_
+from sqlalchemy import and_, cast, func
+from sqlalchemy.orm import joinedload
+from sqlalchemy.dialects.postgresql import array
 import logging
 
+ALERT_RADIUS = 10000  # meters
+# alert_payload needs the creator's name, load it in the same query as the alert
+CREATOR_NAME = joinedload(Alert.creator).load_only(User.first_name, User.last_name)
+
+
 class NotificationService:
-    
+
+    @staticmethod
+    @metrics.track('notification.find_recipients')
+    def find_recipients(longitude, latitude, crop_type, radius=ALERT_RADIUS):
+        """
+        Return [(farmer_id, cell)] for farmers who should receive an alert.
+        Served from the in-memory farmer index when it is loaded, otherwise from Postgres.
+        """
+        if farmer_index.loaded:
+            return farmer_index.find_recipients(longitude, latitude, crop_type, radius)
+
+        location_wkt = WKTElement(f'POINT({longitude} {latitude})', srid=4326)
+        # Only ids and cells are needed, so skip hydrating User objects
+        farmer_cell = func.ST_GeoHash(cast(User.location, Geometry), spatial_cells.CELL_PRECISION)
+        return db.session.query(User.id, farmer_cell).filter(
+            and_(
+                User.role == 'farmer',
+                User.is_approved == True,
+                User.location.is_not(None),
+                User.location.ST_DWithin(location_wkt, radius),
+                User.subscribed_crops.contains([crop_type])
+            )
+        ).all()
+
+    @staticmethod
+    @metrics.track('notification.broadcast_to_area')
+    def broadcast_to_area(event, data, longitude, latitude, crop_type, radius=ALERT_RADIUS, severity=None):
+        """
+        Emit once per cell room lying fully inside the alert radius, and per farmer
+        only for farmers sitting in the edge cells. Returns the number of farmers reached.
+        """
+        full_cells, edge_cells = spatial_cells.covering_cells(longitude, latitude, radius)
+        relevant_farmers = NotificationService.find_recipients(longitude, latitude, crop_type, radius)
+
+        occupied_cells = {cell for _, cell in relevant_farmers}
+        emit_count = 0
+        for cell in full_cells & occupied_cells:
+            coalescer.emit(event, data, spatial_cells.cell_room(cell, crop_type), severity)
+            emit_count += 1
+        for farmer_id, cell in relevant_farmers:
+            if cell in full_cells:
+                continue
+            try:
+                coalescer.emit(event, data, f"user_{farmer_id}", severity)
+                emit_count += 1
+            except Exception as e:
+                logging.error(f"Failed to send {event} to farmer {farmer_id}: {str(e)}")
+
+        logging.info(f"{event} reached {len(relevant_farmers)} farmers with {emit_count} emits")
+        return len(relevant_farmers)
+
+    @staticmethod
+    def alert_payload(alert, longitude, latitude):
+        """Body of a new alert notification"""
+        return {
+            'alert_id': alert.id,
+            'title': alert.title,
+            'description': alert.description,
+            'severity': alert.severity,
+            'alert_type': alert.alert_type,
+            'crop_type': alert.crop_type,
+            'created_at': alert.created_at.isoformat(),
+            'expires_at': alert.expires_at.isoformat() if alert.expires_at else None,
+            'location': [longitude, latitude],
+            'creator_name': f"{alert.creator.first_name} {alert.creator.last_name}"
+        }
+
     @staticmethod
-    def notify_farmers_about_alert(alert):
+    @metrics.track('notification.find_batch_recipients')
+    def find_batch_recipients(alert_ids, radius=ALERT_RADIUS):
+        """
+        Return [(farmer_id, alert_id)] for a batch of alerts: one lookup per alert against
+        the farmer index, or a single spatial join in Postgres when the index is not loaded
+        """
+        if farmer_index.loaded:
+            rows = db.session.query(Alert.id, Alert.crop_type, *alert_coordinates()).filter(Alert.id.in_(alert_ids)).all()
+            return [
+                (farmer_id, alert_id)
+                for alert_id, crop_type, longitude, latitude in rows
+                for farmer_id, _ in farmer_index.find_recipients(longitude, latitude, crop_type, radius)
+            ]
+
+        return db.session.query(User.id, Alert.id).join(
+            Alert,
+            and_(
+                User.location.ST_DWithin(Alert.location, radius),
+                User.subscribed_crops.contains(array([Alert.crop_type]))
+            )
+        ).filter(
+            and_(
+                Alert.id.in_(alert_ids),
+                User.role == 'farmer',
+                User.is_approved == True,
+                User.location.is_not(None)
+            )
+        ).all()
+
+    @staticmethod
+    @metrics.track('notification.notify_farmers_about_alerts')
+    def notify_farmers_about_alerts(alert_ids):
+        """
+        Notify farmers about a batch of new alerts, with one recipient lookup for the whole batch.
+        Each farmer gets the usual 'new_alert_notification' for every alert of the batch that
+        concerns them; the coalescer merges them when a coalescing window is set.
+        Returns the number of farmers notified.
+        """
+        rows = Alert.query.options(CREATOR_NAME).filter(Alert.id.in_(alert_ids)).add_columns(*alert_coordinates()).all()
+        payloads = {
+            alert.id: NotificationService.alert_payload(alert, longitude, latitude)
+            for alert, longitude, latitude in rows
+        }
+
+        per_farmer = {}
+        for farmer_id, alert_id in NotificationService.find_batch_recipients(list(payloads)):
+            per_farmer.setdefault(farmer_id, []).append(payloads[alert_id])
+
+        for farmer_id, alerts in per_farmer.items():
+            for alert in alerts:
+                try:
+                    coalescer.emit('new_alert_notification', alert, f"user_{farmer_id}", alert['severity'])
+                except Exception as e:
+                    logging.error(f"Failed to send new_alert_notification to farmer {farmer_id}: {str(e)}")
+
+        logging.info(f"Batch of {len(payloads)} alerts notified to {len(per_farmer)} farmers")
+        return len(per_farmer)
+
+    @staticmethod
+    def dispatch_new_alerts(alert_ids):
+        """
+        Queue one fan-out job for a batch of newly created alerts
+        """
+        dispatcher.enqueue('notify_new_alerts', list(alert_ids))
+
+    @staticmethod
+    def dispatch_new_alert(alert):
+        """
+        Queue the fan-out for a newly created alert and return right away
+        """
+        dispatcher.enqueue('notify_new_alert', alert.id)
+
+    @staticmethod
+    def alert_snapshot(alert):
+        """
+        The alert fields an update/delete notification needs, copied while the
+        alert can still be read: a deleted alert can't be loaded after the commit
+        """
+        alert_location = to_shape(alert.location)
+        return {
+            'id': alert.id,
+            'title': alert.title,
+            'crop_type': alert.crop_type,
+            'severity': alert.severity,
+            'location': [alert_location.x, alert_location.y],
+        }
+
+    @staticmethod
+    def dispatch_alert_update(snapshot, update_type='updated'):
+        """
+        Queue an update/delete notification for an alert_snapshot. Call it once
+        the change is committed, so farmers never hear of one that rolled back
+        """
+        dispatcher.enqueue('notify_alert_update', snapshot, update_type)
+
+    @staticmethod
+    @metrics.track('notification.notify_farmers_about_alert')
+    def notify_farmers_about_alert(alert, raise_errors=False):
         """
         Send real-time notifications to farmers who should receive this alert
         based on their location and subscribed crops
@@ -20,89 +197,71 @@ class NotificationService:
             alert_longitude = alert_location.x
             alert_latitude = alert_location.y
             
-            # Create WKT element for spatial query
-            location_wkt = WKTElement(f'POINT({alert_longitude} {alert_latitude})', srid=4326)
-            radius = 10000  # 10km radius
-            
-            # Find farmers who should receive this notification
-            relevant_farmers = User.query.filter(
-                and_(
-                    User.role == 'farmer',
-                    User.is_approved == True,
-                    User.location.is_not(None),
-                    User.location.ST_DWithin(location_wkt, radius),
-                    User.subscribed_crops.contains([alert.crop_type])
-                )
-            ).all()
-            
             # Prepare notification data
-            notification_data = {
-                'alert_id': alert.id,
-                'title': alert.title,
-                'description': alert.description,
-                'severity': alert.severity,
-                'alert_type': alert.alert_type,
-                'crop_type': alert.crop_type,
-                'created_at': alert.created_at.isoformat(),
-                'expires_at': alert.expires_at.isoformat() if alert.expires_at else None,
-                'location': [alert_longitude, alert_latitude],
-                'creator_name': f"{alert.creator.first_name} {alert.creator.last_name}"
-            }
-            
-            # Send notifications to relevant farmers
-            notification_count = 0
-            for farmer in relevant_farmers:
-                try:
-                    socketio.emit(
-                        'new_alert_notification',
-                        notification_data,
-                        room=f"user_{farmer.id}"
-                    )
-                    notification_count += 1
-                    logging.info(f"Notification sent to farmer {farmer.id} ({farmer.first_name} {farmer.last_name})")
-                except Exception as e:
-                    logging.error(f"Failed to send notification to farmer {farmer.id}: {str(e)}")
+            notification_data = NotificationService.alert_payload(alert, alert_longitude, alert_latitude)
             
+            notification_count = NotificationService.broadcast_to_area(
+                'new_alert_notification', notification_data,
+                alert_longitude, alert_latitude, alert.crop_type, severity=alert.severity
+            )
             logging.info(f"Alert {alert.id} notifications sent to {notification_count} farmers")
             return notification_count
             
         except Exception as e:
             logging.error(f"Error in notify_farmers_about_alert: {str(e)}")
+            if raise_errors:
+                raise
             return 0
     
     @staticmethod
-    def send_alert_update_notification(alert, update_type='updated'):
+    @metrics.track('notification.send_alert_update_notification')
+    def send_alert_update_notification(alert, update_type='updated', raise_errors=False):
         """
-        Send notifications when an alert is updated or deleted
+        Send notifications when an alert is updated or deleted.
+        `alert` is either an Alert or the dict built by alert_snapshot
         """
         try:
-            alert_location = to_shape(alert.location)
-            location_wkt = WKTElement(f'POINT({alert_location.x} {alert_location.y})', srid=4326)
-            radius = 10000
-            
-            relevant_farmers = User.query.filter(
-                and_(
-                    User.role == 'farmer',
-                    User.is_approved == True,
-                    User.location.is_not(None),
-                    User.location.ST_DWithin(location_wkt, radius),
-                    User.subscribed_crops.contains([alert.crop_type])
-                )
-            ).all()
-            
+            if isinstance(alert, dict):
+                alert_id, title, crop_type = alert['id'], alert['title'], alert['crop_type']
+                severity = alert.get('severity')
+                longitude, latitude = alert['location']
+            else:
+                alert_id, title, crop_type = alert.id, alert.title, alert.crop_type
+                severity = alert.severity
+                alert_location = to_shape(alert.location)
+                longitude, latitude = alert_location.x, alert_location.y
             notification_data = {
-                'alert_id': alert.id,
-                'title': alert.title,
+                'alert_id': alert_id,
+                'title': title,
                 'update_type': update_type,  # 'updated' or 'deleted'
-                'message': f"Alert '{alert.title}' has been {update_type}"
+                'message': f"Alert '{title}' has been {update_type}"
             }
-            
-            for farmer in relevant_farmers:
-                socketio.emit(
-                    'alert_update_notification',
-                    notification_data,
-                    room=f"user_{farmer.id}"
-                )
+
+            NotificationService.broadcast_to_area(
+                'alert_update_notification', notification_data,
+                longitude, latitude, crop_type, severity=severity
+            )
             
         except Exception as e:
             logging.error(f"Error in send_alert_update_notification: {str(e)}")
+            if raise_errors:
+                raise
+
+
+@dispatcher.task('notify_new_alert')
+def notify_new_alert_job(alert_id):
+    alert = db.session.get(Alert, alert_id, options=[CREATOR_NAME])
+    if not alert:
+        # Deleted before the job ran, nothing left to announce
+        return
+    NotificationService.notify_farmers_about_alert(alert, raise_errors=True)
+
+
+@dispatcher.task('notify_new_alerts')
+def notify_new_alerts_job(alert_ids):
+    NotificationService.notify_farmers_about_alerts(alert_ids)
+
+
+@dispatcher.task('notify_alert_update')
+def notify_alert_update_job(alert_snapshot, update_type):
+    NotificationService.send_alert_update_notification(alert_snapshot, update_type, raise_errors=True)
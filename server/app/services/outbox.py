@@ -0,0 +1,251 @@
+from app.models.notification_outbox import OutboxMessage, NotificationAck
+from app.extensions import db, socketio
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import threading
+import logging
+import random
+import time
+import zlib
+
+# Sequence numbers are (milliseconds since EPOCH_MS << 22) | (node << 12) | counter: increasing
+# with time on every worker and unique per worker without asking the database. 41 bits of
+# milliseconds keep them within a BIGINT for ~69 years, and above the old serial ids
+EPOCH_MS = 1704067200000  # 2024-01-01
+NODE_BITS = 10
+COUNTER_BITS = 12
+# Rows per multi-row INSERT when flushing
+WRITE_CHUNK = 1000
+
+
+class NotificationOutbox:
+    """
+    Bounded log of the notifications sent to each socket room, so disconnected clients can catch up.
+    record() never waits on the database: it numbers the message, keeps it in the room's in-memory
+    ring buffer and queues it; a background task writes the queue every NOTIFICATION_OUTBOX_FLUSH_INTERVAL
+    seconds with one INSERT. Replays are served from the ring buffers when this process saw every
+    message of the rooms (single worker), otherwise from the table plus what is still queued here.
+
+    With several workers another one may still hold queued messages numbered below what this one
+    has written. Replays, acks and starting points then stop at a watermark every worker has
+    written by now (one flush interval plus NOTIFICATION_OUTBOX_CLOCK_SKEW_MS ago), so a client
+    never moves past a message that shows up later. It may get some messages twice; seq tells them apart.
+    Rows a worker could not write stay queued and are retried; keep the skew above the longest outage.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.shared = False
+        self.size = 0
+        self.replay_limit = 0
+        self.retention = None
+        self.flush_interval = 1
+        self.clock_skew_ms = 0
+        self.queue_limit = 0
+        self.memory_rooms = 0
+        self.node = 0
+        self._last_ms = 0
+        self._counter = 0
+        self._rings = OrderedDict()  # room -> deque([(seq, event, data)]), least recently used first
+        self._queue = deque()  # rows waiting for the next flush
+        self._memory_floor = 0  # replays from before this seq need the table
+        self._lock = threading.Lock()
+        self._started = False
+        self._stats = {'recorded': 0, 'written': 0, 'dropped': 0, 'flush_errors': 0}
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('NOTIFICATION_OUTBOX_ENABLED', True)
+        # With a message queue other workers emit to the same rooms, so memory alone is incomplete
+        self.shared = bool(app.config.get('SOCKETIO_MESSAGE_QUEUE'))
+        self.size = app.config.get('NOTIFICATION_OUTBOX_SIZE', 200)
+        self.replay_limit = app.config.get('NOTIFICATION_OUTBOX_REPLAY_LIMIT', 500)
+        self.retention = timedelta(days=app.config.get('NOTIFICATION_OUTBOX_RETENTION_DAYS', 7))
+        self.flush_interval = app.config.get('NOTIFICATION_OUTBOX_FLUSH_INTERVAL', 1)
+        self.clock_skew_ms = app.config.get('NOTIFICATION_OUTBOX_CLOCK_SKEW_MS', 1000)
+        self.queue_limit = app.config.get('NOTIFICATION_OUTBOX_QUEUE_LIMIT', 50000)
+        self._queue = deque(maxlen=self.queue_limit)
+        self.memory_rooms = app.config.get('NOTIFICATION_OUTBOX_MEMORY_ROOMS', 20000)
+        node_id = app.config.get('SOCKETIO_NODE_ID')
+        self.node = zlib.crc32(node_id.encode()) if node_id else random.getrandbits(NODE_BITS)
+        self.node &= (1 << NODE_BITS) - 1
+        # Anything before this process started is only in the table
+        self._memory_floor = self._seq_at(int(time.time() * 1000)) - 1
+
+    def _seq_at(self, ms):
+        """Lowest sequence number of millisecond ms, any worker"""
+        return (ms - EPOCH_MS) << (NODE_BITS + COUNTER_BITS)
+
+    def watermark(self):
+        """
+        Messages numbered up to here are written or queued on every worker that will ever have
+        them. Without other workers that is everything so far
+        """
+        now = int(time.time() * 1000)
+        if not self.shared:
+            # The last number handed out here; every later one is above it
+            with self._lock:
+                last = (self._last_ms << (NODE_BITS + COUNTER_BITS)) | (self.node << COUNTER_BITS) | self._counter
+            return max(last, self._seq_at(now) - 1)
+        return self._seq_at(now - int(self.flush_interval * 1000) - self.clock_skew_ms) - 1
+
+    def current_seq(self):
+        """Where clients starting fresh begin: no message after it can still show up below it"""
+        return self.watermark()
+
+    def _next_seq(self):
+        # Called with the lock held
+        now = int(time.time() * 1000) - EPOCH_MS
+        if now > self._last_ms:
+            self._last_ms, self._counter = now, 0
+        else:
+            self._counter += 1
+            if self._counter >> COUNTER_BITS:
+                self._last_ms, self._counter = self._last_ms + 1, 0
+        return (self._last_ms << (NODE_BITS + COUNTER_BITS)) | (self.node << COUNTER_BITS) | self._counter
+
+    def record(self, room, event, data):
+        """Number a message and keep it for replay, returns its sequence number or None when the outbox is off"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            seq = self._next_seq()
+            ring = self._rings.pop(room, None)
+            if ring is None:
+                ring = deque(maxlen=self.size)
+            self._rings[room] = ring
+            ring.append((seq, event, data))
+            while len(self._rings) > self.memory_rooms:
+                _, evicted = self._rings.popitem(last=False)
+                self._memory_floor = max(self._memory_floor, evicted[-1][0])
+
+            if len(self._queue) == self._queue.maxlen:
+                # The database is not keeping up or is down: the oldest row goes, live delivery goes on
+                self._stats['dropped'] += 1
+            self._queue.append({'id': seq, 'room': room, 'event': event, 'payload': data, 'created_at': datetime.utcnow()})
+            self._stats['recorded'] += 1
+            self._start_flusher()
+        return seq
+
+    def _start_flusher(self):
+        # Called with the lock held
+        if self._started or self.app is None:
+            return
+        self._started = True
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.flush_interval)
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                logging.error(f"Notification outbox flush failed: {str(e)}")
+
+    def flush(self):
+        """Write the queued messages, one INSERT per WRITE_CHUNK rows. Returns the number written"""
+        with self._lock:
+            rows, self._queue = list(self._queue), deque(maxlen=self.queue_limit)
+        if not rows:
+            return 0
+        try:
+            # Own transaction so writing never commits or rolls back a request's session
+            with db.engine.begin() as conn:
+                for start in range(0, len(rows), WRITE_CHUNK):
+                    conn.execute(pg_insert(OutboxMessage).values(rows[start:start + WRITE_CHUNK]).on_conflict_do_nothing())
+        except Exception:
+            with self._lock:
+                # Retry with the next flush, keeping the newest rows within the limit
+                self._queue = deque(rows + list(self._queue), maxlen=self.queue_limit)
+                self._stats['flush_errors'] += 1
+            raise
+        with self._lock:
+            self._stats['written'] += len(rows)
+        return len(rows)
+
+    def replay(self, rooms, since):
+        """
+        Up to replay_limit messages for any of rooms after sequence number since, oldest first,
+        as ([{'seq', 'event', 'data'}], has_more). Page on with the last seq while has_more.
+        Only messages up to the watermark are returned, and a since past it is moved back to it.
+        """
+        if not self.enabled or not rooms:
+            return [], False
+        rooms = set(rooms)
+        watermark = self.watermark()
+        since = min(since, watermark)
+        with self._lock:
+            local = not self.shared and since >= self._memory_floor and all(
+                room not in self._rings or len(self._rings[room]) < self.size or self._rings[room][0][0] <= since
+                for room in rooms
+            )
+            if local:
+                messages = [message for room in rooms for message in self._rings.get(room, ()) if message[0] > since]
+            else:
+                # Queued here but not written yet
+                messages = [
+                    (row['id'], row['event'], row['payload']) for row in self._queue
+                    if row['room'] in rooms and since < row['id'] <= watermark
+                ]
+        if not local:
+            messages += db.session.execute(
+                select(OutboxMessage.id, OutboxMessage.event, OutboxMessage.payload)
+                .where(OutboxMessage.room.in_(list(rooms)), OutboxMessage.id > since, OutboxMessage.id <= watermark)
+                .order_by(OutboxMessage.id)
+                .limit(self.replay_limit + 1)
+            ).all()
+        messages = sorted({seq: (seq, event, data) for seq, event, data in messages}.values(), key=lambda m: m[0])
+        has_more = len(messages) > self.replay_limit
+        return [{'seq': seq, 'event': event, 'data': data} for seq, event, data in messages[:self.replay_limit]], has_more
+
+    def last_ack(self, user_id):
+        """Highest sequence number the user acknowledged, None if they never did"""
+        return db.session.scalar(select(NotificationAck.seq).where(NotificationAck.user_id == user_id))
+
+    def ack(self, user_id, seq):
+        """Store seq as the user's ack, no further than the watermark so a later replay still covers the rest"""
+        seq = min(seq, self.watermark())
+        statement = pg_insert(NotificationAck).values(user_id=user_id, seq=seq)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[NotificationAck.user_id],
+            set_={'seq': func.greatest(NotificationAck.seq, statement.excluded.seq)}
+        ))
+        db.session.commit()
+
+    def prune(self):
+        """Keep only the newest `size` messages per room, and nothing older than the retention"""
+        ranked = select(
+            OutboxMessage.id,
+            func.row_number().over(partition_by=OutboxMessage.room, order_by=OutboxMessage.id.desc()).label('position')
+        ).subquery()
+        overflow = select(ranked.c.id).where(ranked.c.position > self.size)
+        result = db.session.execute(delete(OutboxMessage).where(
+            OutboxMessage.id.in_(overflow) | (OutboxMessage.created_at < datetime.utcnow() - self.retention)
+        ))
+        db.session.commit()
+        return result.rowcount
+
+    def start_pruner(self, app, interval):
+        def run():
+            while True:
+                socketio.sleep(interval)
+                try:
+                    with app.app_context():
+                        self.prune()
+                except Exception as e:
+                    logging.error(f"Notification outbox pruning failed: {str(e)}")
+        socketio.start_background_task(run)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queued'] = len(self._queue)
+            stats['rooms_in_memory'] = len(self._rings)
+        return stats
+
+
+outbox = NotificationOutbox()
@@ -0,0 +1,82 @@
+from app.extensions import bcrypt, socketio
+from concurrent.futures import ThreadPoolExecutor
+from flask import jsonify
+import threading
+import logging
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when no hashing slot frees up within PASSWORD_HASH_TIMEOUT seconds"""
+
+
+class PasswordHasher:
+    """
+    bcrypt off the request thread. Under eventlet and gevent a hash would hold the
+    worker's only OS thread, stalling every request and websocket for its duration,
+    so hashes run in the green thread library's native thread pool (plain threads
+    otherwise; bcrypt releases the GIL). A semaphore keeps at most PASSWORD_HASH_WORKERS
+    hashes running, later callers wait up to PASSWORD_HASH_TIMEOUT and get a 503.
+    """
+
+    def __init__(self):
+        self.rounds = 12
+        self.timeout = 10
+        self._slots = None
+        self._execute = None
+        self._executor = None
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+        workers = app.config.get('PASSWORD_HASH_WORKERS', 4)
+
+        # Green semaphores so waiting for a slot only blocks the green thread, monkey patched or not
+        async_mode = socketio.server.eio.async_mode
+        if async_mode == 'eventlet':
+            from eventlet import tpool
+            from eventlet.semaphore import BoundedSemaphore
+            self._slots = BoundedSemaphore(workers)
+            self._execute = tpool.execute
+        elif async_mode == 'gevent':
+            import gevent
+            from gevent.lock import BoundedSemaphore
+            self._slots = BoundedSemaphore(workers)
+            self._execute = lambda fn, *args: gevent.get_hub().threadpool.apply(fn, args)
+        else:
+            self._slots = threading.BoundedSemaphore(workers)
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+            self._execute = lambda fn, *args: self._executor.submit(fn, *args).result()
+        app.register_error_handler(PasswordHasherBusy, self._busy_response)
+
+    def _offload(self, fn, *args):
+        if self._slots is None:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.timeout):
+            logging.warning(f"Password hashing saturated, no slot within {self.timeout}s")
+            raise PasswordHasherBusy()
+        try:
+            return self._execute(fn, *args)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._offload(bcrypt.generate_password_hash, password, self.rounds).decode('utf-8')
+
+    def verify(self, password_hash, password):
+        return self._offload(bcrypt.check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when the hash was made with another work factor than BCRYPT_LOG_ROUNDS"""
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def _busy_response(self, error):
+        response = jsonify({'error': 'Server busy, please retry'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+
+
+password_hasher = PasswordHasher()
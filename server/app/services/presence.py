@@ -0,0 +1,152 @@
+import socket
+import threading
+import json
+import sys
+import os
+
+
+class ConnectionRecord:
+    """
+    What is kept per connected socket. Rooms are a tuple (a farmer has a few) of interned
+    names, so the sockets of a cell share the strings instead of holding a set each
+    """
+    __slots__ = ('user_id', 'rooms', 'node')
+
+    def __init__(self, user_id, rooms, node):
+        self.user_id = str(user_id)
+        self.rooms = tuple([sys.intern(room) for room in rooms])
+        self.node = node
+
+
+class MemoryPresence:
+    """Connected sockets of this process only, for single process deployments"""
+
+    def __init__(self):
+        self._sockets = {}  # sid -> ConnectionRecord
+        self._lock = threading.Lock()
+
+    def add(self, sid, user_id, rooms, node):
+        with self._lock:
+            self._sockets[sid] = ConnectionRecord(user_id, rooms, node)
+
+    def get(self, sid):
+        with self._lock:
+            return self._sockets.get(sid)
+
+    def set_rooms(self, sid, rooms):
+        with self._lock:
+            entry = self._sockets.get(sid)
+            if entry is not None:
+                self._sockets[sid] = ConnectionRecord(entry.user_id, rooms, entry.node)
+
+    def remove(self, sid):
+        with self._lock:
+            return self._sockets.pop(sid, None)
+
+    def sids_for(self, user_id):
+        with self._lock:
+            return [sid for sid, entry in self._sockets.items() if entry.user_id == str(user_id)]
+
+    def purge_node(self, node):
+        with self._lock:
+            for sid in [sid for sid, entry in self._sockets.items() if entry.node == node]:
+                del self._sockets[sid]
+
+    def count(self):
+        with self._lock:
+            return {'sockets': len(self._sockets), 'users': len({e.user_id for e in self._sockets.values()})}
+
+
+class RedisPresence:
+    """Connected sockets of every worker, shared through Redis"""
+
+    def __init__(self, client, prefix='presence:'):
+        self.client = client
+        self.prefix = prefix
+
+    def add(self, sid, user_id, rooms, node):
+        entry = json.dumps({'user_id': str(user_id), 'rooms': sorted(rooms), 'node': node})
+        pipe = self.client.pipeline()
+        pipe.hset(self.prefix + 'sockets', sid, entry)
+        pipe.sadd(f'{self.prefix}user:{user_id}', sid)
+        pipe.sadd(f'{self.prefix}node:{node}', sid)
+        pipe.execute()
+
+    def get(self, sid):
+        raw = self.client.hget(self.prefix + 'sockets', sid)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return ConnectionRecord(entry['user_id'], entry['rooms'], entry['node'])
+
+    def set_rooms(self, sid, rooms):
+        entry = self.get(sid)
+        if entry is not None:
+            self.add(sid, entry.user_id, rooms, entry.node)
+
+    def remove(self, sid):
+        entry = self.get(sid)
+        if entry is None:
+            return None
+        pipe = self.client.pipeline()
+        pipe.hdel(self.prefix + 'sockets', sid)
+        pipe.srem(f"{self.prefix}user:{entry.user_id}", sid)
+        pipe.srem(f"{self.prefix}node:{entry.node}", sid)
+        pipe.execute()
+        return entry
+
+    def sids_for(self, user_id):
+        return [s.decode() if isinstance(s, bytes) else s for s in self.client.smembers(f'{self.prefix}user:{user_id}')]
+
+    def purge_node(self, node):
+        """Forget sockets a previous run of this node left behind (crash, restart)"""
+        for sid in self.client.smembers(f'{self.prefix}node:{node}'):
+            self.remove(sid.decode() if isinstance(sid, bytes) else sid)
+        self.client.delete(f'{self.prefix}node:{node}')
+
+    def count(self):
+        users = len({json.loads(raw)['user_id'] for raw in self.client.hvals(self.prefix + 'sockets')})
+        return {'sockets': self.client.hlen(self.prefix + 'sockets'), 'users': users}
+
+
+class Presence:
+    """
+    Who is connected, on which worker, and in which rooms.
+    Kept outside process memory when several workers share a message queue,
+    so any worker can find and move the sockets of a user connected elsewhere.
+    """
+
+    def __init__(self):
+        self.backend = MemoryPresence()
+        self.node = f'{socket.gethostname()}:{os.getpid()}'
+
+    def init_app(self, app):
+        # A stable SOCKETIO_NODE_ID per worker lets a restarted worker clean up after its previous run
+        self.node = app.config.get('SOCKETIO_NODE_ID') or f'{socket.gethostname()}:{os.getpid()}'
+        if app.config.get('PRESENCE_BACKEND', 'memory') == 'redis':
+            import redis  # optional dependency, only needed for the redis backend
+            self.backend = RedisPresence(redis.Redis.from_url(app.config['REDIS_URL']))
+        else:
+            self.backend = MemoryPresence()
+        self.backend.purge_node(self.node)
+
+    def add(self, sid, user_id, rooms):
+        self.backend.add(sid, user_id, rooms, self.node)
+
+    def get(self, sid):
+        return self.backend.get(sid)
+
+    def set_rooms(self, sid, rooms):
+        self.backend.set_rooms(sid, rooms)
+
+    def remove(self, sid):
+        return self.backend.remove(sid)
+
+    def sids_for(self, user_id):
+        return self.backend.sids_for(user_id)
+
+    def count(self):
+        return self.backend.count()
+
+
+presence = Presence()
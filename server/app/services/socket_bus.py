@@ -0,0 +1,42 @@
+import socketio
+import threading
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """
+    In-process stand-in for the Redis/Kombu message queue managers.
+    Every manager created with the same channel in this process shares one bus,
+    so several Socket.IO servers in one process (tests, local load runs)
+    behave like workers connected to the same message queue.
+    """
+    name = 'local'
+    _subscribers = {}  # channel -> [queue]
+    _lock = threading.Lock()
+
+    def __init__(self, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _publish(self, data):
+        with self._lock:
+            queues = list(self._subscribers.get(self.channel, []))
+        for queue in queues:
+            queue.put(data)
+
+    def _listen(self):
+        queue = self.server.eio.create_queue()
+        with self._lock:
+            self._subscribers.setdefault(self.channel, []).append(queue)
+        while True:
+            yield queue.get()
+
+
+def socketio_options(config):
+    """Keyword arguments for socketio.init_app matching SOCKETIO_MESSAGE_QUEUE"""
+    options = {'transports': config['SOCKETIO_TRANSPORTS'], 'async_mode': config['SOCKETIO_ASYNC_MODE']}
+    url = config['SOCKETIO_MESSAGE_QUEUE']
+    if url == 'local://':
+        options['client_manager'] = LocalPubSubManager(channel=config['SOCKETIO_CHANNEL'])
+    elif url:
+        options['message_queue'] = url
+        options['channel'] = config['SOCKETIO_CHANNEL']
+    return options
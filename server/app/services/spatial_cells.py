@@ -0,0 +1,119 @@
+import math
+
+# Geohash cells are used as socket room keys, so the same encoding must be
+# produced here and by PostGIS ST_GeoHash. Precision 5 is ~4.9km x 4.9km at the equator.
+CELL_PRECISION = 5
+EARTH_RADIUS = 6371008.8  # meters
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+
+
+def encode(longitude, latitude, precision=CELL_PRECISION):
+    lon_range = [-180.0, 180.0]
+    lat_range = [-90.0, 90.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        value_range, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            value_range[0] = mid
+        else:
+            bits = bits << 1
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(geohash)
+
+
+def bounds(geohash):
+    """Return (min_lon, min_lat, max_lon, max_lat) of a cell"""
+    lon_range = [-180.0, 180.0]
+    lat_range = [-90.0, 90.0]
+    even = True
+    for char in geohash:
+        bits = _DECODE[char]
+        for shift in range(4, -1, -1):
+            value_range = lon_range if even else lat_range
+            mid = (value_range[0] + value_range[1]) / 2
+            if (bits >> shift) & 1:
+                value_range[0] = mid
+            else:
+                value_range[1] = mid
+            even = not even
+    return lon_range[0], lat_range[0], lon_range[1], lat_range[1]
+
+
+def cell_size(precision=CELL_PRECISION):
+    """Return (width, height) of a cell in degrees"""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 360.0 / (1 << lon_bits), 180.0 / (1 << lat_bits)
+
+
+def distance(lon1, lat1, lon2, lat2):
+    """Great-circle distance in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bbox_area(min_lon, min_lat, max_lon, max_lat):
+    """Area of a lon/lat box in square meters, min_lon > max_lon wraps the antimeridian"""
+    width = (max_lon - min_lon) % 360.0 or (360.0 if max_lon != min_lon else 0.0)
+    return EARTH_RADIUS ** 2 * math.radians(width) * abs(math.sin(math.radians(max_lat)) - math.sin(math.radians(min_lat)))
+
+
+def covering_cells(longitude, latitude, radius, precision=CELL_PRECISION):
+    """
+    Split the cells touched by a circle into cells lying entirely inside it
+    and edge cells that need an exact distance check per farmer.
+    Returns (full_cells, edge_cells) as sets of geohashes.
+    """
+    d_lat = math.degrees(radius / EARTH_RADIUS)
+    d_lon = d_lat / max(math.cos(math.radians(latitude)), 1e-6)
+    width, height = cell_size(precision)
+    # Keep a small margin so spheroid vs sphere differences never misclassify a cell as full
+    inner_radius = radius * 0.995
+
+    full_cells, edge_cells = set(), set()
+    lat = latitude - d_lat
+    while lat < latitude + d_lat + height:
+        lon = longitude - d_lon
+        while lon < longitude + d_lon + width:
+            cell = encode(max(-180.0, min(lon, 179.999999)), max(-90.0, min(lat, 89.999999)), precision)
+            if cell not in full_cells and cell not in edge_cells:
+                min_lon, min_lat, max_lon, max_lat = bounds(cell)
+                nearest_lon = min(max(longitude, min_lon), max_lon)
+                nearest_lat = min(max(latitude, min_lat), max_lat)
+                if distance(longitude, latitude, nearest_lon, nearest_lat) <= radius:
+                    corners = [(min_lon, min_lat), (min_lon, max_lat), (max_lon, min_lat), (max_lon, max_lat)]
+                    if all(distance(longitude, latitude, x, y) <= inner_radius for x, y in corners):
+                        full_cells.add(cell)
+                    else:
+                        edge_cells.add(cell)
+            lon += width
+        lat += height
+    return full_cells, edge_cells
+
+
+def cell_room(cell, crop_type):
+    return f"cell_{cell}_{crop_type}"
+
+
+def cell_rooms(cell, crops):
+    return [cell_room(cell, crop) for crop in (crops or [])]
+
+
+def farmer_rooms(longitude, latitude, subscribed_crops):
+    """Rooms a farmer joins so regional alerts reach them with a single broadcast"""
+    return cell_rooms(encode(longitude, latitude), subscribed_crops)
@@ -0,0 +1,77 @@
+from sqlalchemy import Float, cast, func
+from app.extensions import db
+from app.models.user import User
+
+MIN_TERM_LENGTH = 2
+# Size of the plain (unpaged) result list, clients page with ?limit=&cursor= for more
+RESULT_LIMIT = 50
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def normalize(term):
+    """Collapse whitespace in a search term. Raises ValueError if it is empty or too short"""
+    term = ' '.join((term or '').split())
+    if not term:
+        raise ValueError('No search query provided')
+    if len(term) < MIN_TERM_LENGTH:
+        raise ValueError(f'Search query must be at least {MIN_TERM_LENGTH} characters')
+    return term
+
+
+def search(term, role=None):
+    """
+    Users whose name or email contains every word of term, as a query of (User, rank) rows
+    and the keyset to order and page it by (best match first). The ILIKE conditions run on
+    users.search_text through its trigram index, rank is pg_trgm word_similarity.
+    """
+    rank = cast(func.word_similarity(term, User.search_text), Float).label('rank')
+    conditions = [User.search_text.ilike(f'%{_escape_like(word)}%', escape='\\') for word in term.split()]
+    if role:
+        conditions.append(User.role == role)
+    return db.session.query(User, rank).filter(*conditions), (rank, User.id)
+
+
+def best_matches(query, keyset, limit=RESULT_LIMIT):
+    return query.order_by(*[column.desc() for column in keyset]).limit(limit).all()
+
+
+def autocomplete(prefix, role=None, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Up to limit users whose first or last name starts with prefix, or with 'first last'
+    prefixes when it has several words. Served by the lower(name) text_pattern_ops indexes.
+    """
+    words = prefix.lower().split()
+    columns = (User.id, User.first_name, User.last_name, User.role)
+    if len(words) > 1:
+        candidates = [
+            db.session.query(*columns).filter(
+                func.lower(User.first_name).like(_escape_like(words[0]) + '%', escape='\\'),
+                func.lower(User.last_name).like(_escape_like(' '.join(words[1:])) + '%', escape='\\'),
+            ).order_by(func.lower(User.first_name), User.id)
+        ]
+    else:
+        pattern = _escape_like(words[0]) + '%'
+        candidates = [
+            db.session.query(*columns).filter(func.lower(column).like(pattern, escape='\\'))
+            .order_by(func.lower(column), User.id)
+            for column in (User.first_name, User.last_name)
+        ]
+
+    matches = {}
+    for query in candidates:
+        if role:
+            query = query.filter(User.role == role)
+        for row in query.limit(limit):
+            matches.setdefault(row.id, row)
+    rows = sorted(matches.values(), key=lambda row: (row.first_name.lower(), row.last_name.lower(), row.id))
+    return [{
+        'id': row.id,
+        'first_name': row.first_name,
+        'last_name': row.last_name,
+        'role': row.role,
+    } for row in rows[:limit]]
@@ -0,0 +1,24 @@
+from flask import make_response, request
+import hashlib
+
+
+def make_etag(*parts):
+    """Strong validator derived from whatever the response depends on"""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def conditional_response(etag, last_modified, build):
+    """
+    Answer 304 Not Modified when the client's If-None-Match matches etag,
+    otherwise call build() for the full response. Either way the ETag and
+    Last-Modified headers are set and clients are asked to revalidate.
+    """
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(build())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,101 @@
+from flask import Response, current_app, request, stream_with_context
+from sqlalchemy import DateTime, literal, tuple_
+from sqlalchemy.engine import Row
+from datetime import datetime
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+
+def encode_cursor(values):
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, columns):
+    """Turn a cursor back into values typed like the keyset columns. Raises ValueError if malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('Invalid cursor')
+    return [
+        datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+        for column, value in zip(columns, values)
+    ]
+
+
+def wants_page():
+    return 'limit' in request.args or 'cursor' in request.args
+
+
+def wants_stream():
+    return request.args.get('stream') == 'true'
+
+
+def _after_cursor(query, columns):
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return query
+    values = decode_cursor(cursor, columns)
+    return query.filter(tuple_(*columns) < tuple_(*[literal(v, c.type) for c, v in zip(columns, values)]))
+
+
+def _keyset_value(row, column):
+    if isinstance(row, Row):
+        # Rows of (entity, extra columns...): labelled columns (a search rank) are on the row, the rest on the entity
+        mapping = row._mapping
+        return mapping[column.key] if column.key in mapping else getattr(row[0], column.key)
+    return getattr(row, column.key)
+
+
+def keyset_page(query, columns, serialize):
+    """
+    Return one page ordered by `columns` descending, read from the request's
+    `limit` and `cursor` args: {'items': [...], 'next_cursor': str or None}.
+    Raises ValueError on a bad limit or cursor.
+    """
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('Limit must be an integer')
+    if limit <= 0:
+        raise ValueError('Limit must be a positive number')
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    query = _after_cursor(query, columns).order_by(*[column.desc() for column in columns])
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor([_keyset_value(rows[-1], column) for column in columns])
+    return {'items': serialize(rows), 'next_cursor': next_cursor}
+
+
+def stream_ndjson(query, columns, serialize):
+    """
+    Stream every row as newline delimited JSON from a server-side cursor,
+    serializing batch by batch so the full result is never held in memory.
+    Raises ValueError on a bad cursor.
+    """
+    query = _after_cursor(query, columns).order_by(*[column.desc() for column in columns])
+    query = query.yield_per(STREAM_BATCH_SIZE)
+
+    def generate():
+        batch = []
+        for row in query:
+            batch.append(row)
+            if len(batch) == STREAM_BATCH_SIZE:
+                for item in serialize(batch):
+                    yield current_app.json.dumps(item) + '\n'
+                batch = []
+        for item in serialize(batch):
+            yield current_app.json.dumps(item) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
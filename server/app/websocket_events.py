@@ -2,11 +2,51 @@ from flask_socketio import emit, join_room, leave_room, disconnect
 from flask import request
 from flask_jwt_extended import decode_token, jwt_required
 from app.models.user import User
-from app.extensions import db
+from app.extensions import db, socketio
+from app.services import spatial_cells
+from app.services.outbox import outbox
+from app.services.presence import presence
+from app.services.auth_tokens import revocations
+from geoalchemy2.shape import to_shape
 import logging
 
-# Store connected users and their socket IDs
-connected_users = {}
+def location_rooms_for(user):
+    """Server computed cell rooms for a farmer, empty for other roles or without a location"""
+    if user.role != 'farmer' or not user.location:
+        return []
+    point = to_shape(user.location)
+    return spatial_cells.farmer_rooms(point.x, point.y, user.subscribed_crops)
+
+
+def sync_location_rooms(user):
+    """
+    Move a connected farmer's sockets to the rooms matching their current location and crops.
+    Sockets held by other workers are moved through the message queue.
+    """
+    rooms = set(location_rooms_for(user))
+    for sid in presence.sids_for(user.id):
+        user_data = presence.get(sid)
+        if user_data is None:
+            continue
+        for room in set(user_data.rooms) - rooms:
+            socketio.server.leave_room(sid, room, namespace='/')
+        for room in rooms - set(user_data.rooms):
+            socketio.server.enter_room(sid, room, namespace='/')
+        presence.set_rooms(sid, rooms)
+
+def send_replay(user_id, rooms, since):
+    """
+    One page of the notifications sent to the user's rooms after since. A client without
+    a sequence number yet (first connect, never acked) starts from now instead of the
+    whole retention window; it asks for the next page with 'replay_notifications' while has_more.
+    """
+    if since is None:
+        emit('notification_replay', {'events': [], 'last_seq': outbox.current_seq(), 'has_more': False})
+        return
+    since = int(since)
+    missed, has_more = outbox.replay(set(rooms) | {f"user_{user_id}"}, since)
+    emit('notification_replay', {'events': missed, 'last_seq': missed[-1]['seq'] if missed else since, 'has_more': has_more})
+
 
 def register_websocket_events(socketio):
     
@@ -23,25 +63,42 @@ def register_websocket_events(socketio):
             token = auth['token']
             decoded_token = decode_token(token)
             user_id = decoded_token['sub']['id']
-            
-            # Get user from database
-            user = User.query.get(user_id)
-            if not user or not user.is_approved:
-                print(f"User {user_id} not found or not approved")
+            if revocations.is_revoked(user_id, decoded_token['iat']):
+                print(f"User {user_id} token revoked")
                 disconnect()
                 return False
-            
-            # Store user connection
-            connected_users[request.sid] = {
-                'user_id': user_id,
-                'user': user
-            }
-            
+
+            if decoded_token.get('approved'):
+                # Signed claims are enough, no database read on connect
+                first_name = decoded_token['first_name']
+                rooms = set(spatial_cells.cell_rooms(decoded_token['cell'], decoded_token['crops']))
+            else:
+                # Token without claims (issued before they existed) or from before an approval
+                user = db.session.get(User, int(user_id))
+                if not user or not user.is_approved:
+                    print(f"User {user_id} not found or not approved")
+                    disconnect()
+                    return False
+                first_name = user.first_name
+                rooms = set(location_rooms_for(user))
+
             # Join user to their personal room
             join_room(f"user_{user_id}")
+
+            # Farmers also join the cell rooms that regional alerts are broadcast to
+            for room in rooms:
+                join_room(room)
+
+            # Store user connection where every worker can see it
+            presence.add(request.sid, user_id, rooms)
             
-            print(f"User {user.first_name} {user.last_name} connected with role {user.role}")
-            emit('connection_status', {'status': 'connected', 'message': f'Welcome {user.first_name}!'})
+            print(f"User {user_id} connected with role {decoded_token['sub']['role']}")
+            emit('connection_status', {'status': 'connected', 'message': f'Welcome {first_name}!'})
+
+            # Replay only when the client asks for it with the last sequence number it saw;
+            # a plain connect reads nothing, clients can ask later with 'replay_notifications'
+            if auth.get('last_seq') is not None:
+                send_replay(user_id, rooms, auth['last_seq'])
             
         except Exception as e:
             print(f"Connection error: {str(e)}")
@@ -51,30 +108,55 @@ def register_websocket_events(socketio):
     @socketio.on('disconnect')
     def handle_disconnect():
         """Handle client disconnection"""
-        if request.sid in connected_users:
-            user_data = connected_users[request.sid]
-            user_id = user_data['user_id']
+        user_data = presence.remove(request.sid)
+        if user_data:
+            user_id = user_data.user_id
             
-            # Leave user room
+            # Leave user and location rooms
             leave_room(f"user_{user_id}")
-            
-            # Remove from connected users
-            del connected_users[request.sid]
+            for room in user_data.rooms:
+                leave_room(room)
             
             print(f"User {user_id} disconnected")
     
     @socketio.on('join_location_room')  
-    def handle_join_location_room(data):
-        """Allow farmers to join location-based rooms for targeted notifications"""
-        if request.sid not in connected_users:
+    def handle_join_location_room(data=None):
+        """
+        Re-sync the farmer's location rooms. Rooms are computed on the server from
+        the stored location and crops; any client supplied location id is ignored.
+        """
+        user_data = presence.get(request.sid)
+        if user_data is None:
             return
         
-        user_data = connected_users[request.sid]
-        user = user_data['user']
+        user = db.session.get(User, int(user_data.user_id))
         
-        if user.role == 'farmer' and user.location:
-            # Create a location-based room identifier
-            # You can customize this based on your location grouping logic
-            location_room = f"location_{data.get('location_id', 'default')}"
-            join_room(location_room)
-            emit('joined_location_room', {'room': location_room})
+        if user and user.role == 'farmer' and user.location:
+            sync_location_rooms(user)
+            emit('joined_location_room', {'rooms': sorted(location_rooms_for(user))})
+
+    @socketio.on('replay_notifications')
+    def handle_replay_notifications(data):
+        """Notifications after data['since'], or after the user's last ack when since is missing"""
+        user_data = presence.get(request.sid)
+        if user_data is None:
+            return
+        since = (data or {}).get('since')
+        if since is None:
+            since = outbox.last_ack(user_data.user_id)
+        try:
+            send_replay(user_data.user_id, user_data.rooms, since)
+        except (TypeError, ValueError):
+            logging.warning(f"Ignoring replay request with since={since!r}")
+
+    @socketio.on('ack_notifications')
+    def handle_ack_notifications(data):
+        """Remember the highest notification sequence number the client has processed"""
+        user_data = presence.get(request.sid)
+        if user_data is None or not data or 'seq' not in data:
+            return
+        try:
+            outbox.ack(user_data.user_id, int(data['seq']))
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Failed to store notification ack: {str(e)}")
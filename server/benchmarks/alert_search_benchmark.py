@@ -0,0 +1,156 @@
+"""
+Alert search latency: the previous unbounded point + radius search against the
+bbox and polygon modes of POST /api/alert/search.
+
+Run from the server directory against a local PostGIS (DATABASE_URL):
+    python -m benchmarks.alert_search_benchmark
+    python -m benchmarks.alert_search_benchmark --alerts 200000 --sizes 10 50 --iterations 20
+
+Creates the tables in a scratch `alert_search_benchmark` schema, fills it with active
+alerts (1M by default) spread over the seed region, runs ANALYZE and then times a
+search per region size around random points. The schema is dropped afterwards. Modes:
+    legacy    ST_DWithin on the geography index with the region's half width as radius,
+              one crop, every match returned (the old search, which took any radius)
+    bbox      Alert.in_bbox over the region, crops and severity filtered, first 200 rows
+    polygon   Alert.in_polygon with a hexagon inscribed in the region, same filters
+A size past ALERT_SEARCH_MAX_AREA is rejected by the endpoint; the bbox and polygon
+modes are still timed there to show what the cap prevents.
+"""
+import argparse
+import math
+import random
+import statistics
+import time
+
+from flask import Flask
+from geoalchemy2 import WKTElement
+from sqlalchemy import text
+
+from app.config import Config
+from app.extensions import db
+from app.models import Alert
+from app.schemas.alert import SEVERITY_LEVELS, ALERT_TYPES, alert_coordinates, dump_alert_rows
+from app.services import spatial_cells
+from benchmarks.hot_paths import percentile
+from benchmarks.seed import CROPS, KM_PER_DEGREE, REGION
+
+SCHEMA = 'alert_search_benchmark'
+LIMIT = 200
+
+
+def seed(alerts):
+    min_lon, min_lat, max_lon, max_lat = REGION
+    db.session.execute(text("SELECT setseed(0.42)"))
+    db.session.execute(text(
+        "INSERT INTO users (id, email, password_hash, first_name, last_name, role, is_approved) "
+        "VALUES (1, 'agronomist@example.com', 'x', 'Bench', 'Agronomist', 'agronomist', true)"
+    ))
+    db.session.execute(text(
+        "INSERT INTO alerts (title, severity, alert_type, crop_type, created_at, expires_at, location, creator_id) "
+        "SELECT 'Alert ' || n, (:severities)[1 + floor(random() * 3)::int], (:types)[1 + floor(random() * 3)::int], "
+        "(:crops)[1 + floor(random() * 8)::int], now() - random() * interval '10 days', "
+        "now() + (1 + random() * 30) * interval '1 day', "
+        "ST_SetSRID(ST_MakePoint(:min_lon + random() * (:max_lon - :min_lon), "
+        ":min_lat + random() * (:max_lat - :min_lat)), 4326)::geography, 1 "
+        "FROM generate_series(1, :count) AS n"
+    ), {
+        'severities': SEVERITY_LEVELS, 'types': ALERT_TYPES, 'crops': CROPS, 'count': alerts,
+        'min_lon': min_lon, 'min_lat': min_lat, 'max_lon': max_lon, 'max_lat': max_lat,
+    })
+    db.session.commit()
+    db.session.execute(text("ANALYZE alerts"))
+    db.session.commit()
+
+
+def region(longitude, latitude, size_km):
+    """A size_km square around the point as (min_lon, min_lat, max_lon, max_lat)"""
+    d_lat = size_km / 2 / KM_PER_DEGREE
+    d_lon = d_lat / math.cos(math.radians(latitude))
+    return longitude - d_lon, latitude - d_lat, longitude + d_lon, latitude + d_lat
+
+
+def legacy(longitude, latitude, size_km):
+    point = WKTElement(f'POINT({longitude} {latitude})', srid=4326)
+    rows = Alert.active().filter(
+        Alert.location.ST_DWithin(point, size_km * 500), Alert.crop_type == 'wheat'
+    ).add_columns(*alert_coordinates()).all()
+    return dump_alert_rows(rows)
+
+
+def filtered(query):
+    rows = query.filter(
+        Alert.crop_type.in_(['wheat', 'corn']), Alert.severity.in_(['medium', 'high'])
+    ).add_columns(*alert_coordinates()).order_by(Alert.created_at.desc(), Alert.id.desc()).limit(LIMIT + 1).all()
+    return dump_alert_rows(rows[:LIMIT])
+
+
+def bbox(longitude, latitude, size_km):
+    return filtered(Alert.active().filter(Alert.in_bbox(*region(longitude, latitude, size_km))))
+
+
+def polygon(longitude, latitude, size_km):
+    min_lon, min_lat, max_lon, max_lat = region(longitude, latitude, size_km)
+    half_lon, half_lat = (max_lon - min_lon) / 2, (max_lat - min_lat) / 2
+    ring = [
+        (longitude + half_lon * math.cos(math.radians(angle)), latitude + half_lat * math.sin(math.radians(angle)))
+        for angle in range(0, 360, 60)
+    ]
+    wkt = 'POLYGON((' + ','.join(f'{x} {y}' for x, y in ring + ring[:1]) + '))'
+    return filtered(Alert.active().filter(Alert.in_polygon(WKTElement(wkt, srid=4326))))
+
+
+def time_it(fn, size_km, points):
+    fn(*points[0], size_km)  # warm the cache and the plan
+    samples = []
+    rows = []
+    for longitude, latitude in points:
+        start = time.perf_counter()
+        rows.append(len(fn(longitude, latitude, size_km)))
+        samples.append((time.perf_counter() - start) * 1000)
+        db.session.expunge_all()
+    samples.sort()
+    return statistics.median(rows), statistics.median(samples), percentile(samples, 0.95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=1_000_000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200, 600], help='region widths in km')
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'options': f'-csearch_path={SCHEMA},public'}}
+    db.init_app(app)
+
+    rng = random.Random(args.seed)
+    min_lon, min_lat, max_lon, max_lat = REGION
+    points = [(rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat)) for _ in range(args.iterations)]
+    modes = {'legacy': legacy, 'bbox': bbox, 'polygon': polygon}
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+            conn.exec_driver_sql(f'CREATE SCHEMA {SCHEMA}')
+        try:
+            started = time.perf_counter()
+            db.create_all()
+            seed(args.alerts)
+            print(f"Seeded {args.alerts} alerts in {time.perf_counter() - started:.0f} s")
+            print(f"{'size km':>8} {'mode':8} {'rows':>8} {'p50 ms':>9} {'p95 ms':>9}  note")
+            for size_km in args.sizes:
+                area = spatial_cells.bbox_area(*region(*points[0], size_km)) / 1e6
+                note = 'rejected by the area cap' if area > Config.ALERT_SEARCH_MAX_AREA else ''
+                for name, fn in modes.items():
+                    rows, p50, p95 = time_it(fn, size_km, points)
+                    print(f"{size_km:>8} {name:8} {rows:>8.0f} {p50:>9.2f} {p95:>9.2f}  {note if name != 'legacy' else ''}")
+        finally:
+            db.session.rollback()
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Memory per websocket connection, and proof that connects with claim carrying tokens
+do not touch the database. No database needed:
+    python -m benchmarks.connection_memory --connections 10000
+
+Part 1 measures with tracemalloc what is kept per socket, for the same farmers:
+    orm_user      the original connected_users entry, {'user': User, 'rooms': set}
+                  with a detached ORM instance pinned per socket
+    presence_dict the dict entry presence stored before connection records
+    record        ConnectionRecord, slotted, with interned room names
+Part 2 connects --connects Socket.IO test clients to a minimal app whose database URL
+points nowhere, with the notification outbox enabled and no last_seq in auth. It counts
+SQL statements (there should be none) and the memory the server keeps for each connection.
+"""
+import argparse
+import random
+import tracemalloc
+
+from flask import Flask
+from geoalchemy2 import WKTElement
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.config import Config
+from app.models import User
+from app.services import spatial_cells
+from app.services.presence import MemoryPresence
+from benchmarks.seed import CROPS, REGION
+
+
+def make_farmers(count, rng):
+    min_lon, min_lat, max_lon, max_lat = REGION
+    # Farmers bunch up in a few hundred cells, like in villages
+    centers = [(rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat)) for _ in range(300)]
+    farmers = []
+    for n in range(count):
+        lon, lat = rng.choice(centers)
+        lon, lat = lon + rng.uniform(-0.02, 0.02), lat + rng.uniform(-0.02, 0.02)
+        user = User(
+            id=n + 1, email=f'farmer{n}@memory.local', password_hash='$2b$12$' + 'x' * 53,
+            first_name='Farmer', last_name=str(n), role='farmer', is_approved=True,
+            subscribed_crops=rng.sample(CROPS, rng.randint(1, 3)),
+            location=WKTElement(f'POINT({lon} {lat})', srid=4326),
+        )
+        farmers.append((user, lon, lat))
+    return farmers
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return size, kept
+
+
+def storage(farmers):
+    def orm_user():
+        connected_users = {}
+        for user, lon, lat in farmers:
+            make_transient_to_detached(user)
+            connected_users[f'sid{user.id}'] = {
+                'user': user, 'rooms': set(spatial_cells.farmer_rooms(lon, lat, user.subscribed_crops)),
+            }
+        return connected_users
+
+    def presence_dict():
+        sockets = {}
+        for user, lon, lat in farmers:
+            sockets[f'sid{user.id}'] = {
+                'user_id': str(user.id), 'node': 'node-1',
+                'rooms': set(spatial_cells.farmer_rooms(lon, lat, user.subscribed_crops)),
+            }
+        return sockets
+
+    def record():
+        backend = MemoryPresence()
+        for user, lon, lat in farmers:
+            backend.add(f'sid{user.id}', user.id, spatial_cells.farmer_rooms(lon, lat, user.subscribed_crops), 'node-1')
+        return backend
+
+    # Users are built before measuring: the orm_user case only pays for what pins them per socket,
+    # plus the instance state a session load would have created
+    results = {}
+    for name, build in [('orm_user', orm_user), ('presence_dict', presence_dict), ('record', record)]:
+        size, kept = measure(build)
+        results[name] = size / len(farmers)
+        del kept
+    return results
+
+
+def connects(farmers, count):
+    from flask_jwt_extended import decode_token
+    from app.extensions import db, jwt, socketio
+    from app.services.auth_tokens import issue_token, revocations
+    from app.services.outbox import outbox
+    from app.services.presence import presence
+    from app.websocket_events import register_websocket_events
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI='postgresql://nobody@127.0.0.1:1/nowhere',
+        SQLALCHEMY_ENGINE_OPTIONS={},
+        JWT_VERIFY_SUB=False,
+    )
+    db.init_app(app)
+    jwt.init_app(app)
+    revocations.init_app(app)
+    socketio.init_app(app, async_mode='threading')
+    presence.init_app(app)
+    outbox.init_app(app)
+    register_websocket_events(socketio)
+
+    statements = [0]
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.__setitem__(0, statements[0] + 1))
+        tokens = [issue_token(user) for user, _, _ in farmers[:count]]
+        assert decode_token(tokens[0])['approved']
+
+    clients = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for token in tokens:
+        # Outbox enabled and no last_seq, like the client connects: no replay, no ack lookup
+        clients.append(socketio.test_client(app, auth={'token': token}))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    connected = sum(1 for client in clients if client.is_connected())
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    for client in clients:
+        client.disconnect()
+    return {'connected': connected, 'sql_statements': statements[0], 'bytes_per_connect': round(size / count)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=10000)
+    parser.add_argument('--connects', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for name, per_socket in storage(make_farmers(args.connections, rng)).items():
+        print(f"{name:14} {per_socket:8.0f} bytes per connection")
+    print(f"connects: {connects(make_farmers(args.connects, rng), args.connects)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Recipient resolution: in-memory FarmerIndex vs the Postgres ST_DWithin query.
+
+Run from the server directory:
+    python -m benchmarks.farmer_index_benchmark --sizes 10000 100000 1000000
+    python -m benchmarks.farmer_index_benchmark --with-db   # also times Postgres (DATABASE_URL)
+
+The database run seeds a scratch `bench_farmers` table shaped like `users`
+with the same indexes, so the production tables are never touched.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, text
+
+from app.config import Config
+from app.services.farmer_index import FarmerIndex
+from app.services.notification_service import ALERT_RADIUS
+from benchmarks.seed import CROPS, REGION
+
+
+def random_farmers(count, seed=42):
+    rng = random.Random(seed)
+    min_lon, min_lat, max_lon, max_lat = REGION
+    for farmer_id in range(1, count + 1):
+        yield (
+            farmer_id,
+            rng.uniform(min_lon, max_lon),
+            rng.uniform(min_lat, max_lat),
+            rng.sample(CROPS, rng.randint(1, 3)),
+        )
+
+
+def random_alerts(count, seed=7):
+    rng = random.Random(seed)
+    min_lon, min_lat, max_lon, max_lat = REGION
+    return [(rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat), rng.choice(CROPS)) for _ in range(count)]
+
+
+def timed(fn, alerts):
+    samples = []
+    found = 0
+    for longitude, latitude, crop in alerts:
+        start = time.perf_counter()
+        found += len(fn(longitude, latitude, crop))
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3),
+        'avg_recipients': round(found / len(alerts), 1),
+    }
+
+
+def bench_index(size, alerts):
+    index = FarmerIndex()
+    start = time.perf_counter()
+    for farmer_id, longitude, latitude, crops in random_farmers(size):
+        index.upsert(farmer_id, longitude, latitude, crops)
+    build_s = time.perf_counter() - start
+    result = timed(lambda lon, lat, crop: index.find_recipients(lon, lat, crop, ALERT_RADIUS), alerts)
+    result['build_s'] = round(build_s, 2)
+    return result
+
+
+def bench_database(engine, size, alerts):
+    min_lon, min_lat, max_lon, max_lat = REGION
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS bench_farmers"))
+        conn.execute(text(
+            "CREATE TABLE bench_farmers (id serial PRIMARY KEY, role varchar(20), is_approved boolean, "
+            "subscribed_crops varchar[], location geography(POINT, 4326))"
+        ))
+        conn.execute(text("SELECT setseed(0.42)"))
+        conn.execute(text(
+            "INSERT INTO bench_farmers (role, is_approved, subscribed_crops, location) "
+            "SELECT 'farmer', true, ARRAY[(:crops)[1 + floor(random() * 8)::int], (:crops)[1 + floor(random() * 8)::int]], "
+            "ST_SetSRID(ST_MakePoint(:min_lon + random() * (:max_lon - :min_lon), :min_lat + random() * (:max_lat - :min_lat)), 4326)::geography "
+            "FROM generate_series(1, :size)"
+        ), {'crops': CROPS, 'size': size, 'min_lon': min_lon, 'max_lon': max_lon, 'min_lat': min_lat, 'max_lat': max_lat})
+        conn.execute(text("CREATE INDEX ON bench_farmers USING gist (location)"))
+        conn.execute(text("CREATE INDEX ON bench_farmers USING gin (subscribed_crops)"))
+        conn.execute(text("ANALYZE bench_farmers"))
+
+    query = text(
+        "SELECT id FROM bench_farmers WHERE role = 'farmer' AND is_approved AND location IS NOT NULL "
+        "AND ST_DWithin(location, ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)::geography, :radius) "
+        "AND subscribed_crops @> ARRAY[:crop]::varchar[]"
+    )
+    with engine.connect() as conn:
+        result = timed(
+            lambda lon, lat, crop: conn.execute(query, {'lon': lon, 'lat': lat, 'crop': crop, 'radius': ALERT_RADIUS}).all(),
+            alerts,
+        )
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE bench_farmers"))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--alerts', type=int, default=200)
+    parser.add_argument('--with-db', action='store_true')
+    args = parser.parse_args()
+
+    alerts = random_alerts(args.alerts)
+    engine = create_engine(Config.SQLALCHEMY_DATABASE_URI) if args.with_db else None
+    for size in args.sizes:
+        print(f"{size} farmers")
+        print(f"  index    {bench_index(size, alerts)}")
+        if engine is not None:
+            print(f"  postgres {bench_database(engine, size, alerts)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+Benchmark scenarios for the alert and notification hot paths.
+
+Runs the real app in-process (Flask test client and Flask-SocketIO test client),
+against a seeded throwaway database:
+    python -m benchmarks.hot_paths --database-url postgresql://user:pw@localhost/cropalert_bench --reset
+    python -m benchmarks.hot_paths --testcontainer            # starts a PostGIS container (pip install testcontainers)
+    python -m benchmarks.hot_paths --scenarios create_fanout search --iterations 500 --json results.json
+
+The docker-compose `db` service works too; create a separate database for it, since
+--reset truncates every table. Scenarios:
+    create_fanout   POST /api/alert/create, notifications dispatched inline so fan-out is measured
+    crop_alerts     GET /api/alert/crop_alerts polled by random farmers
+    search          POST /api/alert/search around villages
+    connect_storm   websocket connects with claim carrying tokens, room joins and outbox replay
+    map_all         GET /api/alert/all, how the map used to load every alert
+    map_tiles       a 4x3 tile viewport of GET /api/alert/tiles/z/x/y around a village
+Each reports p50/p95/p99 latency, throughput and SQL statements per operation.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app.config import Config
+from benchmarks.seed import make_villages, near, reset_database, seed_database
+
+SCENARIOS = ['create_fanout', 'crop_alerts', 'search', 'connect_storm', 'map_all', 'map_tiles']
+
+
+class QueryCounter:
+    """Counts statements sent to the database while active"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def report(name, samples, elapsed, queries, errors):
+    samples = sorted(samples)
+    return {
+        'scenario': name,
+        'operations': len(samples),
+        'errors': errors,
+        'p50_ms': round(statistics.median(samples), 2),
+        'p95_ms': round(percentile(samples, 0.95), 2),
+        'p99_ms': round(percentile(samples, 0.99), 2),
+        'throughput_ops': round(len(samples) / elapsed, 1),
+        'queries_per_op': round(queries / len(samples), 2),
+    }
+
+
+def run(name, operation, iterations, warmup, counter):
+    for _ in range(warmup):
+        operation()
+    samples = []
+    errors = 0
+    counter.count = 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        if not operation():
+            errors += 1
+        samples.append((time.perf_counter() - start) * 1000)
+    return report(name, samples, time.perf_counter() - started, counter.count, errors)
+
+
+def login_as(client, user_id, role):
+    client.set_cookie('access_token', create_access_token(identity={'id': str(user_id), 'role': role}))
+
+
+def scenarios(app, data, rng):
+    from app.extensions import db, socketio
+    from app.models import User
+    from app.services.alert_tiles import tile_of
+    from app.services.auth_tokens import issue_token
+
+    villages = data['villages']
+    agronomist = app.test_client()
+    login_as(agronomist, data['agronomist_ids'][0], 'agronomist')
+    farmers = []
+    for farmer_id in rng.sample(data['farmer_ids'], min(200, len(data['farmer_ids']))):
+        client = app.test_client()
+        login_as(client, farmer_id, 'farmer')
+        farmers.append(client)
+
+    def create_fanout():
+        village = rng.choice(villages)
+        longitude, latitude = near(village, rng)
+        response = agronomist.post('/api/alert/create', json={
+            'title': 'Benchmark alert',
+            'description': 'Created by benchmarks.hot_paths',
+            'severity': rng.choice(['low', 'medium', 'high']),
+            'alert_type': rng.choice(['pest', 'disease', 'weather']),
+            'crop_type': rng.choice(village['crops']),
+            'expires_at': (datetime.utcnow() + timedelta(days=3)).strftime('%Y-%m-%dT%H:%M:%S'),
+            'location': {'lat': latitude, 'lng': longitude},
+        })
+        return response.status_code == 201
+
+    def crop_alerts():
+        response = rng.choice(farmers).get('/api/alert/crop_alerts')
+        return response.status_code in (200, 404)
+
+    def search():
+        village = rng.choice(villages)
+        response = rng.choice(farmers).post('/api/alert/search', json={
+            'location': list(near(village, rng)),
+            'crop_type': rng.choice(village['crops']),
+            'radius': rng.choice([5000, 10000, 25000]),
+        })
+        return response.status_code == 200
+
+    # Tokens with the signed claims login issues, so connects take the no-database path
+    storm_ids = rng.sample(data['farmer_ids'], min(1000, len(data['farmer_ids'])))
+    tokens = [issue_token(user) for user in db.session.scalars(db.select(User).where(User.id.in_(storm_ids)))]
+    storm = []
+
+    def connect_storm():
+        client = socketio.test_client(app, auth={'token': rng.choice(tokens)})
+        storm.append(client)
+        return client.is_connected()
+
+    def map_all():
+        return rng.choice(farmers).get('/api/alert/all').status_code == 200
+
+    def map_tiles():
+        client = rng.choice(farmers)
+        z = rng.choice([5, 8, 11, 14])
+        x, y = tile_of(*near(rng.choice(villages), rng), z)
+        return all(
+            client.get(f'/api/alert/tiles/{z}/{(x + dx) % (1 << z)}/{min(max(y + dy, 0), (1 << z) - 1)}').status_code == 200
+            for dx in (-1, 0, 1, 2) for dy in (-1, 0, 1)
+        )
+
+    return {
+        'create_fanout': create_fanout,
+        'crop_alerts': crop_alerts,
+        'search': search,
+        'connect_storm': connect_storm,
+        'map_all': map_all,
+        'map_tiles': map_tiles,
+    }, storm
+
+
+def start_testcontainer():
+    from testcontainers.postgres import PostgresContainer  # optional, only for --testcontainer
+    container = PostgresContainer('postgis/postgis:16-3.4', driver='psycopg2')
+    container.start()
+    return container, container.get_connection_url()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    parser.add_argument('--testcontainer', action='store_true')
+    parser.add_argument('--reset', action='store_true', help='truncate and reseed the database')
+    parser.add_argument('--farmers', type=int, default=20000)
+    parser.add_argument('--agronomists', type=int, default=100)
+    parser.add_argument('--alerts', type=int, default=5000)
+    parser.add_argument('--villages', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+    if not args.database_url and not args.testcontainer:
+        parser.error('pass --database-url of a throwaway database, or --testcontainer')
+
+    container = None
+    if args.testcontainer:
+        container, args.database_url = start_testcontainer()
+        args.reset = True
+
+    # Configure before create_app reads it: no background jobs, inline fan-out
+    Config.SQLALCHEMY_DATABASE_URI = args.database_url
+    Config.DB_CREATE_ALL = True  # throwaway database, no migrations
+    Config.NOTIFICATION_DISPATCH_INLINE = True
+    Config.FARMER_INDEX_REFRESH_INTERVAL = 0
+    Config.ALERT_ARCHIVE_INTERVAL = 0
+    Config.NOTIFICATION_OUTBOX_PRUNE_INTERVAL = 0
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import User
+    from app.services.farmer_index import farmer_index
+
+    try:
+        app = create_app()
+        rng = random.Random(args.seed)
+        with app.app_context():
+            if args.reset:
+                reset_database()
+                data = seed_database(args.farmers, args.agronomists, args.alerts, args.villages, args.seed)
+            else:
+                # Reuse data seeded earlier with the same --seed
+                data = {
+                    'villages': make_villages(args.villages, random.Random(args.seed)),
+                    'farmer_ids': db.session.scalars(db.select(User.id).where(User.role == 'farmer')).all(),
+                    'agronomist_ids': db.session.scalars(db.select(User.id).where(User.role == 'agronomist')).all(),
+                }
+            if app.config['FARMER_INDEX_ENABLED']:
+                farmer_index.load()
+
+            counter = QueryCounter(db.engine)
+            operations, storm = scenarios(app, data, rng)
+            results = []
+            for name in args.scenarios:
+                result = run(name, operations[name], args.iterations, args.warmup, counter)
+                results.append(result)
+                print(json.dumps(result))
+            for client in storm:
+                client.disconnect()
+    finally:
+        if container is not None:
+            container.stop()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
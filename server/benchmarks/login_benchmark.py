@@ -0,0 +1,120 @@
+"""
+Login rush benchmark for a running server: login throughput at increasing concurrency,
+and how long an unrelated request takes while the logins run.
+
+Seed users with a known password and start the production server, e.g.
+    python -m benchmarks.seed --database-url $DATABASE_URL --farmers 5000 --reset
+    SOCKETIO_ASYNC_MODE=eventlet WEB_CONCURRENCY=1 gunicorn -c gunicorn.conf.py wsgi:app
+then, from the server directory:
+    python -m benchmarks.login_benchmark --url http://localhost:5000 --users 5000 --concurrency 1 4 16 64
+
+Each level logs in random seeded farmers (farmer<n>@bench.local) from that many threads
+for --duration seconds. Meanwhile a probe thread polls --probe-path once every 100 ms.
+With bcrypt on the worker's only thread the probe latency grows with the number of
+logins in flight. With hashing offloaded it stays flat, and logins per second grow
+until PASSWORD_HASH_WORKERS cores are busy. 503 responses are logins turned away after
+PASSWORD_HASH_TIMEOUT.
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.seed import PASSWORD
+from benchmarks.socketio_fanout_loadtest import login, percentile
+
+
+def attempt_login(url, email):
+    request = urllib.request.Request(
+        url + '/api/auth/login',
+        data=json.dumps({'email': email, 'password': PASSWORD}).encode(),
+        headers={'Content-Type': 'application/json'},
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, ConnectionError):
+        return None
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return {
+        'p50_ms': round(statistics.median(samples), 1),
+        'p95_ms': round(percentile(samples, 0.95), 1),
+        'max_ms': round(samples[-1], 1),
+    }
+
+
+def run_level(args, concurrency, token):
+    latencies = []
+    statuses = {}
+    probes = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def worker(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            email = f'farmer{rng.randrange(args.users)}@bench.local'
+            start = time.perf_counter()
+            status = attempt_login(args.url, email)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed)
+
+    def probe():
+        request = urllib.request.Request(args.url + args.probe_path, headers={'Cookie': f'access_token={token}'})
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            probes.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.1)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    threads.append(threading.Thread(target=probe))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'concurrency': concurrency,
+        'logins_per_s': round(len(latencies) / args.duration, 1),
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'login': summarize(latencies),
+        'probe': summarize(probes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--users', type=int, default=1000, help='number of seeded farmers to log in as')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--duration', type=int, default=15)
+    parser.add_argument('--probe-path', default='/api/alert/all?limit=1')
+    args = parser.parse_args()
+
+    token = login(args.url, 'farmer0@bench.local', PASSWORD)
+    for concurrency in args.concurrency:
+        print(json.dumps(run_level(args, concurrency, token)))
+
+
+if __name__ == '__main__':
+    main()
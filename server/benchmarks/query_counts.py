@@ -0,0 +1,146 @@
+"""
+Query count check: list endpoints must issue the same number of SQL statements
+whatever the size of their result.
+
+Run from the server directory against a throwaway PostGIS database (its tables are truncated):
+    python -m benchmarks.query_counts --database-url postgresql://user:pw@localhost/cropalert_bench
+
+Relationships are switched to raise on lazy loads (RAISE_ON_LAZY_LOAD) and the alert
+cache is off. Each endpoint is measured once with a small data set and again after
+the data grew several times; the script exits with status 1 if any count changed or
+a lazy load was attempted.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Read by the models when they are imported, so set before importing the app
+os.environ['RAISE_ON_LAZY_LOAD'] = 'true'
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from app.config import Config  # noqa: E402
+from benchmarks.hot_paths import QueryCounter  # noqa: E402
+from benchmarks.seed import reset_database  # noqa: E402
+
+CENTER = (-6.84, 33.97)
+
+
+def add_users(count, start, alerts_per_agronomist):
+    """Bench agronomists with alerts around CENTER, and farmers next to them"""
+    from app.extensions import db
+    from app.models import Alert, User
+
+    expires_at = datetime.utcnow() + timedelta(days=7)
+    for n in range(start, start + count):
+        offset = n * 0.0005
+        point = f'SRID=4326;POINT({CENTER[0] + offset} {CENTER[1] + offset})'
+        agronomist = User(
+            email=f'agronomist{n}@counts.local', password_hash='x', first_name='Bench', last_name=f'Agronomist {n}',
+            role='agronomist', is_approved=True, location=point,
+        )
+        agronomist.created_alerts = [
+            Alert(title=f'Alert {n}.{i}', severity='medium', alert_type='pest', crop_type='wheat',
+                  expires_at=expires_at, location=point)
+            for i in range(alerts_per_agronomist)
+        ]
+        db.session.add(agronomist)
+        db.session.add(User(
+            email=f'farmer{n}@counts.local', password_hash='x', first_name='Bench', last_name=f'Farmer {n}',
+            role='farmer', is_approved=True, subscribed_crops=['wheat'], location=point,
+        ))
+    db.session.commit()
+
+
+def measure(app, counter):
+    """SQL statements per endpoint and notification job. Each request runs in its own app context"""
+    from app.extensions import db
+    from app.models import Alert, User
+    from app.services.notification_service import NotificationService, notify_new_alert_job
+
+    clients = {}
+    with app.app_context():
+        for name, email in [('admin', 'admin@counts.local'), ('agronomist', 'agronomist0@counts.local'),
+                            ('farmer', 'farmer0@counts.local')]:
+            user = db.session.scalar(db.select(User).where(User.email == email))
+            clients[name] = app.test_client()
+            clients[name].set_cookie('access_token', create_access_token(identity={'id': str(user.id), 'role': user.role}))
+        alert_ids = db.session.scalars(db.select(Alert.id)).all()
+
+    requests = {
+        'user search': ('admin', 'GET', '/api/user/search?query=Bench', None),
+        'user search page': ('admin', 'GET', '/api/user/search?query=Bench&limit=500', None),
+        'admin users': ('admin', 'GET', '/api/admin/users', None),
+        'admin agronomist search': ('admin', 'GET', '/api/admin/search-agronomist?query=Bench', None),
+        'profile': ('agronomist', 'GET', '/api/user/profile', None),
+        'my alerts': ('agronomist', 'GET', '/api/alert/my_alerts', None),
+        'all alerts': ('agronomist', 'GET', '/api/alert/all', None),
+        'all alerts page': ('agronomist', 'GET', '/api/alert/all?limit=500', None),
+        'crop alerts': ('farmer', 'GET', '/api/alert/crop_alerts', None),
+        'search': ('farmer', 'POST', '/api/alert/search', {'location': list(CENTER), 'crop_type': 'wheat', 'radius': 20000}),
+    }
+    counts = {}
+    for name, (role, method, path, body) in requests.items():
+        client = clients[role]
+        client.open(path, method=method, json=body)  # warm the identity cache
+        counter.count = 0
+        response = client.open(path, method=method, json=body)
+        if response.status_code >= 500:
+            raise RuntimeError(f"{name}: {response.status_code} {response.get_data(as_text=True)[:500]}")
+        counts[name] = counter.count
+
+    with app.app_context():
+        counter.count = 0
+        NotificationService.notify_farmers_about_alerts(alert_ids)
+        counts['notify batch'] = counter.count
+    with app.app_context():
+        counter.count = 0
+        notify_new_alert_job(alert_ids[-1])
+        counts['notify single'] = counter.count
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--small', type=int, default=3)
+    parser.add_argument('--grow', type=int, default=30)
+    args = parser.parse_args()
+
+    Config.SQLALCHEMY_DATABASE_URI = args.database_url
+    Config.DB_CREATE_ALL = True  # throwaway database, no migrations
+    Config.ALERT_CACHE_BACKEND = 'none'
+    Config.NOTIFICATION_DISPATCH_INLINE = True
+    Config.FARMER_INDEX_ENABLED = False
+    Config.ALERT_ARCHIVE_INTERVAL = 0
+    Config.NOTIFICATION_OUTBOX_ENABLED = False
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import User
+
+    app = create_app()
+    with app.app_context():
+        reset_database()
+        db.session.add(User(email='admin@counts.local', password_hash='x', first_name='Admin', last_name='Counts',
+                            role='admin', is_approved=True))
+        db.session.commit()
+        counter = QueryCounter(db.engine)
+        add_users(args.small, 0, alerts_per_agronomist=2)
+    before = measure(app, counter)
+    with app.app_context():
+        add_users(args.grow, args.small, alerts_per_agronomist=5)
+    after = measure(app, counter)
+
+    failed = False
+    for name in before:
+        status = 'ok' if before[name] == after[name] else 'FAIL'
+        failed |= status == 'FAIL'
+        print(f"{status:4} {name:24} {before[name]} -> {after[name]} queries")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Query plan regression check for the hot queries.
+
+Run from the server directory against a local PostGIS (DATABASE_URL):
+    python -m benchmarks.query_plan_check
+    python -m benchmarks.query_plan_check --users 50000 --alerts 50000 --verbose
+
+Creates the tables in a scratch `query_plan_check` schema, seeds synthetic farmers,
+agronomists and alerts, runs ANALYZE and then EXPLAIN on each hot query.
+Exits with status 1 if any of them reads `users` or `alerts` with a sequential scan,
+so it can run in CI next to a PostGIS service. The schema is dropped afterwards.
+tests/test_query_plans.py runs the same check in the test suite.
+"""
+import argparse
+import sys
+
+from flask import Flask
+from geoalchemy2 import Geometry, WKTElement
+from sqlalchemy import and_, cast, func, text
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app.config import Config
+from app.extensions import db
+from app.models import Alert, User
+from app.services import alert_tiles, spatial_cells, user_search
+from app.services.notification_service import ALERT_RADIUS
+from benchmarks.seed import CROPS, REGION
+
+SCHEMA = 'query_plan_check'
+HOT_TABLES = {'users', 'alerts'}
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, 'postgresql')
+def _compile_explain(element, compiler, **kw):
+    return 'EXPLAIN (FORMAT JSON) ' + compiler.process(element.statement, **kw)
+
+
+def hot_queries():
+    """The queries behind recipient lookup, crop_alerts/search, map tiles, my_alerts, user search and login"""
+    lon, lat = (REGION[0] + REGION[2]) / 2, (REGION[1] + REGION[3]) / 2
+    point = WKTElement(f'POINT({lon} {lat})', srid=4326)
+    return {
+        'find_recipients': db.session.query(
+            User.id, func.ST_GeoHash(cast(User.location, Geometry), spatial_cells.CELL_PRECISION)
+        ).filter(and_(
+            User.role == 'farmer',
+            User.is_approved == True,
+            User.location.is_not(None),
+            User.location.ST_DWithin(point, ALERT_RADIUS),
+            User.subscribed_crops.contains(['wheat']),
+        )),
+        'find_batch_recipients': db.session.query(User.id, Alert.id).join(
+            Alert,
+            and_(
+                User.location.ST_DWithin(Alert.location, ALERT_RADIUS),
+                User.subscribed_crops.contains(array([Alert.crop_type])),
+            )
+        ).filter(and_(
+            Alert.id.in_([1, 2, 3]),
+            User.role == 'farmer',
+            User.is_approved == True,
+            User.location.is_not(None),
+        )),
+        'area_alerts': Alert.active().filter(and_(
+            Alert.location.ST_DWithin(point, 15000),
+            Alert.crop_type.in_(['wheat', 'corn']),
+        )),
+        'bbox_alerts': Alert.active().filter(
+            Alert.in_bbox(lon - 0.2, lat - 0.2, lon + 0.2, lat + 0.2), Alert.severity.in_(['medium', 'high'])
+        ),
+        'polygon_alerts': Alert.active().filter(Alert.in_polygon(WKTElement(
+            f'POLYGON(({lon} {lat},{lon + 0.3} {lat},{lon + 0.3} {lat + 0.2},{lon} {lat}))', srid=4326
+        ))),
+        'map_tile': Alert.active().filter(Alert.in_bbox(*alert_tiles.tile_bounds(12, *alert_tiles.tile_of(lon, lat, 12)))),
+        'my_alerts': Alert.active().filter_by(creator_id=2),
+        'agronomist_search': user_search.search('ali', role='agronomist')[0],
+        'autocomplete': User.query.filter(func.lower(User.last_name).like('ali%')),
+        'login': User.query.filter_by(email='farmer42@example.com'),
+    }
+
+
+def seed(users, alerts):
+    min_lon, min_lat, max_lon, max_lat = REGION
+    region = {'min_lon': min_lon, 'max_lon': max_lon, 'min_lat': min_lat, 'max_lat': max_lat, 'crops': CROPS}
+    point_sql = (
+        "ST_SetSRID(ST_MakePoint(:min_lon + random() * (:max_lon - :min_lon), "
+        ":min_lat + random() * (:max_lat - :min_lat)), 4326)::geography"
+    )
+    db.session.execute(text("SELECT setseed(0.42)"))
+    db.session.execute(text(
+        "INSERT INTO users (email, password_hash, first_name, last_name, role, is_approved, subscribed_crops, location) "
+        "SELECT 'farmer' || n || '@example.com', 'x', 'First', 'Last', "
+        "CASE WHEN n % 50 = 0 THEN 'agronomist' ELSE 'farmer' END, n % 97 <> 0, "
+        "ARRAY[(:crops)[1 + floor(random() * 8)::int], (:crops)[1 + floor(random() * 8)::int]], "
+        f"{point_sql} FROM generate_series(1, :count) AS n"
+    ), dict(region, count=users))
+    db.session.execute(text(
+        "INSERT INTO alerts (title, severity, alert_type, crop_type, created_at, expires_at, location, creator_id) "
+        "SELECT 'Alert ' || n, 'medium', 'pest', (:crops)[1 + floor(random() * 8)::int], now(), "
+        "now() + (random() * 30 - 5) * interval '1 day', "
+        f"{point_sql}, 50 * (1 + floor(random() * (:users / 50))::int) FROM generate_series(1, :count) AS n"
+    ), dict(region, count=alerts, users=users))
+    db.session.commit()
+    db.session.execute(text("ANALYZE users"))
+    db.session.execute(text("ANALYZE alerts"))
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def explain(query):
+    """(plan, hot tables read with a sequential scan, indexes used) of a query"""
+    plan = db.session.execute(Explain(query.statement)).scalar()[0]['Plan']
+    nodes = list(plan_nodes(plan))
+    seq_scans = sorted({
+        node['Relation Name'] for node in nodes
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in HOT_TABLES
+    })
+    used = sorted({node['Index Name'] for node in nodes if 'Index Name' in node})
+    return plan, seq_scans, used
+
+
+def check(verbose):
+    failures = []
+    for name, query in hot_queries().items():
+        plan, seq_scans, used = explain(query)
+        nodes = list(plan_nodes(plan))
+        status = 'FAIL' if seq_scans else 'ok'
+        print(f"{status:4} {name:24} indexes={used} seq_scans={seq_scans} cost={plan['Total Cost']}")
+        if verbose:
+            for node in nodes:
+                print(f"       {node['Node Type']} {node.get('Relation Name', '')} {node.get('Index Name', '')}")
+        if seq_scans:
+            failures.append(name)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--alerts', type=int, default=20000)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'options': f'-csearch_path={SCHEMA},public'}}
+    db.init_app(app)
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+            conn.exec_driver_sql(f'CREATE SCHEMA {SCHEMA}')
+        try:
+            db.create_all()
+            seed(args.users, args.alerts)
+            failures = check(args.verbose)
+        finally:
+            db.session.rollback()
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+    if failures:
+        print(f"Sequential scans on hot tables in: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
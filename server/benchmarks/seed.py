@@ -0,0 +1,175 @@
+"""
+Synthetic data for benchmarks: farmers clustered around villages, agronomists and alerts.
+
+Run from the server directory against a throwaway database:
+    python -m benchmarks.seed --database-url postgresql://user:pw@localhost/cropalert_bench \\
+        --farmers 100000 --agronomists 200 --alerts 20000 --reset
+
+Villages are spread over the region with a few large ones and many small ones.
+Each village grows two or three main crops; its farmers live within a few
+kilometres of it and mostly subscribe to those crops. Alerts are raised near
+villages for crops grown there, so fan-out and area queries see realistic
+recipient counts instead of a uniform spread. Same --seed, same data.
+"""
+import argparse
+import math
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+
+from app.extensions import bcrypt, db
+from app.models import Alert, User
+
+CROPS = ['wheat', 'corn', 'barley', 'olive', 'citrus', 'tomato', 'potato', 'grape']
+# Farming region used for the synthetic data (lon/lat bounding box)
+REGION = (-9.5, 30.0, -2.0, 35.5)
+PASSWORD = 'bench-password'
+SEVERITIES = ['low', 'medium', 'high']
+ALERT_TYPES = ['pest', 'disease', 'weather']
+KM_PER_DEGREE = 111.32
+
+
+def make_villages(count, rng):
+    min_lon, min_lat, max_lon, max_lat = REGION
+    villages = []
+    for rank in range(1, count + 1):
+        villages.append({
+            'longitude': rng.uniform(min_lon, max_lon),
+            'latitude': rng.uniform(min_lat, max_lat),
+            'weight': 1 / rank,  # Zipf: a few towns hold most farmers
+            'spread_km': rng.uniform(2, 8),
+            'crops': rng.sample(CROPS, rng.randint(2, 3)),
+        })
+    return villages
+
+
+def near(village, rng):
+    """A point a normally distributed distance away from the village centre"""
+    dx = rng.gauss(0, village['spread_km']) / (KM_PER_DEGREE * math.cos(math.radians(village['latitude'])))
+    dy = rng.gauss(0, village['spread_km']) / KM_PER_DEGREE
+    return village['longitude'] + dx, village['latitude'] + dy
+
+
+def pick_crops(village, rng):
+    crops = set(rng.sample(village['crops'], rng.randint(1, len(village['crops']))))
+    if rng.random() < 0.1:
+        crops.add(rng.choice(CROPS))
+    return sorted(crops)
+
+
+def generate_farmers(count, villages, rng):
+    weights = [village['weight'] for village in villages]
+    for village in rng.choices(villages, weights, k=count):
+        yield near(village, rng), pick_crops(village, rng)
+
+
+def generate_alerts(count, villages, rng, now):
+    weights = [village['weight'] for village in villages]
+    for village in rng.choices(villages, weights, k=count):
+        yield {
+            'point': near(village, rng),
+            'crop_type': rng.choice(village['crops']),
+            'severity': rng.choices(SEVERITIES, [5, 3, 1])[0],
+            'alert_type': rng.choice(ALERT_TYPES),
+            # Mostly active, some already expired and waiting for the archiver
+            'expires_at': now + timedelta(hours=rng.uniform(-48, 24 * 14)),
+        }
+
+
+def reset_database():
+    db.session.execute(text(
+        "TRUNCATE alert_changes, alert_change_compactions, token_revocations, notification_acks, "
+        "notification_outbox, alerts, alerts_archive, users RESTART IDENTITY CASCADE"
+    ))
+    db.session.commit()
+
+
+def seed_database(farmers, agronomists, alerts, villages=300, seed=42, batch_size=5000):
+    """
+    Insert the synthetic users and alerts. Returns a summary with the ids and
+    village list the benchmark scenarios draw their requests from.
+    """
+    rng = random.Random(seed)
+    village_list = make_villages(villages, rng)
+    password_hash = bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+    now = datetime.utcnow()
+
+    def flush(model, rows):
+        if rows:
+            db.session.execute(insert(model), rows)
+            rows.clear()
+
+    rows = []
+    for n in range(agronomists):
+        village = rng.choice(village_list)
+        longitude, latitude = near(village, rng)
+        rows.append({
+            'email': f'agronomist{n}@bench.local', 'password_hash': password_hash,
+            'first_name': 'Agronomist', 'last_name': str(n), 'role': 'agronomist', 'is_approved': True,
+            'subscribed_crops': village['crops'], 'location': f'SRID=4326;POINT({longitude} {latitude})',
+        })
+    flush(User, rows)
+
+    for n, ((longitude, latitude), crops) in enumerate(generate_farmers(farmers, village_list, rng)):
+        rows.append({
+            'email': f'farmer{n}@bench.local', 'password_hash': password_hash,
+            'first_name': 'Farmer', 'last_name': str(n), 'role': 'farmer', 'is_approved': True,
+            'subscribed_crops': crops, 'location': f'SRID=4326;POINT({longitude} {latitude})',
+        })
+        if len(rows) >= batch_size:
+            flush(User, rows)
+    flush(User, rows)
+    db.session.commit()
+
+    agronomist_ids = db.session.scalars(db.select(User.id).where(User.role == 'agronomist').order_by(User.id)).all()
+    farmer_ids = db.session.scalars(db.select(User.id).where(User.role == 'farmer').order_by(User.id)).all()
+
+    for alert in generate_alerts(alerts, village_list, rng, now):
+        longitude, latitude = alert.pop('point')
+        rows.append(dict(
+            alert, title=f"{alert['alert_type']} on {alert['crop_type']}", description='Synthetic alert',
+            created_at=now, location=f'SRID=4326;POINT({longitude} {latitude})',
+            creator_id=rng.choice(agronomist_ids),
+        ))
+        if len(rows) >= batch_size:
+            flush(Alert, rows)
+    flush(Alert, rows)
+    db.session.commit()
+    db.session.execute(text("ANALYZE users"))
+    db.session.execute(text("ANALYZE alerts"))
+    db.session.commit()
+
+    return {'villages': village_list, 'farmer_ids': farmer_ids, 'agronomist_ids': agronomist_ids}
+
+
+def main():
+    from flask import Flask
+    from app.config import Config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--farmers', type=int, default=10000)
+    parser.add_argument('--agronomists', type=int, default=100)
+    parser.add_argument('--alerts', type=int, default=5000)
+    parser.add_argument('--villages', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='truncate the tables first')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    db.init_app(app)
+    bcrypt.init_app(app)
+    with app.app_context():
+        db.create_all()
+        if args.reset:
+            reset_database()
+        summary = seed_database(args.farmers, args.agronomists, args.alerts, args.villages, args.seed)
+    print(f"Seeded {len(summary['farmer_ids'])} farmers, {len(summary['agronomist_ids'])} agronomists, "
+          f"{args.alerts} alerts around {args.villages} villages")
+
+
+if __name__ == '__main__':
+    main()
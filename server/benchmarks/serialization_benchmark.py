@@ -0,0 +1,102 @@
+"""
+Per-alert serialization cost of the alert list endpoints.
+
+Run from the server directory:
+    python -m benchmarks.serialization_benchmark --sizes 1000 10000
+
+`schema+to_shape` is the previous path (AlertSchema dump, whose PointField
+decodes the WKB, then two more to_shape calls for the [x, y] location).
+`compiled` is the current path: coordinates selected with ST_X/ST_Y and
+the generated dump_alert serializer. Users compare UserSchema(many=True)
+with dump_users. Every run first checks the compiled output is identical
+to the marshmallow output.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from geoalchemy2.shape import from_shape, to_shape
+from shapely.geometry import Point
+
+from app.models.alert import Alert
+from app.models.user import User
+from app.schemas.alert import AlertSchema, dump_alert_rows
+from app.schemas.user import UserSchema, dump_users
+
+
+def make_alerts(count, seed=1):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    alerts = []
+    for alert_id in range(1, count + 1):
+        longitude, latitude = rng.uniform(-9.5, -2.0), rng.uniform(30.0, 35.5)
+        alert = Alert(
+            id=alert_id,
+            title=f'Alert {alert_id}',
+            description='Aphid outbreak reported in the area',
+            severity=rng.choice(['low', 'medium', 'high']),
+            alert_type=rng.choice(['pest', 'disease', 'weather']),
+            crop_type=rng.choice(['wheat', 'corn', 'olive']),
+            created_at=now,
+            expires_at=now + timedelta(days=3),
+            location=from_shape(Point(longitude, latitude), srid=4326),
+            creator_id=1,
+        )
+        alerts.append((alert, longitude, latitude))
+    return alerts
+
+
+def make_users(alerts, per_user=5):
+    users = []
+    for user_id, start in enumerate(range(0, len(alerts), per_user), start=1):
+        longitude, latitude = alerts[start][1], alerts[start][2]
+        user = User(
+            id=user_id, email=f'user{user_id}@example.com', first_name='Farmer', last_name=str(user_id),
+            role='agronomist', is_approved=True, subscribed_crops=['wheat', 'olive'],
+            location=from_shape(Point(longitude, latitude), srid=4326),
+        )
+        user.created_alerts = [alert for alert, _, _ in alerts[start:start + per_user]]
+        users.append(user)
+    return users
+
+
+def schema_path(rows):
+    alerts = [alert for alert, _, _ in rows]
+    result = AlertSchema(many=True).dump(alerts)
+    for idx, alert in enumerate(alerts):
+        result[idx]['location'] = [to_shape(alert.location).x, to_shape(alert.location).y]
+    return result
+
+
+def measure(fn, rows, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        rows = make_alerts(size)
+        users = make_users(rows)
+        assert dump_alert_rows(rows) == schema_path(rows), 'compiled alert serializer differs from AlertSchema'
+        assert dump_users(users) == UserSchema(many=True).dump(users), 'compiled user serializer differs from UserSchema'
+
+        for name, fn in [('schema+to_shape', schema_path), ('compiled', dump_alert_rows)]:
+            elapsed = measure(fn, rows, args.repeat)
+            print(f"{size:>7} alerts  {name:<16} {elapsed * 1000:9.2f} ms total  {elapsed / size * 1e6:7.2f} us/alert")
+        for name, fn in [('marshmallow', UserSchema(many=True).dump), ('compiled', dump_users)]:
+            elapsed = measure(fn, users, args.repeat)
+            print(f"{len(users):>7} users   {name:<16} {elapsed * 1000:9.2f} ms total  {elapsed / len(users) * 1e6:7.2f} us/user")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Load test for a running server: REST throughput and concurrent websocket connections.
+
+Start the production server, e.g.
+    SOCKETIO_ASYNC_MODE=eventlet WEB_CONCURRENCY=1 gunicorn -c gunicorn.conf.py wsgi:app
+then, from the server directory:
+    python -m benchmarks.server_loadtest rest --url http://localhost:5000 --email farmer@example.com \\
+        --password secret --path /api/alert/crop_alerts --concurrency 50 --duration 30
+    python -m benchmarks.server_loadtest ws --url http://localhost:5000 --email farmer@example.com \\
+        --password secret --connections 2000 --hold 30
+
+`rest` reports requests per second and latency percentiles. `ws` opens the
+connections, keeps them open for --hold seconds and reports connect times and
+how many stayed connected. Comparing against `python run.py` shows the
+difference between the development server and green thread workers.
+Needs the Socket.IO client extras: pip install "python-socketio[client]"
+"""
+import argparse
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import socketio
+
+from benchmarks.socketio_fanout_loadtest import login, percentile
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return {
+        'p50_ms': round(statistics.median(samples), 2),
+        'p95_ms': percentile(samples, 0.95),
+        'p99_ms': percentile(samples, 0.99),
+    }
+
+
+def run_rest(args, token):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def worker():
+        while time.perf_counter() < deadline:
+            request = urllib.request.Request(args.url + args.path, headers={'Cookie': f'access_token={token}'})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                failed = False
+            except (urllib.error.URLError, ConnectionError):
+                failed = True
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if failed:
+                    errors[0] += 1
+                else:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    result = {'requests': len(latencies), 'errors': errors[0], 'qps': round(len(latencies) / args.duration, 1)}
+    result.update(summarize(latencies))
+    print(f"{args.path} x{args.concurrency}: {result}")
+
+
+def run_ws(args, token):
+    connect_times = []
+    failures = 0
+    clients = []
+    for _ in range(args.connections):
+        client = socketio.Client(reconnection=False)
+        start = time.perf_counter()
+        try:
+            client.connect(args.url, auth={'token': token}, transports=['websocket'], wait_timeout=10)
+        except socketio.exceptions.ConnectionError:
+            failures += 1
+            continue
+        connect_times.append((time.perf_counter() - start) * 1000)
+        clients.append(client)
+
+    print(f"Opened {len(clients)} connections ({failures} failed), holding {args.hold}s")
+    time.sleep(args.hold)
+    still_connected = sum(1 for client in clients if client.connected)
+    for client in clients:
+        client.disconnect()
+
+    result = {'connected': len(clients), 'failed': failures, 'still_connected': still_connected}
+    result.update(summarize(connect_times))
+    print(f"websocket: {result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('mode', choices=['rest', 'ws'])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--path', default='/api/alert/crop_alerts')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=int, default=30)
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--hold', type=int, default=30)
+    args = parser.parse_args()
+
+    token = login(args.url, args.email, args.password)
+    if args.mode == 'rest':
+        run_rest(args, token)
+    else:
+        run_ws(args, token)
+
+
+if __name__ == '__main__':
+    main()
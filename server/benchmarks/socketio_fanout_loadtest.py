@@ -0,0 +1,148 @@
+"""
+Notifications crossing worker boundaries through the Socket.IO message queue.
+
+Start several workers sharing one queue, e.g.
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 PRESENCE_BACKEND=redis ALERT_CACHE_BACKEND=redis PORT=5001 python run.py
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 PRESENCE_BACKEND=redis ALERT_CACHE_BACKEND=redis PORT=5002 python run.py
+then, from the server directory:
+    python -m benchmarks.socketio_fanout_loadtest --urls http://localhost:5001 http://localhost:5002 \\
+        --farmer farmer@example.com secret --agronomist agronomist@example.com secret
+
+Farmer clients are spread round-robin over the workers, all logged in as the same farmer.
+Alerts for one of the farmer's crops at the farmer's location are then created with
+POST /api/alert/create on the first worker only, so each notification goes through that
+worker's dispatcher, NotificationService, coalescer and outbox, and reaches the clients on
+the other workers through the message queue. Every client on every worker must receive
+every alert, with its outbox sequence number (pass --no-outbox for workers running with
+NOTIFICATION_OUTBOX_ENABLED=false); the script exits with status 1 otherwise.
+Needs the Socket.IO client extras: pip install "python-socketio[client]"
+"""
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+import socketio
+
+# Events a new alert notification can arrive as, depending on the coalescing settings
+NOTIFICATION_EVENTS = ['new_alert_notification', 'notification_batch', 'alert_digest']
+
+
+def login(base_url, email, password):
+    request = urllib.request.Request(
+        base_url + '/api/auth/login',
+        data=json.dumps({'email': email, 'password': password}).encode(),
+        headers={'Content-Type': 'application/json'},
+    )
+    with urllib.request.urlopen(request) as response:
+        for header in response.headers.get_all('Set-Cookie'):
+            name, _, rest = header.partition('=')
+            if name == 'access_token':
+                return rest.split(';', 1)[0]
+    raise RuntimeError('Login did not return an access_token cookie')
+
+
+def call(base_url, token, method, path, body=None):
+    request = urllib.request.Request(
+        base_url + path, method=method,
+        data=json.dumps(body).encode() if body is not None else None,
+        headers={'Content-Type': 'application/json', 'Cookie': f'access_token={token}'},
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def notifications(event, data):
+    """(alert_id, seq) of each alert notification in a message"""
+    if event == 'new_alert_notification':
+        return [(data['alert_id'], data.get('seq'))]
+    # Batches and digests carry the seq of the whole message
+    return [(item['data']['alert_id'], data.get('seq')) for item in data['events']
+            if item['event'] == 'new_alert_notification']
+
+
+def percentile(samples, fraction):
+    return round(samples[max(0, int(len(samples) * fraction) - 1)], 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--urls', nargs='+', required=True, help='the workers, alerts are created on the first')
+    parser.add_argument('--farmer', nargs=2, required=True, metavar=('EMAIL', 'PASSWORD'))
+    parser.add_argument('--agronomist', nargs=2, required=True, metavar=('EMAIL', 'PASSWORD'))
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--alerts', type=int, default=20)
+    parser.add_argument('--rate', type=float, default=5, help='alerts created per second')
+    parser.add_argument('--wait', type=float, default=5, help='seconds to wait for the last notifications')
+    parser.add_argument('--no-outbox', action='store_true', help="don't require sequence numbers")
+    args = parser.parse_args()
+
+    publisher = args.urls[0]
+    farmer_token = login(publisher, *args.farmer)
+    agronomist_token = login(publisher, *args.agronomist)
+    profile = call(publisher, farmer_token, 'GET', '/api/user/profile')
+    if not profile.get('location') or not profile.get('subscribed_crops'):
+        raise RuntimeError('The farmer needs a location and a subscribed crop')
+
+    sent_at = {}
+    received = {url: [] for url in args.urls}  # (alert_id, seq, received_at)
+    lock = threading.Lock()
+    clients = []
+    for i in range(args.clients):
+        url = args.urls[i % len(args.urls)]
+        client = socketio.Client(reconnection=False)
+        for event in NOTIFICATION_EVENTS:
+            def on_message(data, url=url, event=event):
+                now = time.time()
+                with lock:
+                    received[url].extend((alert_id, seq, now) for alert_id, seq in notifications(event, data))
+            client.on(event, on_message)
+        client.connect(url, auth={'token': farmer_token}, transports=['websocket'])
+        clients.append(client)
+    print(f"Connected {len(clients)} clients over {len(args.urls)} workers, creating alerts on {publisher}")
+
+    expires_at = (datetime.utcnow() + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%S')
+    for i in range(args.alerts):
+        started = time.time()
+        alert = call(publisher, agronomist_token, 'POST', '/api/alert/create', {
+            'title': f'Fan-out load test {i}', 'description': 'Created by socketio_fanout_loadtest',
+            'severity': 'high', 'alert_type': 'pest', 'crop_type': profile['subscribed_crops'][0],
+            'expires_at': expires_at, 'location': profile['location'],
+        })['alert']
+        with lock:
+            sent_at[alert['id']] = started
+        time.sleep(1 / args.rate)
+    time.sleep(args.wait)
+
+    for client in clients:
+        client.disconnect()
+
+    failed = False
+    per_worker = args.clients // len(args.urls)
+    for index, url in enumerate(args.urls):
+        clients_here = per_worker + (1 if index < args.clients % len(args.urls) else 0)
+        expected = clients_here * args.alerts
+        ours = [(alert_id, seq, at) for alert_id, seq, at in received[url] if alert_id in sent_at]
+        samples = sorted((at - sent_at[alert_id]) * 1000 for alert_id, _, at in ours)
+        summary = {
+            'delivered': len(ours), 'expected': expected,
+            'without_seq': sum(1 for _, seq, _ in ours if seq is None),
+        }
+        if samples:
+            summary.update({
+                'p50_ms': round(statistics.median(samples), 2),
+                'p95_ms': percentile(samples, 0.95),
+                'p99_ms': percentile(samples, 0.99),
+            })
+        failed |= summary['delivered'] != expected or (summary['without_seq'] > 0 and not args.no_outbox)
+        print(f"  {url}{' (publisher)' if index == 0 else ''} {summary}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
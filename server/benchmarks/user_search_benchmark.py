@@ -0,0 +1,130 @@
+"""
+User search latency: the trigram search and autocomplete against the previous
+`ilike('%term%')` on first and last name.
+
+Run from the server directory against a local PostGIS (DATABASE_URL):
+    python -m benchmarks.user_search_benchmark
+    python -m benchmarks.user_search_benchmark --users 200000 --iterations 20
+
+Creates the tables in a scratch `user_search_benchmark` schema, fills it with users
+(1M by default) named from a list of common first and last names, runs ANALYZE and
+then times each search term. The schema is dropped afterwards. Implementations:
+    legacy        first_name/last_name ILIKE, every match returned (the old endpoints)
+    legacy_top50  the same with LIMIT 50, to separate the scan from the result size
+    ranked_top50  user_search.search + best_matches (what /api/user/search returns)
+    autocomplete  user_search.autocomplete
+"""
+import argparse
+import statistics
+import time
+
+from flask import Flask
+from sqlalchemy import text
+
+from app.config import Config
+from app.extensions import db
+from app.models import User
+from app.services import user_search
+from benchmarks.hot_paths import percentile
+
+SCHEMA = 'user_search_benchmark'
+FIRST_NAMES = [
+    'Mohamed', 'Ahmed', 'Youssef', 'Ali', 'Omar', 'Hassan', 'Karim', 'Said', 'Rachid', 'Hamza',
+    'Mehdi', 'Anas', 'Ayoub', 'Ismail', 'Khalid', 'Mustapha', 'Nabil', 'Adil', 'Samir', 'Tarik',
+    'Fatima', 'Khadija', 'Aicha', 'Meryem', 'Salma', 'Sara', 'Imane', 'Hajar', 'Zineb', 'Nadia',
+    'Latifa', 'Naima', 'Souad', 'Hanane', 'Asmae', 'Houda', 'Ikram', 'Laila', 'Malika', 'Rim',
+]
+LAST_NAMES = [
+    'Alaoui', 'Benali', 'Bennani', 'El Amrani', 'El Idrissi', 'Tazi', 'Berrada', 'Chraibi', 'Fassi', 'Lahlou',
+    'Ouazzani', 'Sebti', 'Kettani', 'Benjelloun', 'Squalli', 'Naciri', 'Bouzidi', 'El Mansouri', 'Hajji', 'Zerouali',
+    'Amrani', 'Belhaj', 'Cherkaoui', 'Daoudi', 'El Fassi', 'Guessous', 'Hamdouchi', 'Jabri', 'Kadiri', 'Lamrani',
+    'Mernissi', 'Naji', 'Ouali', 'Rami', 'Saadi', 'Tahiri', 'Wahbi', 'Yacoubi', 'Zniber', 'Bouchta',
+]
+# Common and rare names, partial words, two word queries, an email and a miss
+TERMS = ['ali', 'mohamed', 'benj', 'el am', 'fatima tazi', 'squal', 'user4217', 'zzqx', 'rim', 'kadiri 99']
+
+
+def seed(users):
+    db.session.execute(text("SELECT setseed(0.42)"))
+    db.session.execute(text(
+        "INSERT INTO users (email, password_hash, first_name, last_name, role, is_approved) "
+        "SELECT 'user' || n || '@example.com', 'x', "
+        "(:first)[1 + floor(random() * array_length(:first, 1))::int], "
+        "(:last)[1 + floor(random() * array_length(:last, 1))::int] || CASE WHEN n % 7 = 0 THEN ' ' || n % 1000 ELSE '' END, "
+        "CASE WHEN n % 50 = 0 THEN 'agronomist' ELSE 'farmer' END, true "
+        "FROM generate_series(1, :count) AS n"
+    ), {'first': FIRST_NAMES, 'last': LAST_NAMES, 'count': users})
+    db.session.commit()
+    db.session.execute(text("ANALYZE users"))
+    db.session.commit()
+
+
+def legacy(term, limit=None):
+    query = User.query.filter(User.first_name.ilike(f'%{term}%') | User.last_name.ilike(f'%{term}%'))
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def ranked(term):
+    query, keyset = user_search.search(term)
+    return user_search.best_matches(query, keyset)
+
+
+def time_it(fn, term, iterations):
+    fn(term)  # warm the cache and the plan
+    samples = []
+    rows = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        rows = len(fn(term))
+        samples.append((time.perf_counter() - start) * 1000)
+        db.session.expunge_all()
+    samples.sort()
+    return rows, statistics.median(samples), percentile(samples, 0.95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--terms', nargs='+', default=TERMS)
+    parser.add_argument('--skip-legacy', action='store_true', help='only time the new search')
+    args = parser.parse_args()
+
+    implementations = {
+        'legacy': legacy,
+        'legacy_top50': lambda term: legacy(term, user_search.RESULT_LIMIT),
+        'ranked_top50': ranked,
+        'autocomplete': user_search.autocomplete,
+    }
+    if args.skip_legacy:
+        implementations = {name: fn for name, fn in implementations.items() if not name.startswith('legacy')}
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'options': f'-csearch_path={SCHEMA},public'}}
+    db.init_app(app)
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+            conn.exec_driver_sql(f'CREATE SCHEMA {SCHEMA}')
+        try:
+            started = time.perf_counter()
+            db.create_all()
+            seed(args.users)
+            print(f"Seeded {args.users} users in {time.perf_counter() - started:.0f} s")
+            print(f"{'term':14} {'implementation':14} {'rows':>8} {'p50 ms':>9} {'p95 ms':>9}")
+            for term in args.terms:
+                for name, fn in implementations.items():
+                    rows, p50, p95 = time_it(fn, user_search.normalize(term), args.iterations)
+                    print(f"{term:14} {name:14} {rows:>8} {p50:>9.2f} {p95:>9.2f}")
+        finally:
+            db.session.rollback()
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql(f'DROP SCHEMA {SCHEMA} CASCADE')
+
+
+if __name__ == '__main__':
+    main()
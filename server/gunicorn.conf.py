@@ -0,0 +1,21 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+import os
+
+_async_mode = os.getenv('SOCKETIO_ASYNC_MODE', 'eventlet')
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+worker_class = {'eventlet': 'eventlet', 'gevent': 'gevent'}.get(_async_mode, 'gthread')
+# Each worker is one process with its own Socket.IO server. More than one needs
+# SOCKETIO_MESSAGE_QUEUE, and either sticky sessions or SOCKETIO_TRANSPORTS=websocket,
+# because gunicorn spreads requests of one client over its workers.
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+# Green threads per worker, each one can hold a websocket or serve a request
+worker_connections = int(os.getenv('WORKER_CONNECTIONS', 1000))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+errorlog = '-'
+
+if workers > 1 and not os.getenv('SOCKETIO_MESSAGE_QUEUE'):
+    print("WEB_CONCURRENCY > 1 without SOCKETIO_MESSAGE_QUEUE: notifications only reach clients of the emitting worker")
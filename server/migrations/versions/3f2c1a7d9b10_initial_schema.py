@@ -0,0 +1,63 @@
+"""Initial schema, exactly as db.create_all built it before migrations were introduced
+
+Databases created that way: flask db stamp 3f2c1a7d9b10, then flask db upgrade.
+Everything added to the models since then is in the following revisions.
+
+Revision ID: 3f2c1a7d9b10
+Revises:
+Create Date: 2026-10-17 09:12:04.318552
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2c1a7d9b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS postgis')
+
+    op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password_hash', sa.String(length=128), nullable=False),
+        sa.Column('first_name', sa.String(length=50), nullable=False),
+        sa.Column('last_name', sa.String(length=50), nullable=False),
+        sa.Column('role', sa.String(length=20), nullable=False),
+        sa.Column('is_approved', sa.Boolean(), nullable=True),
+        sa.Column('subscribed_crops', postgresql.ARRAY(sa.String()), nullable=True),
+        sa.Column('location', geoalchemy2.Geography(geometry_type='POINT', srid=4326, spatial_index=False), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        if_not_exists=True
+    )
+    op.create_index('idx_users_location', 'users', ['location'], postgresql_using='gist', if_not_exists=True)
+
+    op.create_table('alerts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('severity', sa.String(length=20), nullable=False),
+        sa.Column('alert_type', sa.String(length=50), nullable=False),
+        sa.Column('crop_type', sa.String(length=50), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('location', geoalchemy2.Geography(geometry_type='POINT', srid=4326, spatial_index=False), nullable=False),
+        sa.Column('creator_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['creator_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+    op.create_index('idx_alerts_location', 'alerts', ['location'], postgresql_using='gist', if_not_exists=True)
+
+
+def downgrade():
+    op.drop_table('alerts')
+    op.drop_table('users')
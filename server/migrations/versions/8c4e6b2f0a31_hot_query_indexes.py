@@ -0,0 +1,46 @@
+"""Indexes for the hot spatial, crop and role queries
+
+Built CONCURRENTLY so existing tables stay writable while they are created.
+
+Revision ID: 8c4e6b2f0a31
+Revises: d0e6a4b83f19
+Create Date: 2026-10-17 10:03:47.902116
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e6b2f0a31'
+down_revision = 'd0e6a4b83f19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        # GiST indexes now declared on the models replace the ones GeoAlchemy2 added implicitly
+        op.create_index('ix_users_location', 'users', ['location'], postgresql_using='gist',
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('idx_users_location', table_name='users', postgresql_concurrently=True, if_exists=True)
+        op.create_index('ix_alerts_location', 'alerts', ['location'], postgresql_using='gist',
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('idx_alerts_location', table_name='alerts', postgresql_concurrently=True, if_exists=True)
+
+        op.create_index('ix_users_subscribed_crops', 'users', ['subscribed_crops'], postgresql_using='gin',
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_users_role_is_approved', 'users', ['role', 'is_approved'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_alerts_creator_id', 'alerts', ['creator_id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_alerts_creator_id', table_name='alerts', postgresql_concurrently=True)
+        op.drop_index('ix_users_role_is_approved', table_name='users', postgresql_concurrently=True)
+        op.drop_index('ix_users_subscribed_crops', table_name='users', postgresql_concurrently=True)
+        op.create_index('idx_alerts_location', 'alerts', ['location'], postgresql_using='gist', postgresql_concurrently=True)
+        op.drop_index('ix_alerts_location', table_name='alerts', postgresql_concurrently=True)
+        op.create_index('idx_users_location', 'users', ['location'], postgresql_using='gist', postgresql_concurrently=True)
+        op.drop_index('ix_users_location', table_name='users', postgresql_concurrently=True)
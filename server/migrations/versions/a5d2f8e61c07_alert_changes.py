@@ -0,0 +1,43 @@
+"""Alert change log for delta sync
+
+Revision ID: a5d2f8e61c07
+Revises: e4a9c3d17f58
+Create Date: 2026-10-17 17:25:40.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5d2f8e61c07'
+down_revision = 'e4a9c3d17f58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(sa.schema.CreateSequence(sa.Sequence('alert_change_version_seq'), if_not_exists=True))
+    op.create_table('alert_changes',
+        sa.Column('alert_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('change', sa.String(length=10), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('alert_id'),
+        sa.UniqueConstraint('version'),
+        if_not_exists=True
+    )
+    op.create_table('alert_change_compactions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('horizon', sa.BigInteger(), nullable=False),
+        sa.Column('removed', sa.Integer(), nullable=False),
+        sa.Column('compacted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('alert_change_compactions')
+    op.drop_table('alert_changes')
+    op.execute(sa.schema.DropSequence(sa.Sequence('alert_change_version_seq')))
@@ -0,0 +1,46 @@
+"""Trigram and prefix indexes for user search
+
+Adds the generated users.search_text column (names and email) with a pg_trgm GIN index
+for ILIKE '%term%', and lower(name) text_pattern_ops indexes for autocomplete.
+Adding a stored generated column rewrites the users table under an exclusive lock;
+the indexes are then built CONCURRENTLY.
+
+Revision ID: b71e0d4c5a92
+Revises: 8c4e6b2f0a31
+Create Date: 2026-10-17 14:21:36.550817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71e0d4c5a92'
+down_revision = '8c4e6b2f0a31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # IF NOT EXISTS: databases that ran db.create_all with the current models have it already
+    op.execute(
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS search_text TEXT "
+        "GENERATED ALWAYS AS (first_name || ' ' || last_name || ' ' || email) STORED"
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_search_text_trgm', 'users', ['search_text'], postgresql_using='gin',
+                        postgresql_ops={'search_text': 'gin_trgm_ops'}, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_users_first_name_prefix', 'users', [sa.text('lower(first_name) text_pattern_ops')],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_users_last_name_prefix', 'users', [sa.text('lower(last_name) text_pattern_ops')],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_last_name_prefix', table_name='users', postgresql_concurrently=True)
+        op.drop_index('ix_users_first_name_prefix', table_name='users', postgresql_concurrently=True)
+        op.drop_index('ix_users_search_text_trgm', table_name='users', postgresql_concurrently=True)
+    op.drop_column('users', 'search_text')
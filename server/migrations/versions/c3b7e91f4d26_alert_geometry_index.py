@@ -0,0 +1,30 @@
+"""Planar GiST index on alerts.location for bbox, polygon and map tile queries
+
+The existing index is on the geography column, which bbox (&&) and polygon queries in
+lon/lat cannot use. Built CONCURRENTLY so alert writes continue meanwhile.
+
+Revision ID: c3b7e91f4d26
+Revises: a5d2f8e61c07
+Create Date: 2026-10-17 15:02:11.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3b7e91f4d26'
+down_revision = 'a5d2f8e61c07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_alerts_location_geometry', 'alerts', [sa.text('geometry(location)')], postgresql_using='gist',
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_alerts_location_geometry', table_name='alerts', postgresql_concurrently=True)
@@ -0,0 +1,76 @@
+"""updated_at columns, expiry indexes, the alert archive and the notification outbox
+
+Added to the models after the initial schema. Written to be a no-op on databases
+where an earlier db.create_all already built any of them.
+
+Revision ID: d0e6a4b83f19
+Revises: 3f2c1a7d9b10
+Create Date: 2026-10-17 09:40:52.611207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+
+
+# revision identifiers, used by Alembic.
+revision = 'd0e6a4b83f19'
+down_revision = '3f2c1a7d9b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Nullable without a default: existing rows keep NULL and readers fall back to created_at
+    op.execute('ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITHOUT TIME ZONE')
+    op.execute('ALTER TABLE alerts ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITHOUT TIME ZONE')
+
+    op.create_index('ix_alerts_expires_at', 'alerts', ['expires_at'], if_not_exists=True)
+    op.create_index('ix_alerts_crop_type_expires_at', 'alerts', ['crop_type', 'expires_at'], if_not_exists=True)
+
+    op.create_table('alerts_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('title', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('severity', sa.String(length=20), nullable=False),
+        sa.Column('alert_type', sa.String(length=50), nullable=False),
+        sa.Column('crop_type', sa.String(length=50), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('location', geoalchemy2.Geography(geometry_type='POINT', srid=4326, spatial_index=False), nullable=False),
+        sa.Column('creator_id', sa.Integer(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+    op.create_index('idx_alerts_archive_location', 'alerts_archive', ['location'], postgresql_using='gist', if_not_exists=True)
+
+    op.create_table('notification_outbox',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('room', sa.String(length=64), nullable=False),
+        sa.Column('event', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_notification_outbox_room_id', 'notification_outbox', ['room', 'id'], if_not_exists=True)
+    op.create_index('ix_notification_outbox_created_at', 'notification_outbox', ['created_at'], if_not_exists=True)
+
+    op.create_table('notification_acks',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('seq', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id'),
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('notification_acks')
+    op.drop_table('notification_outbox')
+    op.drop_table('alerts_archive')
+    op.drop_index('ix_alerts_crop_type_expires_at', table_name='alerts')
+    op.drop_index('ix_alerts_expires_at', table_name='alerts')
+    op.drop_column('alerts', 'updated_at')
+    op.drop_column('users', 'updated_at')
@@ -0,0 +1,31 @@
+"""Token revocation list for declined and deleted users
+
+Revision ID: e4a9c3d17f58
+Revises: b71e0d4c5a92
+Create Date: 2026-10-17 16:02:11.204583
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9c3d17f58'
+down_revision = 'b71e0d4c5a92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('token_revocations',
+        sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('revoked_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_token_revocations_revoked_at', 'token_revocations', ['revoked_at'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_token_revocations_revoked_at', table_name='token_revocations')
+    op.drop_table('token_revocations')
@@ -1,7 +1,8 @@
+import os
 from app import create_app
 from app.extensions import socketio
 
 app = create_app()
 
 if __name__ == "__main__":
-    socketio.run(app, debug=True, host='0.0.0.0', port=5000, allow_unsafe_werkzeug=True)
\ No newline at end of file
+    socketio.run(app, debug=True, host='0.0.0.0', port=int(os.getenv('PORT', 5000)), allow_unsafe_werkzeug=True)
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""
+Run from the server directory:
+    python -m pytest tests
+
+Tests using the `app` fixture need a throwaway PostGIS database (its tables are truncated)
+and are skipped unless TEST_DATABASE_URL points at one:
+    TEST_DATABASE_URL=postgresql://user:pw@localhost/cropalert_test python -m pytest tests
+
+Notification jobs run inline (NOTIFICATION_DISPATCH_INLINE), in the request that enqueues them,
+and relationships raise on lazy loads (RAISE_ON_LAZY_LOAD) so an N+1 query fails the test.
+"""
+from datetime import datetime, timedelta
+import itertools
+import os
+
+# Read by the models when they are imported, so set before importing the app
+os.environ['RAISE_ON_LAZY_LOAD'] = 'true'
+
+import pytest  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from app.config import Config  # noqa: E402
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+
+@pytest.fixture(scope='session')
+def app():
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    Config.SQLALCHEMY_DATABASE_URI = TEST_DATABASE_URL
+    Config.DB_CREATE_ALL = True  # throwaway database, no migrations
+    Config.NOTIFICATION_DISPATCH_INLINE = True
+    Config.NOTIFICATION_OUTBOX_ENABLED = False
+    Config.FARMER_INDEX_ENABLED = False
+    Config.ALERT_ARCHIVE_INTERVAL = 0
+    Config.ALERT_CHANGE_COMPACT_INTERVAL = 0
+    Config.TOKEN_REVOCATION_REFRESH_INTERVAL = 0
+
+    from app import create_app
+    return create_app()
+
+
+@pytest.fixture
+def database(app):
+    """Empty tables and a fresh alert cache for each test"""
+    from app.extensions import db
+    from app.services.alert_cache import alert_cache
+    from benchmarks.seed import reset_database
+
+    with app.app_context():
+        reset_database()
+        alert_cache.clear()
+        yield db
+        db.session.rollback()
+
+
+@pytest.fixture
+def login(app):
+    """login(user) returns a test client carrying the user's access token"""
+    def login(user):
+        client = app.test_client()
+        client.set_cookie('access_token', create_access_token(identity={'id': str(user.id), 'role': user.role}))
+        return client
+    return login
+
+
+# Where the seeded users and alerts sit
+POINT = 'SRID=4326;POINT(-6.84 33.97)'
+
+
+@pytest.fixture
+def make_user(database):
+    """make_user(role, **columns) adds an approved user and returns it"""
+    from app.models import User
+
+    count = itertools.count()
+
+    def make_user(role, **columns):
+        n = next(count)
+        columns.setdefault('is_approved', True)
+        user = User(email=f'{role}{n}@tests.local', password_hash='x', first_name='Test',
+                    last_name=f'{role.title()} {n}', role=role, **columns)
+        database.session.add(user)
+        database.session.commit()
+        return user
+    return make_user
+
+
+@pytest.fixture
+def agronomist(make_user):
+    return make_user('agronomist')
+
+
+@pytest.fixture
+def make_alert(database):
+    """make_alert(creator, **columns) adds an alert at POINT expiring in a week and returns it"""
+    from app.models import Alert
+
+    def make_alert(creator, **columns):
+        columns = {
+            'title': 'Aphids', 'severity': 'high', 'alert_type': 'pest', 'crop_type': 'wheat',
+            'expires_at': datetime.utcnow() + timedelta(days=7), 'location': POINT, **columns,
+        }
+        alert = Alert(creator_id=creator.id, **columns)
+        database.session.add(alert)
+        database.session.commit()
+        return alert
+    return make_alert
@@ -0,0 +1,28 @@
+"""The archiver runs in every worker, concurrent runs must not archive an alert twice"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app.models import Alert
+from app.models.alert_archive import AlertArchive
+from app.services.alert_archiver import archive_expired_alerts
+
+
+def test_rows_locked_by_another_run_are_skipped(database, agronomist, make_alert):
+    for n in range(5):
+        make_alert(agronomist, title=f'Alert {n}', expires_at=datetime.utcnow() - timedelta(hours=1, minutes=n))
+
+    # Another worker's run holding the first batch
+    with database.engine.connect() as other:
+        transaction = other.begin()
+        locked = other.scalars(
+            select(Alert.id).order_by(Alert.expires_at).limit(3).with_for_update()
+        ).all()
+
+        assert archive_expired_alerts(batch_size=10) == 2
+        assert set(database.session.scalars(select(Alert.id))) == set(locked)
+        transaction.rollback()
+
+    assert archive_expired_alerts(batch_size=10) == 3
+    assert database.session.scalar(select(func.count(AlertArchive.id))) == 5
+    assert database.session.scalar(select(func.count(Alert.id))) == 0
@@ -0,0 +1,32 @@
+"""Delta sync keeps handing out versions it accepts, also after compaction"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from app.models.alert_change import AlertChange
+from app.services.alert_changes import change_log
+
+
+def test_polling_after_the_newest_change_was_compacted(database, agronomist, make_alert, login):
+    client = login(agronomist)
+    kept = make_alert(agronomist, title='Kept')
+    change_log.record([kept.id], 'created')
+    deleted = make_alert(agronomist, title='Deleted')
+    database.session.commit()
+    assert client.delete(f'/api/alert/{deleted.id}').status_code == 200
+
+    # The deletion is the newest change and old enough to be compacted away
+    database.session.execute(update(AlertChange).where(AlertChange.alert_id == deleted.id)
+                             .values(changed_at=datetime.utcnow() - change_log.retention - timedelta(days=1)))
+    database.session.commit()
+    assert change_log.compact() == 1
+
+    version = client.get('/api/alert/changes').get_json()['version']
+    assert version == change_log.horizon()
+    response = client.get(f'/api/alert/changes?since={version}')
+    assert response.status_code == 200
+    assert response.get_json()['changes'] == []
+
+    resync = client.get('/api/alert/changes?since=0')
+    assert resync.status_code == 410
+    assert client.get(f"/api/alert/changes?since={resync.get_json()['version']}").status_code == 200
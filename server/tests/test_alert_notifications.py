@@ -0,0 +1,136 @@
+"""Alert notifications run on the background dispatcher, and only for committed changes"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app.extensions import socketio
+from app.models import Alert
+from app.services import spatial_cells
+from app.services.alert_changes import change_log
+from app.services.dispatch_queue import dispatcher
+from app.services.notification_service import ALERT_RADIUS
+
+
+@pytest.fixture
+def alert_id(agronomist, make_alert):
+    return make_alert(agronomist).id
+
+
+@pytest.fixture
+def emitted(monkeypatch):
+    """Socket emits as (event, room, data)"""
+    emits = []
+    monkeypatch.setattr(socketio, 'emit', lambda event, data, room=None, **kwargs: emits.append((event, room, data)))
+    return emits
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    """Queue mode without worker threads: jobs wait in the queue until the test runs them"""
+    monkeypatch.setattr(dispatcher, 'inline', False)
+    monkeypatch.setattr(dispatcher, '_start_workers', lambda: None)
+    retries = []
+    monkeypatch.setattr(socketio, 'start_background_task', lambda fn, *args: retries.append(args))
+    return retries
+
+
+@pytest.fixture
+def dispatched(database, monkeypatch):
+    """
+    Update notifications the inline dispatcher ran, as (update_type, snapshot, committed),
+    committed telling whether another connection could see the alert's row at that moment
+    """
+    jobs = []
+
+    def notify_alert_update(snapshot, update_type):
+        with database.engine.connect() as connection:
+            row = connection.scalar(select(Alert.id).where(Alert.id == snapshot['id']))
+        jobs.append((update_type, snapshot, row is None if update_type == 'deleted' else row is not None))
+
+    monkeypatch.setitem(dispatcher.tasks, 'notify_alert_update', notify_alert_update)
+    return jobs
+
+
+def test_create_returns_before_the_fan_out(agronomist, make_user, login, emitted, queued):
+    longitude, latitude = -6.84, 33.97
+    farmer = make_user('farmer', subscribed_crops=['wheat'], location=f'SRID=4326;POINT({longitude} {latitude})')
+    make_user('farmer', subscribed_crops=['corn'], location=f'SRID=4326;POINT({longitude} {latitude})')
+    before = dispatcher.get_stats()
+
+    response = login(agronomist).post('/api/alert/create', json={
+        'title': 'Rust', 'severity': 'high', 'alert_type': 'disease', 'crop_type': 'wheat',
+        'expires_at': (datetime.utcnow() + timedelta(days=3)).strftime('%Y-%m-%dT%H:%M:%S'),
+        'location': {'lng': longitude, 'lat': latitude},
+    })
+
+    assert response.status_code == 201
+    assert response.get_json()['notifications_queued']
+    assert emitted == []
+    stats = dispatcher.get_stats()
+    assert stats['queue_depth'] == 1
+    assert stats['enqueued'] == before['enqueued'] + 1
+
+    dispatcher._run(dispatcher.queue.get_nowait())
+
+    full_cells, _ = spatial_cells.covering_cells(longitude, latitude, ALERT_RADIUS)
+    cell = spatial_cells.encode(longitude, latitude)
+    room = spatial_cells.cell_room(cell, 'wheat') if cell in full_cells else f'user_{farmer.id}'
+    assert [(event, to) for event, to, _ in emitted] == [('new_alert_notification', room)]
+    assert emitted[0][2]['alert_id'] == response.get_json()['alert']['id']
+    stats = dispatcher.get_stats()
+    assert stats['queue_depth'] == 0
+    assert stats['completed'] == before['completed'] + 1
+    assert stats['latency_ms']['max'] is not None
+    assert queued == []
+
+
+def test_failed_jobs_are_retried_then_counted(database, queued, monkeypatch):
+    def fail(alert_id):
+        raise RuntimeError('recipient lookup failed')
+
+    monkeypatch.setitem(dispatcher.tasks, 'notify_new_alert', fail)
+    before = dispatcher.get_stats()
+    dispatcher.enqueue('notify_new_alert', 1)
+    job = dispatcher.queue.get_nowait()
+
+    for attempt in range(dispatcher.max_retries):
+        dispatcher._run(job)
+        assert queued[-1] == (job,)  # rescheduled after a delay
+    dispatcher._run(job)
+
+    stats = dispatcher.get_stats()
+    assert stats['retries'] == before['retries'] + dispatcher.max_retries
+    assert stats['failed'] == before['failed'] + 1
+    assert stats['completed'] == before['completed']
+
+
+def test_delete_notifies_after_the_commit(agronomist, alert_id, dispatched, login):
+    response = login(agronomist).delete(f'/api/alert/{alert_id}')
+
+    assert response.status_code == 200
+    assert len(dispatched) == 1
+    update_type, snapshot, committed = dispatched[0]
+    assert update_type == 'deleted'
+    assert committed
+    assert snapshot == {'id': alert_id, 'title': 'Aphids', 'crop_type': 'wheat', 'severity': 'high',
+                        'location': [pytest.approx(-6.84), pytest.approx(33.97)]}
+
+
+def test_failed_delete_notifies_nobody(agronomist, alert_id, dispatched, login, monkeypatch, database):
+    def fail(alert_ids, change):
+        raise RuntimeError('change log unavailable')
+
+    monkeypatch.setattr(change_log, 'record', fail)
+    response = login(agronomist).delete(f'/api/alert/{alert_id}')
+
+    assert response.status_code == 500
+    assert dispatched == []
+    assert database.session.get(Alert, alert_id) is not None
+
+
+def test_update_sends_no_update_notification(agronomist, alert_id, dispatched, login):
+    response = login(agronomist).put(f'/api/alert/{alert_id}/update', json={'title': 'Aphids, spreading'})
+
+    assert response.status_code == 200
+    assert dispatched == []
@@ -0,0 +1,26 @@
+"""/metrics access, no database needed"""
+from flask import Flask
+
+from app.routes.metrics import metrics_bp
+
+
+def make_client(**config):
+    app = Flask(__name__)
+    app.config.update(config)
+    app.register_blueprint(metrics_bp)
+    return app.test_client()
+
+
+def test_metrics_is_a_404_when_off():
+    assert make_client(METRICS_ENABLED=False, METRICS_TOKEN='secret').get(
+        '/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 404
+    assert make_client(METRICS_ENABLED=True, METRICS_TOKEN='').get('/metrics').status_code == 404
+
+
+def test_metrics_needs_the_bearer_token():
+    client = make_client(METRICS_ENABLED=True, METRICS_TOKEN='secret')
+    assert client.get('/metrics').status_code == 404
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 404
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
@@ -0,0 +1,39 @@
+"""Notification outbox numbering and the replay watermark, no database needed"""
+import time
+
+from flask import Flask
+
+from app.services.outbox import NotificationOutbox
+
+
+def make_outbox(**config):
+    app = Flask(__name__)
+    app.config.update(config)
+    outbox = NotificationOutbox()
+    outbox.init_app(app)
+    outbox.app = None  # no background flusher, rows stay queued
+    return outbox
+
+
+def test_single_worker_replays_from_memory():
+    outbox = make_outbox()
+    start = outbox.current_seq()
+    seqs = [outbox.record('cell_a', 'new_alert_notification', {'n': n}) for n in range(3)]
+
+    assert seqs == sorted(set(seqs))
+    assert start < seqs[0]
+    events, has_more = outbox.replay({'cell_a'}, start)
+    assert [event['seq'] for event in events] == seqs
+    assert not has_more
+    assert outbox.replay({'cell_a'}, seqs[1]) == ([{'seq': seqs[2], 'event': 'new_alert_notification', 'data': {'n': 2}}], False)
+
+
+def test_several_workers_stop_at_what_every_worker_has_written():
+    outbox = make_outbox(SOCKETIO_MESSAGE_QUEUE='redis://localhost:6379/0',
+                         NOTIFICATION_OUTBOX_FLUSH_INTERVAL=0.05, NOTIFICATION_OUTBOX_CLOCK_SKEW_MS=50)
+    seqs = [outbox.record('cell_a', 'new_alert_notification', {'n': n}) for n in range(3)]
+
+    # Another worker may still hold messages numbered like these, clients must not move past them yet
+    assert outbox.current_seq() < seqs[0]
+    time.sleep(0.2)
+    assert outbox.current_seq() > seqs[-1]
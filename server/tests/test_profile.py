@@ -0,0 +1,22 @@
+"""The profile ETag is checked before the user's alerts are loaded"""
+from sqlalchemy import event
+
+
+def test_revalidated_profile_does_not_load_the_alerts(database, agronomist, make_alert, login):
+    make_alert(agronomist)
+    make_alert(agronomist, title='Rust')
+    client = login(agronomist)
+    first = client.get('/api/user/profile')
+    assert first.status_code == 200
+    assert len(first.get_json()['created_alerts']) == 2
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(database.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get('/api/user/profile', headers={'If-None-Match': first.headers['ETag']})
+    finally:
+        event.remove(database.engine, 'before_cursor_execute', listener)
+
+    assert response.status_code == 304
+    assert not [statement for statement in statements if 'alerts.title' in statement]
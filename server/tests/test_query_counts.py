@@ -0,0 +1,21 @@
+"""List endpoints and notification jobs issue the same number of queries whatever the data size"""
+from app.models import User
+from app.services.alert_cache import alert_cache
+from benchmarks.hot_paths import QueryCounter
+from benchmarks.query_counts import add_users, measure
+
+
+def test_query_counts_do_not_grow_with_the_data(app, database, monkeypatch):
+    # Every request has to reach the database, a cache hit would hide an N+1
+    monkeypatch.setattr(alert_cache, 'backend', None)
+    database.session.add(User(email='admin@counts.local', password_hash='x', first_name='Admin', last_name='Counts',
+                              role='admin', is_approved=True))
+    database.session.commit()
+    counter = QueryCounter(database.engine)
+
+    add_users(3, 0, alerts_per_agronomist=2)
+    before = measure(app, counter)
+    add_users(30, 3, alerts_per_agronomist=5)
+    after = measure(app, counter)
+
+    assert after == before
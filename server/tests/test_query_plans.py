@@ -0,0 +1,40 @@
+"""The hot queries must not read users or alerts with a sequential scan"""
+import pytest
+
+from app.extensions import db
+from benchmarks.query_plan_check import explain, hot_queries, seed
+from benchmarks.seed import reset_database
+
+HOT_QUERIES = [
+    'find_recipients', 'find_batch_recipients', 'area_alerts', 'bbox_alerts', 'polygon_alerts',
+    'map_tile', 'my_alerts', 'agronomist_search', 'autocomplete', 'login',
+]
+
+
+@pytest.fixture(scope='module')
+def analyzed(app):
+    """Synthetic farmers, agronomists and alerts with fresh planner statistics, once for the module"""
+    with app.app_context():
+        reset_database()
+        seed(users=20000, alerts=20000)
+        db.session.commit()
+    yield
+    with app.app_context():
+        reset_database()
+
+
+@pytest.fixture
+def queries(app, analyzed):
+    with app.app_context():
+        yield hot_queries()
+        db.session.rollback()
+
+
+def test_every_hot_query_is_checked(queries):
+    assert sorted(queries) == sorted(HOT_QUERIES)
+
+
+@pytest.mark.parametrize('name', HOT_QUERIES)
+def test_hot_query_uses_an_index(queries, name):
+    plan, seq_scans, used = explain(queries[name])
+    assert seq_scans == [], f"{name} scans {seq_scans} sequentially, indexes used: {used}"
@@ -0,0 +1,28 @@
+"""The compiled serializers must produce exactly what the marshmallow schemas do"""
+import pytest
+
+from app.schemas.alert import dump_alert_rows
+from app.schemas.user import UserSchema, dump_users
+from benchmarks.serialization_benchmark import make_alerts, make_users, schema_path
+
+
+@pytest.fixture
+def rows():
+    rows = make_alerts(50)
+    # Optional fields left empty on a few of them
+    for alert, _, _ in rows[::7]:
+        alert.description = None
+        alert.expires_at = None
+    return rows
+
+
+def test_compiled_alert_serializer_matches_alert_schema(rows):
+    assert dump_alert_rows(rows) == schema_path(rows)
+
+
+def test_compiled_user_serializer_matches_user_schema(rows):
+    users = make_users(rows)
+    users[0].subscribed_crops = None
+    users[1].location = None
+    users[2].created_alerts = []
+    assert dump_users(users) == UserSchema(many=True).dump(users)
@@ -0,0 +1,25 @@
+"""
+Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+
+Green thread libraries have to patch the standard library before anything else
+is imported, so this module does that first, then patches psycopg2 so database
+calls yield to other green threads instead of blocking the whole worker.
+"""
+import os
+
+ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'eventlet')
+
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+    from psycogreen.eventlet import patch_psycopg
+    patch_psycopg()
+elif ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+from app import create_app  # noqa: E402
+
+app = create_app()